@@ -0,0 +1,271 @@
+"""
+batch.py
+作者: wangyq
+修改日期: 2025-09-16
+
+功能:
+批量计算多对文本的相似度：从清单文件或两个目录生成待比较的文件对，
+通过进程池并行计算（每个工作进程只初始化一次 jieba），并将全部结果写入单个 CSV / JSONL 文件。
+待检测文本在主进程的线程池中预读，读取与计算重叠；同时在途的任务数有上限，内存占用与文件对数量无关。
+给定结果库（result_store）时计算完整的指标向量，与耗时一起分批写入，之后可换一组权重重新计分。
+"""
+
+import csv
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
+
+from document import METRICS, Document, compare, weighted_score
+from file_reader import iter_texts, PREFETCH_DEPTH
+from token_cache import get_default_cache, set_default_cache
+from tool_functions import init_jieba
+
+# 输出文件的列
+FIELDS = ('orig', 'copy', 'score', 'lcs', 'edit', 'jaccard', 'simhash', 'elapsed_ms', 'error')
+# 计算完整指标向量时使用的权重（各指标均非 0，得分另按实际权重计算）
+FULL_PERCENT = dict.fromkeys(METRICS, 1.0)
+# 每个工作进程缓存的原文 Document 数量
+DOCUMENT_CACHE_SIZE = 64
+# 每个工作进程最多同时排队的任务块数
+PENDING_CHUNKS_PER_WORKER = 2
+
+
+def load_manifest(path):
+    """
+    读取清单文件，每行为 "原文路径,待检测路径"，空行与 # 开头的行被忽略。
+    相对路径以清单文件所在目录为基准。
+    参数:
+        path (str): 清单文件路径
+    返回:
+        list[tuple[str, str]]: 文件对列表
+    异常:
+        ValueError: 当清单不存在或某行格式错误时抛出
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    pairs = []
+    try:
+        with open(path, "r", encoding="utf-8", newline="") as file_handle:
+            for lineno, row in enumerate(csv.reader(file_handle), 1):
+                if not row or not row[0].strip() or row[0].lstrip().startswith("#"):
+                    continue
+                if len(row) != 2:
+                    raise ValueError(f"清单第 {lineno} 行格式错误，应为 原文路径,待检测路径")
+                orig, copy = (os.path.join(base, p.strip()) for p in row)
+                pairs.append((orig, copy))
+    except FileNotFoundError as exc:
+        raise ValueError(f"文件 {path} 不存在！") from exc
+    return pairs
+
+
+def pairs_from_dirs(orig_dir, copy_dir):
+    """
+    按文件名匹配两个目录中的文件；orig_dir 为单个文件时，将其与 copy_dir 中的每个文件比较。
+    参数:
+        orig_dir (str): 原文目录或原文文件
+        copy_dir (str): 待检测文件目录
+    返回:
+        list[tuple[str, str]]: 按文件名排序的文件对列表
+    """
+    if not os.path.isdir(copy_dir):
+        raise ValueError(f"目录 {copy_dir} 不存在！")
+    names = sorted(
+        name for name in os.listdir(copy_dir)
+        if os.path.isfile(os.path.join(copy_dir, name))
+    )
+    if os.path.isfile(orig_dir):
+        return [(orig_dir, os.path.join(copy_dir, name)) for name in names]
+    if not os.path.isdir(orig_dir):
+        raise ValueError(f"目录 {orig_dir} 不存在！")
+    return [
+        (os.path.join(orig_dir, name), os.path.join(copy_dir, name))
+        for name in names if os.path.isfile(os.path.join(orig_dir, name))
+    ]
+
+
+def init_worker(cache=None):
+    """
+    工作进程初始化：预先加载 jieba 词典，避免每个任务重复加载；给定缓存时设为进程内默认缓存。
+    参数:
+        cache (TokenCache | None): 持久化缓存
+    """
+    init_jieba()
+    if cache is not None:
+        set_default_cache(cache)
+
+
+@lru_cache(maxsize=DOCUMENT_CACHE_SIZE)
+def _cached_document(path):
+    """
+    工作进程内按路径缓存原文 Document，同一原文的多次比较只分词一次。
+    """
+    return Document(path)
+
+
+def score_pair(pair, percent=None, copy_text=None, idf=None, full=False, copy_error=None):
+    """
+    计算单个文件对的相似度，异常被记录在结果中而不中断整个批次。
+    参数:
+        pair (tuple[str, str]): (原文路径, 待检测路径)
+        percent (dict | None): 各指标权重
+        copy_text (str | None): 已预读的待检测文本，None 时按路径读取
+        idf (IdfTable | None): 给定时 SimHash 按 TF-IDF 加权
+        full (bool): 为 True 时计算全部指标（包括权重为 0 的），结果可换一组权重重新计分
+        copy_error (Exception | None): 预读待检测文本时的错误，给定时直接记录，不再重新读取
+    返回:
+        dict: 一行结果，字段见 FIELDS；elapsed_ms 为读取、分词与比较的总耗时
+    """
+    orig, copy = pair
+    row = dict.fromkeys(FIELDS)
+    row['orig'], row['copy'] = orig, copy
+    if copy_error is not None:
+        row['error'] = str(copy_error)
+        return row
+    start = time.perf_counter()
+    try:
+        copy_doc = Document(copy) if copy_text is None else Document(copy, text=copy_text)
+        score, result = compare(_cached_document(orig), copy_doc, FULL_PERCENT if full else percent, idf)
+    except (ValueError, OSError) as exc:
+        row['error'] = str(exc)
+        return row
+    row['score'] = weighted_score(result, percent) if full else score
+    row.update(result)
+    row['elapsed_ms'] = (time.perf_counter() - start) * 1000
+    return row
+
+
+def _score_pair_with(args):
+    pair, percent, copy_text, idf, full, copy_error = args
+    return score_pair(pair, percent, copy_text, idf, full, copy_error)
+
+
+def _score_chunk(tasks):
+    return [_score_pair_with(task) for task in tasks]
+
+
+def _with_copy_texts(pairs, prefetch):
+    """
+    在线程池中预读待检测文本，产出 (文件对, 文本, 错误)；读取失败时文本为 None，错误由 score_pair 记录在结果中。
+    原文在工作进程内按路径缓存，只读取一次，因此不预读。
+    """
+    queued = deque()
+
+    def copy_paths():
+        for pair in pairs:
+            queued.append(pair)
+            yield pair[1]
+
+    for _path, text, error in iter_texts(copy_paths(), prefetch=prefetch):
+        yield queued.popleft(), text, error
+
+
+def detect_format(path, fmt=None):
+    """
+    确定输出格式：显式指定优先，否则按扩展名判断（.jsonl/.json 为 JSONL，其余为 CSV）。
+    """
+    if fmt is not None:
+        if fmt not in ('csv', 'jsonl'):
+            raise ValueError(f"未知的输出格式: {fmt}")
+        return fmt
+    return 'jsonl' if os.path.splitext(path)[1].lower() in ('.jsonl', '.json') else 'csv'
+
+
+def iter_scores(pairs, workers=None, chunk_size=16, percent=None, cache=None, prefetch=PREFETCH_DEPTH, idf=None,
+                full=False):
+    """
+    并行计算多个文件对的相似度，按输入顺序逐个产出结果。
+    参数:
+        pairs (Iterable[tuple[str, str]]): 文件对
+        workers (int | None): 工作进程数，None 为 CPU 核数，1 为在当前进程中串行计算
+        chunk_size (int): 每次分发给工作进程的文件对数量
+        percent (dict | None): 各指标权重
+        cache (TokenCache | None): 持久化缓存，在每个工作进程中启用
+        prefetch (int): 预读的待检测文件数，0 表示不预读（由工作进程自行读取）
+        idf (IdfTable | None): 给定时 SimHash 按 TF-IDF 加权（工作进程按前缀各自加载一次）
+        full (bool): 为 True 时计算完整的指标向量，见 score_pair
+    返回:
+        Iterator[dict]: 每个文件对的一行结果
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size 必须大于0")
+    if prefetch > 0:
+        tasks = ((pair, percent, text, idf, full, error) for pair, text, error in _with_copy_texts(pairs, prefetch))
+    else:
+        tasks = ((pair, percent, None, idf, full, None) for pair in pairs)
+    if workers == 1:
+        previous = get_default_cache()
+        if cache is not None:
+            set_default_cache(cache)
+        try:
+            yield from map(_score_pair_with, tasks)
+        finally:
+            set_default_cache(previous)
+        return
+    # 逐块提交并限制在途块数（Executor.map 会一次性取完全部输入）
+    max_pending = PENDING_CHUNKS_PER_WORKER * (workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(cache,)) as executor:
+        pending = deque()
+        while True:
+            chunk = list(islice(tasks, chunk_size))
+            if not chunk:
+                break
+            pending.append(executor.submit(_score_chunk, chunk))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def write_rows(path, rows, fmt=None):
+    """
+    将结果逐行写入 CSV 或 JSONL 文件。
+    参数:
+        path (str): 输出文件路径
+        rows (Iterable[dict]): 结果行
+        fmt (str | None): 'csv' 或 'jsonl'，None 时按扩展名判断
+    返回:
+        int: 写入的行数
+    """
+    fmt = detect_format(path, fmt)
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as file_handle:
+        if fmt == 'csv':
+            writer = csv.DictWriter(file_handle, fieldnames=FIELDS)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in rows:
+                file_handle.write(json.dumps(row, ensure_ascii=False) + "\n")
+                count += 1
+    return count
+
+
+def run_batch(pairs, output_path, workers=None, chunk_size=16, fmt=None, percent=None, cache=None,
+              prefetch=PREFETCH_DEPTH, idf=None, store=None):
+    """
+    批量计算并写出结果。
+    参数:
+        pairs (Iterable[tuple[str, str]]): 文件对
+        output_path (str | None): 输出文件路径，None 时只写入结果库
+        workers (int | None): 工作进程数
+        chunk_size (int): 每次分发的文件对数量
+        fmt (str | None): 输出格式
+        percent (dict | None): 各指标权重
+        cache (TokenCache | None): 持久化缓存
+        prefetch (int): 预读的待检测文件数
+        idf (IdfTable | None): 给定时 SimHash 按 TF-IDF 加权
+        store (ResultStore | JsonlResultStore | None): 结果库，给定时计算完整的指标向量并分批写入
+    返回:
+        int: 处理的文件对数量
+    """
+    rows = iter_scores(pairs, workers, chunk_size, percent, cache, prefetch, idf, full=store is not None)
+    if store is not None:
+        rows = store.record(rows)
+    if output_path is None:
+        return sum(1 for _ in rows)
+    return write_rows(output_path, rows, fmt)
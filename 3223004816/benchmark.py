@@ -0,0 +1,290 @@
+"""
+benchmark.py
+作者: wangyq
+修改日期: 2025-09-16
+
+功能:
+基准测试：生成指定大小与修改比例的中文合成文档，测量 tokenize、lcs、edit_dist、jaccard2、jaccard_np、simhash_res
+以及端到端 similarity_score 在 1KB 到 10MB 各档规模下的耗时与内存峰值（tracemalloc），
+结果以 JSON 输出，并可与保存的基线比较，超出容差的退化使进程以非零状态退出。
+
+用法:
+    python benchmark.py -o bench.json
+    python benchmark.py --sizes 1K,10K --baseline bench.json --tolerance 0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# 默认测试规模（字节，按 UTF-8 计）
+DEFAULT_SIZES = ("1K", "10K", "100K", "1M", "10M")
+# 默认测试的函数
+FUNCTIONS = ("tokenize", "lcs", "edit_dist", "jaccard2", "jaccard_np", "simhash_res", "similarity_score")
+# O(m·n) 的函数默认只测试到该规模，更大的规模记为跳过
+QUADRATIC_FUNCTIONS = ("lcs", "edit_dist", "similarity_score")
+QUADRATIC_MAX_BYTES = 100 * 1024
+# 与基线比较时，绝对差值低于该值（秒）的波动不视为退化
+ABS_TOLERANCE = 1e-3
+# 合成文本使用的常用汉字
+COMMON_CHARS = (
+    "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后"
+    "多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还"
+    "因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结"
+    "解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级"
+    "少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处队南给色光门即保治北造百规热领"
+)
+SENTENCE_END = "。"
+CLAUSE_END = "，"
+
+
+def parse_size(text):
+    """
+    解析 "10K"、"1M" 形式的大小（1K = 1024 字节）。
+    参数:
+        text (str): 大小
+    返回:
+        int: 字节数
+    """
+    text = text.strip().upper()
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    try:
+        if text and text[-1] in units:
+            return int(float(text[:-1]) * units[text[-1]])
+        return int(text)
+    except ValueError as exc:
+        raise ValueError(f"无法解析的大小: {text}") from exc
+
+
+def synthetic_text(size, seed=0):
+    """
+    生成约 size 字节（UTF-8）的中文合成文本：按 Zipf 分布选取 1~4 字的词，
+    每 4~15 个词一个逗号、每 2~5 个分句一个句号、每 3~8 句换行。
+    参数:
+        size (int): 目标字节数
+        seed (int): 随机种子
+    返回:
+        str: 合成文本
+    """
+    rng = random.Random(seed)
+    vocab = ["".join(rng.choice(COMMON_CHARS) for _ in range(rng.choice((1, 2, 2, 2, 3, 4)))) for _ in range(3000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocab))]
+    target_chars = max(1, size // 3)  # 汉字在 UTF-8 中占 3 字节
+    parts, length = [], 0
+    while length < target_chars:
+        sentences = []
+        for _ in range(rng.randint(3, 8)):
+            clauses = ["".join(rng.choices(vocab, weights, k=rng.randint(4, 15))) for _ in range(rng.randint(2, 5))]
+            sentences.append(CLAUSE_END.join(clauses) + SENTENCE_END)
+        paragraph = "".join(sentences) + "\n"
+        parts.append(paragraph)
+        length += len(paragraph)
+    return "".join(parts)[:target_chars]
+
+
+def mutate_text(text, edit_rate, seed=0):
+    """
+    按字符随机修改文本：约 edit_rate 比例的位置被删除、替换或插入一个常用汉字。
+    参数:
+        text (str): 原文
+        edit_rate (float): 修改比例（0~1）
+        seed (int): 随机种子
+    返回:
+        str: 修改后的文本
+    """
+    if not 0 <= edit_rate <= 1:
+        raise ValueError("edit_rate 必须在 0 与 1 之间")
+    rng = random.Random(seed)
+    positions = sorted(rng.sample(range(len(text)), int(len(text) * edit_rate)))
+    pieces, last = [], 0
+    for pos in positions:
+        pieces.append(text[last:pos])
+        op = rng.random()
+        if op < 1 / 3:        # 删除
+            pass
+        elif op < 2 / 3:      # 替换
+            pieces.append(rng.choice(COMMON_CHARS))
+        else:                 # 插入
+            pieces.append(rng.choice(COMMON_CHARS) + text[pos])
+        last = pos + 1
+    pieces.append(text[last:])
+    return "".join(pieces)
+
+
+def _time_call(func, repeat):
+    # 返回 (最短耗时, 中位数耗时, 返回值)
+    times, value = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times), value
+
+
+def _peak_memory(func):
+    # 在 tracemalloc 下单独运行一次，避免跟踪开销影响计时
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _cases(name, orig, copy, orig_path, copy_path):
+    # 返回待测函数的无参调用
+    import main
+    import similarity_functions
+    import tool_functions
+
+    if name == "tokenize":
+        return lambda: tool_functions.tokenize(orig)
+    if name == "similarity_score":
+        return lambda: main.similarity_score(orig_path, copy_path)
+    orig_tokens, copy_tokens = tool_functions.tokenize(orig), tool_functions.tokenize(copy)
+    if name in ("jaccard2", "jaccard_np"):
+        func = getattr(similarity_functions, name)
+        return lambda: func(orig_tokens, copy_tokens, 2)
+    func = getattr(similarity_functions, name)
+    return lambda: func(orig_tokens, copy_tokens)
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, functions=FUNCTIONS, edit_rate=0.05, repeat=3, seed=0,
+                   max_quadratic_bytes=QUADRATIC_MAX_BYTES, memory=True, log=None):
+    """
+    运行基准测试。
+    参数:
+        sizes (Iterable[str | int]): 测试规模
+        functions (Iterable[str]): 待测函数，取值见 FUNCTIONS
+        edit_rate (float): 待检测文本相对原文的修改比例
+        repeat (int): 每项重复次数，记录最短与中位数耗时
+        seed (int): 随机种子
+        max_quadratic_bytes (int): O(m·n) 函数的最大测试规模
+        memory (bool): 是否测量内存峰值
+        log (Callable[[str], None] | None): 进度输出
+    返回:
+        dict: {"meta": 运行环境与参数, "results": [每项结果]}
+    """
+    from tool_functions import init_jieba
+
+    unknown = set(functions) - set(FUNCTIONS)
+    if unknown:
+        raise ValueError(f"未知的函数: {', '.join(sorted(unknown))}")
+    if repeat <= 0:
+        raise ValueError("repeat 必须大于0")
+    init_jieba()  # 词典加载与 numpy 导入不计入任何一项
+    import numpy  # noqa: F401
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_text in sizes:
+            size = parse_size(size_text) if isinstance(size_text, str) else size_text
+            orig = synthetic_text(size, seed)
+            copy = mutate_text(orig, edit_rate, seed + 1)
+            orig_path, copy_path = os.path.join(tmp, "orig.txt"), os.path.join(tmp, "copy.txt")
+            for path, text in ((orig_path, orig), (copy_path, copy)):
+                with open(path, "w", encoding="utf-8") as file_handle:
+                    file_handle.write(text)
+            for name in functions:
+                row = {"name": name, "size": size}
+                if name in QUADRATIC_FUNCTIONS and size > max_quadratic_bytes:
+                    row["skipped"] = f"超过 O(m·n) 函数的规模上限 {max_quadratic_bytes} 字节"
+                    results.append(row)
+                    continue
+                call = _cases(name, orig, copy, orig_path, copy_path)
+                row["seconds"], row["median"], _ = _time_call(call, repeat)
+                if memory:
+                    row["peak_bytes"] = _peak_memory(call)
+                results.append(row)
+                if log is not None:
+                    log(f"{name:<18}{size:>10} B  {row['seconds'] * 1000:>10.2f} ms")
+    meta = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "edit_rate": edit_rate,
+        "repeat": repeat,
+        "seed": seed,
+        "time": time.time(),
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare_baseline(report, baseline, tolerance=0.2):
+    """
+    与基线比较，找出耗时或内存峰值超出容差的项目（两边都有结果的项目才比较）。
+    参数:
+        report (dict): run_benchmarks 的结果
+        baseline (dict): 基线结果
+        tolerance (float): 允许的相对增幅，如 0.2 表示 20%
+    返回:
+        list[dict]: 退化项目，包含 name、size、metric、baseline、current 与 ratio
+    """
+    base = {(row["name"], row["size"]): row for row in baseline.get("results", [])}
+    regressions = []
+    for row in report["results"]:
+        old = base.get((row["name"], row["size"]))
+        if old is None:
+            continue
+        for metric, slack in (("seconds", ABS_TOLERANCE), ("peak_bytes", 0)):
+            if metric not in row or metric not in old:
+                continue
+            current, previous = row[metric], old[metric]
+            if current > previous * (1 + tolerance) and current - previous > slack:
+                regressions.append({
+                    "name": row["name"], "size": row["size"], "metric": metric,
+                    "baseline": previous, "current": current,
+                    "ratio": current / previous if previous else float("inf"),
+                })
+    return regressions
+
+
+def main():
+    """
+    命令行入口。
+    """
+    parser = argparse.ArgumentParser(description="相似度计算基准测试")
+    parser.add_argument('--sizes', default=",".join(DEFAULT_SIZES), help='测试规模，逗号分隔，如 1K,10K,1M')
+    parser.add_argument('--functions', default=",".join(FUNCTIONS), help='待测函数，逗号分隔')
+    parser.add_argument('--edit-rate', type=float, default=0.05, help='待检测文本的修改比例')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--max-quadratic-bytes', type=parse_size, default=QUADRATIC_MAX_BYTES,
+                        help='lcs / edit_dist / similarity_score 的最大测试规模')
+    parser.add_argument('--no-memory', action='store_true', help='不测量内存峰值')
+    parser.add_argument('-o', '--output', help='结果 JSON 文件，省略时打印')
+    parser.add_argument('--baseline', help='基线 JSON 文件，出现退化时以状态 1 退出')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='与基线比较时允许的相对增幅')
+    args = parser.parse_args()
+
+    report = run_benchmarks(
+        sizes=[s for s in args.sizes.split(",") if s], functions=[f for f in args.functions.split(",") if f],
+        edit_rate=args.edit_rate, repeat=args.repeat, seed=args.seed,
+        max_quadratic_bytes=args.max_quadratic_bytes, memory=not args.no_memory,
+        log=lambda line: print(line, file=sys.stderr),
+    )
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file_handle:
+            file_handle.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file_handle:
+            baseline = json.load(file_handle)
+        regressions = compare_baseline(report, baseline, args.tolerance)
+        for item in regressions:
+            print(f"退化: {item['name']} @ {item['size']} B {item['metric']} "
+                  f"{item['baseline']:.6g} -> {item['current']:.6g} (x{item['ratio']:.2f})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""
+chunked.py
+作者: wangyq
+修改日期: 2025-09-16
+
+功能:
+长文档的分块比较：整篇的 O(m·n) LCS 在 5 万 token 以上的论文、报告上不可接受。
+    1. 按句末标点与换行把两篇文档切成句子 / 段落块（过短的合并，过长的截断）
+    2. 以待检测文本各块的 n-gram 哈希建立倒排索引，原文每块只与共享足够多哈希的块配对
+    3. 只对候选块对精确计算 LCS，块对较多时在进程池中并行
+    4. 在候选块对中选出两边块号都递增、LCS 之和最大的链，作为整篇 LCS 的近似
+块内的公共子序列按块号递增拼接后仍是整篇的公共子序列，因此近似值不超过精确的 LCS，
+跨越块边界或没有成为候选的匹配会被漏计；对整段复制、改写的文档误差很小。
+"""
+
+import bisect
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from document import DEFAULT_PERCENT, as_document, compare
+from profiling import count, stage
+from similarity_functions import lcs, ngram_hash_sequence
+
+# 块的分界：句末标点与换行
+SENTENCE_END = re.compile(r"[。！？!?；;\n]+")
+# 短于该 token 数的句子与后续句子合并
+CHUNK_MIN_TOKENS = 32
+# 长于该 token 数的块被截断为多块
+CHUNK_MAX_TOKENS = 512
+# 倒排索引使用的 n-gram 长度
+CHUNK_N = 3
+# 成为候选所需的共享 n-gram 数下限，及其占原文块 n-gram 数的比例下限
+MIN_SHARED = 2
+MIN_SHARED_RATIO = 0.1
+# 原文每块最多保留的候选块数
+MAX_CANDIDATES = 8
+# 出现在超过该数量块中的 n-gram 视为套话，不参与配对
+MAX_POSTINGS = 64
+# 候选块对的 DP 单元总数不少于该值时才使用进程池
+PARALLEL_MIN_CELLS = 1 << 26
+
+
+def segment(doc, min_tokens=CHUNK_MIN_TOKENS, max_tokens=CHUNK_MAX_TOKENS):
+    """
+    按句末标点与换行把文档切分为 token 区间。
+    参数:
+        doc (Document): 文档
+        min_tokens (int): 块的最小 token 数（最后一块除外）
+        max_tokens (int): 块的最大 token 数
+    返回:
+        list[tuple[int, int]]: 各块在 doc.ids 中的 [start, end)，依次相接并覆盖全部 token
+    """
+    if min_tokens <= 0 or max_tokens < min_tokens:
+        raise ValueError("需要 0 < min_tokens <= max_tokens")
+    starts, _ = doc.offsets
+    total = len(starts)
+    # 每个分界处之后的第一个 token 下标
+    cuts = [bisect.bisect_left(starts, m.end()) for m in SENTENCE_END.finditer(doc.text)]
+    chunks, begin = [], 0
+    for cut in cuts + [total]:
+        while cut - begin > max_tokens:
+            chunks.append((begin, begin + max_tokens))
+            begin += max_tokens
+        if cut - begin >= min_tokens or (cut == total and cut > begin):
+            chunks.append((begin, cut))
+            begin = cut
+    if len(chunks) > 1 and chunks[-1][1] - chunks[-1][0] < min_tokens \
+            and chunks[-1][1] - chunks[-2][0] <= max_tokens:
+        chunks[-2:] = [(chunks[-2][0], chunks[-1][1])]  # 过短的末块并入前一块
+    return chunks
+
+
+def _chunk_hashes(ids, chunks, n):
+    # 每块内部 n-gram 的去重哈希（跨越块边界的 n-gram 不计）
+    hashes = ngram_hash_sequence(ids, n)
+    return [set(hashes[start:max(start, end - n + 1)].tolist()) for start, end in chunks]
+
+
+def candidate_chunks(hashes_a, hashes_b, min_shared=MIN_SHARED, min_ratio=MIN_SHARED_RATIO,
+                     max_candidates=MAX_CANDIDATES, max_postings=MAX_POSTINGS):
+    """
+    用倒排索引找出共享足够多 n-gram 哈希的块对。
+    参数:
+        hashes_a (list[set[int]]): 原文各块的 n-gram 哈希
+        hashes_b (list[set[int]]): 待检测文本各块的 n-gram 哈希
+        min_shared (int): 共享哈希数下限
+        min_ratio (float): 共享哈希数占原文块哈希数的比例下限
+        max_candidates (int): 原文每块最多保留的候选数（按共享数降序）
+        max_postings (int): 出现在更多块中的哈希被忽略
+    返回:
+        list[tuple[int, int]]: 候选块对 (i, j)，按 (i, j) 升序
+    """
+    index = {}
+    for j, grams in enumerate(hashes_b):
+        for h in grams:
+            index.setdefault(h, []).append(j)
+    pairs = []
+    for i, grams in enumerate(hashes_a):
+        shared = {}
+        for h in grams:
+            postings = index.get(h)
+            if postings is not None and len(postings) <= max_postings:
+                for j in postings:
+                    shared[j] = shared.get(j, 0) + 1
+        need = max(min_shared, min_ratio * len(grams))
+        hits = sorted((j for j, c in shared.items() if c >= need), key=lambda j: -shared[j])
+        pairs.extend((i, j) for j in sorted(hits[:max_candidates]))
+    return pairs
+
+
+def _lcs_task(task):
+    a, b = task
+    return lcs(a, b)
+
+
+def chunk_lcs(a, b, chunks_a, chunks_b, pairs, workers=None, executor=None):
+    """
+    精确计算各候选块对的 LCS；DP 单元总数达到 PARALLEL_MIN_CELLS 时在进程池中并行。
+    参数:
+        a (array): 原文 id 数组
+        b (array): 待检测文本 id 数组
+        chunks_a (list[tuple[int, int]]): 原文的块
+        chunks_b (list[tuple[int, int]]): 待检测文本的块
+        pairs (list[tuple[int, int]]): 候选块对
+        workers (int | None): 工作进程数，1 为串行
+        executor (Executor | None): 复用已有的进程池
+    返回:
+        list[int]: 与 pairs 对应的 LCS 长度
+    """
+    tasks = [(a[slice(*chunks_a[i])], b[slice(*chunks_b[j])]) for i, j in pairs]
+    cells = sum(len(x) * len(y) for x, y in tasks)
+    count("lcs.cells", cells)
+    if workers == 1 or (executor is None and cells < PARALLEL_MIN_CELLS):
+        return [_lcs_task(task) for task in tasks]
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return chunk_lcs(a, b, chunks_a, chunks_b, pairs, workers, pool)
+    chunksize = max(1, len(tasks) // (4 * (workers or 4)))
+    return list(executor.map(_lcs_task, tasks, chunksize=chunksize))
+
+
+def best_chain(pairs, weights, n_b):
+    """
+    在块对中选出 i、j 都严格递增且权重之和最大的链（带权最长递增子序列，树状数组求前缀最大值）。
+    参数:
+        pairs (list[tuple[int, int]]): 块对 (i, j)，按 (i, j) 升序
+        weights (list[int]): 各块对的权重
+        n_b (int): 待检测文本的块数
+    返回:
+        int: 最大权重和
+    """
+    tree = [0] * (n_b + 1)
+
+    def prefix_max(j):  # 块号 < j 的最大链权重
+        best = 0
+        while j > 0:
+            best = max(best, tree[j])
+            j -= j & -j
+        return best
+
+    def update(j, value):
+        j += 1
+        while j <= n_b:
+            if tree[j] < value:
+                tree[j] = value
+            j += j & -j
+
+    best, k = 0, 0
+    while k < len(pairs):
+        # 同一原文块的候选先全部查询再更新，保证每个原文块只用一次
+        end = k
+        while end < len(pairs) and pairs[end][0] == pairs[k][0]:
+            end += 1
+        values = [(pairs[x][1], prefix_max(pairs[x][1]) + weights[x]) for x in range(k, end)]
+        for j, value in values:
+            update(j, value)
+            best = max(best, value)
+        k = end
+    return best
+
+
+def chunked_lcs(doc_a, doc_b, workers=None, n=CHUNK_N, executor=None):
+    """
+    分块近似计算两篇文档的 LCS 长度（不超过精确值）。
+    参数:
+        doc_a (Document | str): 原文
+        doc_b (Document | str): 待检测文本
+        workers (int | None): 并行计算块对 LCS 的进程数，1 为串行
+        n (int): 倒排索引使用的 n-gram 长度
+        executor (Executor | None): 复用已有的进程池
+    返回:
+        int: 近似的 LCS 长度
+    """
+    doc_a, doc_b = as_document(doc_a), as_document(doc_b)
+    with stage("chunk"):
+        chunks_a, chunks_b = segment(doc_a), segment(doc_b)
+        a, b = doc_a.ids, doc_b.ids
+        pairs = candidate_chunks(_chunk_hashes(a, chunks_a, n), _chunk_hashes(b, chunks_b, n))
+    count("chunk.pairs", len(pairs))
+    if not pairs:
+        return 0
+    with stage("lcs"):
+        weights = chunk_lcs(a, b, chunks_a, chunks_b, pairs, workers, executor)
+    return best_chain(pairs, weights, len(chunks_b))
+
+
+def compare_chunked(doc_a, doc_b, percent=None, workers=None, idf=None):
+    """
+    与 compare 相同，但 LCS 相似度由 chunked_lcs 近似计算，其余指标不变。
+    参数:
+        doc_a (Document | str): 原文
+        doc_b (Document | str): 待检测文本
+        percent (dict | None): 各指标权重，默认为 DEFAULT_PERCENT
+        workers (int | None): 并行计算块对 LCS 的进程数
+        idf (IdfTable | None): 给定时 SimHash 按 TF-IDF 加权
+    返回:
+        tuple: (final_score, result)，同 compare
+    """
+    percent = DEFAULT_PERCENT if percent is None else percent
+    doc_a, doc_b = as_document(doc_a), as_document(doc_b)
+    # 先分块：分块需要带位置分词，其结果同时供 compare 使用，避免重复分词
+    lcs_length = chunked_lcs(doc_a, doc_b, workers) if percent['lcs'] != 0.0 else 0
+    final_score, result = compare(doc_a, doc_b, dict(percent, lcs=0), idf)
+    if percent['lcs'] != 0.0:
+        result['lcs'] = lcs_length / len(doc_a.ids)
+        final_score += percent['lcs'] * result['lcs'] * 100
+    return final_score, result
@@ -0,0 +1,268 @@
+"""
+cluster.py
+作者: wangyq
+修改日期: 2025-09-16
+
+功能:
+对一个目录中的全部文档做两两查重并聚类，避免 N² 次完整比较：
+    1. 在进程池中为每篇文档计算 SimHash 指纹与 MinHash 签名（每篇只分词一次）
+    2. 用 SimhashIndex（海明距离）与 LSHIndex（n-gram Jaccard）分块，得到候选文档对
+    3. 只对候选对在进程池中按 compare 的完整加权计算得分
+    4. 得分不低于阈值的文档对用并查集合并为簇，输出按最高得分排序的报告
+分块是近似的：SimHash 部分按阈值推出的海明距离上界检索（上界过大时截断为 MAX_SIMHASH_K），
+再由 n-gram Jaccard 的 LSH 补充，极少数只在 LCS / 编辑距离上相似的文档对可能漏检。
+"""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from batch import init_worker, iter_scores
+from document import DEFAULT_PERCENT, HASHBITS, JACCARD_N, Document
+from minhash_lsh import LSHIndex, MinHasher
+from simhash_index import SimhashIndex
+
+# 默认聚类阈值（百分比，与 similarity_score 同单位）
+DEFAULT_THRESHOLD = 80.0
+# SimhashIndex 检索的最大海明距离，更大时分块失去意义
+MAX_SIMHASH_K = 8
+# LSH 分块使用的 Jaccard 阈值
+LSH_THRESHOLD = 0.5
+# MinHash 签名长度
+NUM_PERM = 128
+# 计算签名时每次分发给工作进程的文档数
+SIGNATURE_CHUNK = 32
+
+
+class UnionFind:
+    """
+    并查集（路径压缩 + 按大小合并）。
+    参数:
+        n (int): 元素个数，元素为 0..n-1
+    """
+    __slots__ = ("parent", "size")
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, x):
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:  # 路径压缩
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a, b):
+        """
+        合并 a、b 所在的集合，返回是否发生了合并。
+        """
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return False
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+        return True
+
+    def groups(self):
+        """
+        返回所有集合（每个集合为升序的元素列表）。
+        """
+        result = {}
+        for x in range(len(self.parent)):
+            result.setdefault(self.find(x), []).append(x)
+        return list(result.values())
+
+
+def list_documents(directory):
+    """
+    列出目录中的所有文件（不递归），按文件名排序。
+    参数:
+        directory (str): 目录
+    返回:
+        list[str]: 文件路径
+    """
+    if not os.path.isdir(directory):
+        raise ValueError(f"目录 {directory} 不存在！")
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if os.path.isfile(os.path.join(directory, name))]
+
+
+def simhash_radius(threshold, percent=None, hashbits=HASHBITS):
+    """
+    由阈值推出得分可能达标的文档对之间的最大海明距离（假设其余指标都取满分）。
+    参数:
+        threshold (float): 阈值（百分比）
+        percent (dict | None): 各指标权重
+        hashbits (int): 指纹位数
+    返回:
+        int: 海明距离上界
+    """
+    percent = DEFAULT_PERCENT if percent is None else percent
+    weight = percent['simhash']
+    if weight <= 0:
+        return hashbits
+    others = sum(w for metric, w in percent.items() if metric != 'simhash')
+    # 100·(others + weight·(1 - h / hashbits)) ≥ threshold
+    bound = (others + weight - threshold / 100) / weight * hashbits
+    return max(0, min(hashbits, int(bound + 1e-9)))
+
+
+def _signature(path, hasher, idf=None):
+    # 工作进程中计算单篇文档的 (token 数, 指纹, MinHash 签名)，出错或没有有效词语时返回错误信息
+    try:
+        doc = Document(path)
+        if not len(doc.ids):
+            return 0, 0, None, f"文件 {path} 过滤后没有有效词语，无法参与查重"
+        return len(doc.ids), doc.fingerprint(HASHBITS, idf), hasher.signature(doc), None
+    except (ValueError, OSError) as exc:
+        return 0, 0, None, str(exc)
+
+
+def _signature_with(args):
+    path, hasher, idf = args
+    return _signature(path, hasher, idf)
+
+
+def compute_signatures(paths, workers=None, cache=None, num_perm=NUM_PERM, idf=None):
+    """
+    在进程池中计算全部文档的指纹与签名。
+    参数:
+        paths (list[str]): 文件路径
+        workers (int | None): 工作进程数，1 为在当前进程中计算
+        cache (TokenCache | None): 持久化缓存
+        num_perm (int): MinHash 签名长度
+        idf (IdfTable | None): 给定时计算 TF-IDF 加权的 SimHash 指纹
+    返回:
+        list[tuple]: 与 paths 对应的 (token 数, 指纹, 签名, 错误)
+    """
+    hasher = MinHasher(num_perm, JACCARD_N)
+    tasks = [(path, hasher, idf) for path in paths]
+    if workers == 1:
+        return [_signature_with(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(cache,)) as executor:
+        return list(executor.map(_signature_with, tasks, chunksize=SIGNATURE_CHUNK))
+
+
+def candidate_pairs(signatures, simhash_k, lsh_threshold=LSH_THRESHOLD, num_perm=NUM_PERM):
+    """
+    由指纹与签名分块，得到候选文档对。
+    参数:
+        signatures (list[tuple]): compute_signatures 的结果
+        simhash_k (int): SimHash 检索的海明距离
+        lsh_threshold (float): LSH 的 Jaccard 阈值
+        num_perm (int): 签名长度
+    返回:
+        list[tuple[int, int]]: 候选对 (i, j)，i < j，已排序
+    """
+    valid = [i for i, (count, _, _, error) in enumerate(signatures) if error is None and count > 0]
+    pairs = set()
+    index = SimhashIndex.build([signatures[i][1] for i in valid], valid, k=simhash_k)
+    for i in valid:
+        for j, _ in index.query(signatures[i][1]):
+            if j > i:
+                pairs.add((i, j))
+    lsh = LSHIndex(lsh_threshold, num_perm)
+    for i in valid:
+        lsh.insert(i, signatures[i][2])
+    pairs.update((min(a, b), max(a, b)) for a, b in lsh.candidate_pairs())
+    return sorted(pairs)
+
+
+def cluster_documents(paths, threshold=DEFAULT_THRESHOLD, percent=None, workers=None, cache=None,
+                      chunk_size=16, idf=None, store=None):
+    """
+    对一组文档查重并聚类。
+    参数:
+        paths (list[str]): 文件路径
+        threshold (float): 聚类阈值（百分比）
+        percent (dict | None): 各指标权重
+        workers (int | None): 工作进程数
+        cache (TokenCache | None): 持久化缓存
+        chunk_size (int): 每次分发给工作进程的文件对数量
+        idf (IdfTable | None): 给定时分块与打分都使用 TF-IDF 加权的 SimHash
+        store (ResultStore | JsonlResultStore | None): 结果库，给定时候选对的完整指标向量分批写入
+    返回:
+        dict: 报告，包含 documents、candidates、threshold、clusters 与 errors
+            clusters 中每项为 {size, max_score, mean_score, members, pairs}，按最高得分、大小降序
+    """
+    signatures = compute_signatures(paths, workers, cache, idf=idf)
+    errors = [{'path': paths[i], 'error': error} for i, (_, _, _, error) in enumerate(signatures) if error]
+    simhash_k = min(simhash_radius(threshold, percent), MAX_SIMHASH_K)
+    candidates = candidate_pairs(signatures, simhash_k)
+
+    uf = UnionFind(len(paths))
+    edges = []
+    rows = iter_scores(((paths[i], paths[j]) for i, j in candidates), workers, chunk_size, percent, cache, idf=idf,
+                       full=store is not None)
+    if store is not None:
+        rows = store.record(rows)
+    for (i, j), row in zip(candidates, rows):
+        if row['score'] is not None and row['score'] >= threshold:
+            uf.union(i, j)
+            edges.append((i, j, row['score']))
+
+    by_root = {}
+    for i, j, score in edges:
+        by_root.setdefault(uf.find(i), []).append((i, j, score))
+    clusters = []
+    for root, members in ((uf.find(g[0]), g) for g in uf.groups() if len(g) > 1):
+        pairs = sorted(by_root[root], key=lambda e: -e[2])
+        scores = [score for _, _, score in pairs]
+        clusters.append({
+            'size': len(members),
+            'max_score': max(scores),
+            'mean_score': sum(scores) / len(scores),
+            'members': [paths[m] for m in members],
+            'pairs': [{'a': paths[i], 'b': paths[j], 'score': score} for i, j, score in pairs],
+        })
+    clusters.sort(key=lambda c: (-c['max_score'], -c['size'], c['members'][0]))
+    return {
+        'documents': len(paths),
+        'candidates': len(candidates),
+        'threshold': threshold,
+        'clusters': clusters,
+        'errors': errors,
+    }
+
+
+def format_cluster_report(report):
+    """
+    生成文本形式的聚类报告。
+    参数:
+        report (dict): cluster_documents 的结果
+    返回:
+        str: 报告文本
+    """
+    lines = [
+        f"文档 {report['documents']} 篇，候选对 {report['candidates']} 个，"
+        f"重复率 ≥ {report['threshold']:.2f} % 的簇 {len(report['clusters'])} 个"
+    ]
+    for rank, cluster in enumerate(report['clusters'], 1):
+        lines.append(f"[{rank}] {cluster['size']} 篇，最高 {cluster['max_score']:.2f} %，"
+                     f"平均 {cluster['mean_score']:.2f} %")
+        for member in cluster['members']:
+            lines.append(f"    {member}")
+        for pair in cluster['pairs']:
+            lines.append(f"      {pair['score']:6.2f} %  {os.path.basename(pair['a'])} ↔ {os.path.basename(pair['b'])}")
+    for item in report['errors']:
+        lines.append(f"错误: {item['path']}: {item['error']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_cluster_report(report, path):
+    """
+    写出聚类报告：.json 为 JSON，其余为文本；path 为 '-' 时打印文本报告。
+    """
+    if path == '-':
+        print(format_cluster_report(report), end='')
+        return
+    with open(path, "w", encoding="utf-8") as file_handle:
+        if os.path.splitext(path)[1].lower() == '.json':
+            json.dump(report, file_handle, ensure_ascii=False, indent=2)
+            file_handle.write("\n")
+        else:
+            file_handle.write(format_cluster_report(report))
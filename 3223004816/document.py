@@ -0,0 +1,512 @@
+"""
+document.py
+作者: wangyq
+修改日期: 2025-09-16
+
+功能:
+提供可复用的文档对象 Document，惰性计算并缓存文本、分词、id 数组、n-gram 集合与 SimHash 指纹，
+以及基于它的 compare / compare_many 接口：一篇原文对比大量待检测文本时，原文只处理一次。
+"""
+
+import math
+from collections import namedtuple
+
+from similarity_functions import (lcs, lcs_sampled, edit_dist, edit_dist_sampled, jaccard_arrays, ngrams, ngram_hashes,
+                                  ngram_key_sets, simhash, fingerprint_sim, common_count, NgramHasher, SimhashAccumulator)
+from incremental import IncrementalSignature
+from myers_diff import diff_distance
+from profiling import cache_access, count, stage
+from tool_functions import tokenize, tokenize_with_offsets, read_file, iter_token_chunks, STREAM_CHUNK_SIZE
+from token_vocab import VOCAB
+from token_cache import get_default_cache
+
+# 各个相似度指标的默认权重比例
+DEFAULT_PERCENT = {
+    'lcs': 0.2,        # LCS
+    'edit': 0,         # 编辑距离
+    'jaccard': 0,      # Jaccard
+    'simhash': 0.8     # Simhash
+}
+# Jaccard 使用的 n-gram 长度
+JACCARD_N = 2
+# SimHash 指纹位数
+HASHBITS = 64
+# 由词频估计的插入删除次数不超过 (m+n) 的该比例时，先尝试 Myers O((m+n)·D) 差分
+MYERS_MAX_DIFF_RATIO = 0.1
+# 代价模型（微秒，实测标定）：Myers 约 D²/2，位并行 LCS 约 n·(LCS_ROW_COST + m / LCS_ROW_SCALE)
+LCS_ROW_COST = 0.4
+LCS_ROW_SCALE = 7000
+# 各指标在加权求和时的顺序
+METRICS = ('lcs', 'edit', 'jaccard', 'simhash')
+
+# 阈值判定的结果：是否达到阈值、最终得分的下界与上界、各指标结果（未计算为 None）、实际计算的指标
+ThresholdResult = namedtuple("ThresholdResult", "passed low high result computed")
+
+
+class Document:
+    """
+    文档对象，所有派生数据均在首次访问时计算并缓存。
+    参数:
+        path (str | None): 文件路径
+        text (str | None): 直接给定的文本，优先于 path
+        cache (TokenCache | None): 持久化缓存，默认使用 token_cache 的进程内默认缓存
+    """
+    __slots__ = ("path", "cache", "_text", "_tokens", "_ids", "_offsets", "_ngrams", "_ngram_keys",
+                 "_ngram_hashes", "_fingerprints")
+
+    def __init__(self, path=None, text=None, cache=None):
+        if path is None and text is None:
+            raise ValueError("path 与 text 至少需要给定一个")
+        self.path = path
+        self.cache = cache
+        self._text = text
+        self._tokens = None
+        self._ids = None
+        self._offsets = None
+        self._ngrams = {}        # n -> n-gram 集合
+        self._ngram_keys = {}    # n -> n-gram 键数组
+        self._ngram_hashes = {}  # n -> n-gram 哈希
+        self._fingerprints = {}  # hashbits 或 (hashbits, IDF 表前缀) -> 指纹
+
+    def __repr__(self):
+        return f"Document(path={self.path!r})"
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def text(self):
+        """文档文本"""
+        if self._text is None:
+            with stage("read"):
+                self._text = read_file(self.path)
+        return self._text
+
+    @property
+    def tokens(self):
+        """过滤后的分词结果 list[str]"""
+        if self._tokens is None:
+            cache = self.cache if self.cache is not None else get_default_cache()
+            if cache is None:
+                self._tokens = self._tokenize()
+            else:
+                self._load_cached(cache)
+        return self._tokens
+
+    def _tokenize(self):
+        text = self.text
+        with stage("tokenize"):
+            tokens = tokenize(text)
+        count("tokens", len(tokens))
+        return tokens
+
+    def _load_cached(self, cache):
+        """
+        从持久化缓存加载分词、n-gram 哈希与指纹；未命中时逐段落计算（复用段落缓存）并写回缓存。
+        """
+        key = cache.key(self.path) if self._text is None else cache.key(text=self._text)
+        entry = cache.get(key)
+        cache_access("token_cache", entry is not None)
+        if entry is None:
+            # 未命中时按段落处理：改动过的文档只需对新增或改动的段落分词
+            signature = IncrementalSignature(HASHBITS, JACCARD_N, cache)
+            text = self.text
+            with stage("tokenize"):
+                signature.update(text)
+            self._tokens = signature.tokens
+            count("tokens", len(self._tokens))
+            self._ngram_hashes[JACCARD_N] = signature.ngram_hashes()
+            self._fingerprints[HASHBITS] = signature.fingerprint()
+            cache.put(key, self._tokens, JACCARD_N, self._ngram_hashes[JACCARD_N], self._fingerprints[HASHBITS])
+            return
+        self._tokens = entry.tokens
+        self._ngram_hashes[entry.ngram_n] = entry.ngram_hashes
+        self._fingerprints[HASHBITS] = entry.fingerprint
+
+    @property
+    def offsets(self):
+        """每个 token 在文本中的字符区间 (starts, ends)，首次访问时重新分词以记录位置"""
+        if self._offsets is None:
+            text = self.text
+            with stage("tokenize"):
+                tokens, starts, ends = tokenize_with_offsets(text)
+            if self._tokens is None:
+                self._tokens = tokens
+            self._offsets = (starts, ends)
+        return self._offsets
+
+    @property
+    def ids(self):
+        """共享词表中的 id 数组 array('i')"""
+        if self._ids is None:
+            self._ids = VOCAB.encode(self.tokens)
+        return self._ids
+
+    def ngram_set(self, n=JACCARD_N):
+        """
+        返回文档的 n-gram 集合（基于 id 的打包整数键）。
+        参数:
+            n (int): n-gram 的长度
+        返回:
+            set[int]: n-gram 集合
+        """
+        result = self._ngrams.get(n)
+        if result is None:
+            result = self._ngrams[n] = ngrams(self.ids, n)
+        return result
+
+    def ngram_keys(self, n=JACCARD_N):
+        """
+        返回文档 n-gram 的键数组（排序去重），用于 jaccard_arrays；n <= 2 时无碰撞。
+        参数:
+            n (int): n-gram 的长度
+        返回:
+            np.ndarray: 键数组，见 similarity_functions.ngram_key_sets
+        """
+        result = self._ngram_keys.get(n)
+        if result is None:
+            result = self._ngram_keys[n] = ngram_key_sets(self.ids, (n,))[n]
+        return result
+
+    def ngram_hashes(self, n=JACCARD_N):
+        """
+        返回文档 n-gram 的 64 位哈希（排序去重）。
+        参数:
+            n (int): n-gram 的长度
+        返回:
+            np.ndarray: uint64 数组
+        """
+        result = self._ngram_hashes.get(n)
+        if result is None:
+            result = self._ngram_hashes[n] = ngram_hashes(self.ids, n)
+        return result
+
+    def fingerprint(self, hashbits=HASHBITS, idf=None):
+        """
+        返回文档的 SimHash 指纹。
+        参数:
+            hashbits (int): 指纹位数
+            idf (IdfTable | None): 给定时返回 TF-IDF 加权的指纹
+        返回:
+            int: SimHash 指纹
+        """
+        key = hashbits if idf is None else (hashbits, idf.prefix)
+        result = self._fingerprints.get(key)
+        if result is None:
+            result = self._fingerprints[key] = simhash(self.ids, hashbits, idf=idf)
+        return result
+
+
+def stream_signature(path, hashbits=HASHBITS, n=JACCARD_N, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    流式计算大文件的 SimHash 指纹与 n-gram 哈希，不在内存中保留全文或完整分词结果。
+    结果与 Document(path).fingerprint(hashbits) / ngram_hashes(n) 相同。
+    参数:
+        path (str): 文件路径
+        hashbits (int): 指纹位数
+        n (int): n-gram 的长度
+        chunk_size (int): 每块的字符数上限
+    返回:
+        tuple: (token 数, SimHash 指纹, n-gram 哈希 np.ndarray)
+    """
+    acc = SimhashAccumulator(hashbits)
+    hasher = NgramHasher(n)
+    count = 0
+    for tokens in iter_token_chunks(path, chunk_size, as_ids=True):
+        acc.update(tokens)
+        hasher.update(tokens)
+        count += len(tokens)
+    return count, acc.fingerprint(), hasher.digest()
+
+
+def as_document(doc):
+    """
+    将路径或 Document 统一转换为 Document。
+    参数:
+        doc (Document | str): 文档或文件路径
+    返回:
+        Document: 文档对象
+    """
+    return doc if isinstance(doc, Document) else Document(doc)
+
+
+def near_distance(a, b, common=None):
+    """
+    两个序列差异很少时，用 Myers 差分求只允许插入删除的编辑距离 D；否则返回 None。
+    D 的下界 m + n - 2·common_count 是 O(m+n) 的廉价估计，只有估计值足够小才运行 Myers，
+    实际差异超过预算时同样提前放弃，调用方退回 O(m·n) 算法。
+    预算取 D 的比例上限与“Myers 不慢于位并行 LCS”的 D 中较小者，提前放弃时浪费的时间不超过一次 LCS。
+    参数:
+        a (array): 序列 A 的 id 数组
+        b (array): 序列 B 的 id 数组
+        common (int | None): 已计算的 common_count(a, b)
+    返回:
+        int | None: D，差异过大时为 None
+    """
+    total = len(a) + len(b)
+    bitparallel_cost = len(b) * (LCS_ROW_COST + len(a) / LCS_ROW_SCALE)
+    budget = min(int(total * MYERS_MAX_DIFF_RATIO), math.isqrt(int(2 * bitparallel_cost)))
+    if common is None:
+        common = common_count(a, b)
+    if total - 2 * common > budget:
+        return None
+    with stage("myers"):
+        distance = diff_distance(a, b, budget)
+    count("myers.d", budget + 1 if distance is None else distance)
+    return distance
+
+
+def _jaccard(doc_a, doc_b, n=JACCARD_N):
+    # 两篇文档都已有 n-gram 哈希（如从持久化缓存加载）时直接使用，省去生成 n-gram 键；
+    # 否则用无碰撞且更便宜的 id 键。两者的碰撞概率见 ngram_hashes，结果在实际中相同
+    if n in doc_a._ngram_hashes and n in doc_b._ngram_hashes:
+        return jaccard_arrays(doc_a.ngram_hashes(n), doc_b.ngram_hashes(n))
+    return jaccard_arrays(doc_a.ngram_keys(n), doc_b.ngram_keys(n))
+
+
+def _lcs_length(a, b, distance):
+    # 已知插入删除距离 D 时 LCS = (m + n - D) / 2
+    if distance is not None:
+        return (len(a) + len(b) - distance) // 2
+    count("lcs.cells", len(a) * len(b))
+    return lcs(a, b)
+
+
+def _edit_distance(a, b, distance, max_distance=None):
+    # 编辑距离不超过 D，以 D 为上界时带状算法的结果即为精确值
+    if distance is not None and (max_distance is None or distance < max_distance):
+        max_distance = distance
+    if max_distance is None:
+        count("edit.cells", len(a) * len(b))
+        return edit_dist(a, b)
+    count("edit.cells", min(len(a) * len(b), (2 * max_distance + 1) * max(len(a), len(b))))
+    return edit_dist(a, b, max_distance=max_distance)
+
+
+def _planned_lcs(a, b, plan):
+    # 按计划计算 LCS 长度，返回 (长度, 使用的实现)
+    method = plan.methods['lcs']
+    if method == 'sampled':
+        count("lcs.cells", plan.windows * plan.width * 2 * plan.width)
+        return lcs_sampled(a, b, plan.windows, plan.width), method
+    count("lcs.cells", len(a) * len(b))
+    return lcs(a, b, method), method
+
+
+def _planned_edit(a, b, plan):
+    # 按计划计算编辑距离，返回 (距离, 使用的实现)；带状 DP 超过带宽时退回抽样估计
+    method = plan.methods['edit']
+    if method == 'banded':
+        count("edit.cells", min(len(a) * len(b), (2 * plan.band + 1) * max(len(a), len(b))))
+        distance = edit_dist(a, b, max_distance=plan.band, method=method)
+        if distance <= plan.band:
+            return distance, method
+        method = 'sampled'
+    if method == 'sampled':
+        count("edit.cells", plan.windows * plan.width * plan.width)
+        estimate = edit_dist_sampled(a, b, plan.windows, plan.width)
+        return estimate if plan.band is None else max(estimate, plan.band + 1), method
+    count("edit.cells", len(a) * len(b))
+    return edit_dist(a, b, method=method), method
+
+
+def weighted_score(result, percent=None):
+    """
+    由各指标的值按权重计算最终得分，已保存的指标向量换一组权重重新计分时无需重新计算指标。
+    参数:
+        result (dict): 各指标的值
+        percent (dict | None): 各指标权重，默认为 DEFAULT_PERCENT
+    返回:
+        float: 加权相似度百分比
+    """
+    percent = DEFAULT_PERCENT if percent is None else percent
+    return sum(percent[metric] * result[metric] for metric in METRICS) * 100
+
+
+def compare(doc_a, doc_b, percent=None, idf=None, plan=None):
+    """
+    计算两篇文档的相似度分数。
+    参数:
+        doc_a (Document | str): 原文
+        doc_b (Document | str): 待检测文本
+        percent (dict | None): 各指标权重，默认为 DEFAULT_PERCENT
+        idf (IdfTable | None): 给定时 SimHash 按 TF-IDF 加权
+        plan (Plan | None): planner.plan_metrics 给出的实现选择；给定时 result['plan'] 记录各指标实际使用的实现
+    返回:
+        tuple: (final_score, result)
+            - final_score (float): 最终加权相似度百分比
+            - result (dict): 各个相似度指标的结果
+    """
+    percent = DEFAULT_PERCENT if percent is None else percent
+    doc_a, doc_b = as_document(doc_a), as_document(doc_b)
+    orig_ids, copy_ids = doc_a.ids, doc_b.ids
+
+    # 校验输入是否为空
+    if len(orig_ids) == 0:
+        raise ValueError("原文为空，无法计算重复率")
+    if len(copy_ids) == 0:
+        raise ValueError("待检测文本为空，计算无效")
+
+    # 差异很少时 LCS 与编辑距离都可由 Myers 差分快速得到
+    # 计划中有近似实现时 Myers 的代价可能超出时间预算，不再尝试
+    distance = None
+    if (percent['lcs'] != 0.0 or percent['edit'] != 0.0) and (plan is None or plan.exact):
+        distance = near_distance(orig_ids, copy_ids)
+    used = None if plan is None else dict(plan.methods)
+
+    # LCS 计算
+    if percent['lcs'] != 0.0:
+        with stage("lcs"):
+            if plan is None or distance is not None:
+                lcs_length = _lcs_length(orig_ids, copy_ids, distance)
+            else:
+                lcs_length, used['lcs'] = _planned_lcs(orig_ids, copy_ids, plan)
+        lcs_sim = lcs_length / len(orig_ids)
+    else:
+        lcs_sim = 0
+
+    # 编辑距离计算
+    if percent['edit'] != 0.0:
+        with stage("edit"):
+            if plan is None or distance is not None:
+                edit_distance_val = _edit_distance(orig_ids, copy_ids, distance)
+            else:
+                edit_distance_val, used['edit'] = _planned_edit(orig_ids, copy_ids, plan)
+        edit_distance_sim = 1 - edit_distance_val / max(len(orig_ids), len(copy_ids), 1)
+    else:
+        edit_distance_sim = 0
+
+    # Jaccard 计算
+    if percent['jaccard'] != 0.0:
+        with stage("jaccard"):
+            jaccard_sim = _jaccard(doc_a, doc_b)
+    else:
+        jaccard_sim = 0
+
+    # Simhash 计算
+    if percent['simhash'] != 0.0:
+        with stage("simhash"):
+            simhash_sim = fingerprint_sim(doc_a.fingerprint(HASHBITS, idf), doc_b.fingerprint(HASHBITS, idf), HASHBITS)
+    else:
+        simhash_sim = 0
+
+    result = {
+        'lcs': lcs_sim,
+        'edit': edit_distance_sim,
+        'jaccard': jaccard_sim,
+        'simhash': simhash_sim
+    }
+    # 加权计算最终相似度得分
+    final_score = weighted_score(result, percent)
+    if used is not None:
+        if distance is not None:
+            used.update((metric, 'myers') for metric in ('lcs', 'edit') if percent[metric] != 0.0)
+        result['plan'] = used
+    return final_score, result
+
+
+def compare_threshold(doc_a, doc_b, threshold, percent=None, idf=None):
+    """
+    判断两篇文档的相似度是否达到阈值，只计算判定所必需的指标。
+    先计算 SimHash、Jaccard 等廉价指标，再用长度与词频给出 LCS / 编辑距离相似度的上界，
+    一旦最终得分的区间完全落在阈值一侧即停止；编辑距离以阈值推出的距离上界提前终止。
+    所有指标都被计算时，low == high 且等于 compare 的 final_score。
+    参数:
+        doc_a (Document | str): 原文
+        doc_b (Document | str): 待检测文本
+        threshold (float): 阈值（百分比，与 final_score 同单位）
+        percent (dict | None): 各指标权重（须非负），默认为 DEFAULT_PERCENT
+        idf (IdfTable | None): 给定时 SimHash 按 TF-IDF 加权
+    返回:
+        ThresholdResult: (passed, low, high, result, computed)
+            - passed (bool): 最终得分是否不低于阈值
+            - low / high (float): 最终得分的下界与上界
+            - result (dict): 已精确计算的指标值，未计算或提前终止的为 None
+            - computed (list[str]): 按顺序列出实际计算过的指标（含提前终止的编辑距离）
+    """
+    percent = DEFAULT_PERCENT if percent is None else percent
+    if any(percent[m] < 0 for m in METRICS):
+        raise ValueError("阈值判定要求各指标权重非负")
+    doc_a, doc_b = as_document(doc_a), as_document(doc_b)
+    orig_ids, copy_ids = doc_a.ids, doc_b.ids
+
+    # 校验输入是否为空
+    if len(orig_ids) == 0:
+        raise ValueError("原文为空，无法计算重复率")
+    if len(copy_ids) == 0:
+        raise ValueError("待检测文本为空，计算无效")
+
+    result = dict.fromkeys(METRICS)
+    low = dict.fromkeys(METRICS, 0.0)
+    high = dict.fromkeys(METRICS, 1.0)
+    computed = []
+
+    def settle(metric, value):
+        result[metric] = low[metric] = high[metric] = value
+        computed.append(metric)
+
+    def score(bound, skip=None):
+        return sum(percent[m] * bound[m] for m in METRICS if m != skip) * 100
+
+    def decided():
+        return score(low) >= threshold or score(high) < threshold
+
+    # 权重为 0 的指标与 compare 一致记为 0，不参与计算
+    for metric in METRICS:
+        if percent[metric] == 0.0:
+            result[metric] = low[metric] = high[metric] = 0
+
+    # 廉价指标：指纹与 n-gram 集合均在 Document 中缓存
+    if percent['simhash'] != 0.0:
+        with stage("simhash"):
+            settle('simhash', fingerprint_sim(doc_a.fingerprint(HASHBITS, idf), doc_b.fingerprint(HASHBITS, idf), HASHBITS))
+    if percent['jaccard'] != 0.0:
+        with stage("jaccard"):
+            settle('jaccard', _jaccard(doc_a, doc_b))
+
+    # 词频上界：LCS ≤ 多重集交集，编辑距离 ≥ 较长序列长度 - 多重集交集
+    longest = max(len(orig_ids), len(copy_ids))
+    common = None
+    if not decided() and (percent['lcs'] != 0.0 or percent['edit'] != 0.0):
+        common = common_count(orig_ids, copy_ids)
+        if percent['lcs'] != 0.0:
+            high['lcs'] = common / len(orig_ids)
+        if percent['edit'] != 0.0:
+            high['edit'] = common / longest
+
+    # 仍未判定时才需要 LCS / 编辑距离，差异很少时两者都由 Myers 差分得到
+    indel = near_distance(orig_ids, copy_ids, common) if not decided() and common is not None else None
+
+    if not decided() and percent['lcs'] != 0.0:
+        with stage("lcs"):
+            settle('lcs', _lcs_length(orig_ids, copy_ids, indel) / len(orig_ids))
+
+    if not decided() and percent['edit'] != 0.0:
+        # 达到阈值所需的最小编辑距离相似度，换算为距离上界
+        need = (threshold / 100 - score(high, skip='edit') / 100) / percent['edit']
+        max_distance = max(0, min(longest, math.floor((1 - max(need, 0.0)) * longest + 1e-9)))
+        with stage("edit"):
+            distance = _edit_distance(orig_ids, copy_ids, indel, max_distance)
+        if distance > max_distance:
+            high['edit'] = min(high['edit'], 1 - distance / longest)
+            computed.append('edit')
+        else:
+            settle('edit', 1 - distance / longest)
+
+    final_low, final_high = score(low), score(high)
+    return ThresholdResult(final_low >= threshold, final_low, final_high, result, computed)
+
+
+def compare_many(orig, copies, percent=None, idf=None):
+    """
+    将一篇原文与多篇待检测文本逐一比较，原文的读取、分词与指纹只计算一次。
+    参数:
+        orig (Document | str): 原文
+        copies (Iterable[Document | str]): 待检测文本
+        percent (dict | None): 各指标权重，默认为 DEFAULT_PERCENT
+        idf (IdfTable | None): 给定时 SimHash 按 TF-IDF 加权
+    返回:
+        list[tuple]: 与 copies 顺序一致的 (final_score, result) 列表
+    """
+    orig = as_document(orig)
+    return [compare(orig, copy, percent, idf) for copy in copies]
@@ -0,0 +1,202 @@
+"""
+file_reader.py
+作者: wangyq
+修改日期: 2025-09-16
+
+功能:
+批量读取文本文件：较大的文件以内存映射方式读取并一次性解码，按 BOM 与候选编码（UTF-8、GB18030）自动识别编码，
+换行统一为 "\n"（与文本模式读取一致）；iter_texts 在线程池中预读后续文件，使读取与相似度计算重叠；
+iter_decoded 以相同的编码识别规则流式解码，供分块分词使用。
+文件不存在时与 read_file 一致抛出 ValueError。
+"""
+
+import codecs
+import mmap
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# 无 BOM 时依次尝试的编码
+ENCODINGS = ("utf-8", "gb18030")
+# 按 BOM 识别的编码（先匹配较长的 BOM）
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+# 不小于该大小（字节）的文件使用内存映射，更小的文件直接读取
+MMAP_MIN_BYTES = 64 * 1024
+# iter_texts 默认预读的文件数
+PREFETCH_DEPTH = 8
+# iter_texts 默认的读取线程数
+READ_WORKERS = 4
+# iter_decoded 默认每次读取的字节数
+STREAM_BLOCK_BYTES = 1 << 20
+
+
+def decode_bytes(data, encodings=ENCODINGS):
+    """
+    解码文件内容：有 BOM 时按 BOM 解码，否则依次尝试 encodings，换行统一为 "\n"。
+    参数:
+        data (bytes | memoryview | mmap): 文件内容
+        encodings (Iterable[str]): 候选编码
+    返回:
+        tuple: (文本, 实际使用的编码)
+    异常:
+        UnicodeDecodeError: 所有候选编码都无法解码时抛出最后一个错误
+    """
+    view = memoryview(data)
+    try:
+        encoding, skip = _detect_bom(view)
+        if encoding is not None:
+            return _normalize_newlines(str(view[skip:], encoding)), encoding
+        error = None
+        for encoding in encodings:
+            try:
+                return _normalize_newlines(str(view, encoding)), encoding
+            except UnicodeDecodeError as exc:
+                error = exc
+        if error is None:
+            raise ValueError("至少需要一个候选编码")
+        raise error
+    finally:
+        view.release()
+
+
+def _detect_bom(head):
+    # 返回 (BOM 对应的编码, BOM 长度)，没有 BOM 时为 (None, 0)
+    for bom, encoding in BOMS:
+        if head[:len(bom)] == bom:
+            return encoding, len(bom)
+    return None, 0
+
+
+def _normalize_newlines(text):
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def read_text(path, encodings=ENCODINGS):
+    """
+    读取文本文件并自动识别编码。
+    参数:
+        path (str): 文件路径
+        encodings (Iterable[str]): 无 BOM 时依次尝试的编码
+    返回:
+        str: 文件内容
+    异常:
+        ValueError: 当文件不存在或编码无法识别时抛出
+    """
+    try:
+        with open(path, "rb") as file_handle:
+            size = os.fstat(file_handle.fileno()).st_size
+            if size < MMAP_MIN_BYTES:
+                return decode_bytes(file_handle.read(), encodings)[0]
+            with mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return decode_bytes(mapped, encodings)[0]
+    except FileNotFoundError as exc:
+        raise ValueError(f"文件 {path} 不存在！") from exc
+    except UnicodeDecodeError as exc:
+        raise _encoding_error(path, encodings) from exc
+
+
+def _encoding_error(path, encodings):
+    return ValueError(f"文件 {path} 的编码无法识别（已尝试 {', '.join(encodings)}）")
+
+
+def _scan_encoding(file_handle, block_size, encodings, path):
+    # 无 BOM 时逐块试解码整个文件，返回第一个能解码的候选编码
+    for encoding in encodings:
+        file_handle.seek(0)
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            while True:
+                data = file_handle.read(block_size)
+                decoder.decode(data, final=not data)
+                if not data:
+                    return encoding
+        except UnicodeDecodeError:
+            continue
+    if not encodings:
+        raise ValueError("至少需要一个候选编码")
+    raise _encoding_error(path, encodings)
+
+
+def iter_decoded(path, block_size=STREAM_BLOCK_BYTES, encodings=ENCODINGS):
+    """
+    流式读取文本文件，逐块产出解码后的文本，内存占用与文件大小无关。
+    编码识别与 read_text 一致：有 BOM 时按 BOM 解码，否则取第一个能解码整个文件的候选编码
+    （为此先完整扫描一遍文件），换行统一为 "\n"。所有块拼接后与 read_text(path) 相同。
+    参数:
+        path (str): 文件路径
+        block_size (int): 每次读取的字节数
+        encodings (Iterable[str]): 无 BOM 时依次尝试的编码
+    返回:
+        Iterator[str]: 文本块，每块不超过 block_size + 1 个字符
+    异常:
+        ValueError: 当文件不存在或编码无法识别时抛出
+    """
+    if block_size <= 0:
+        raise ValueError("block_size 必须大于0")
+    encodings = tuple(encodings)
+    try:
+        file_handle = open(path, "rb")
+    except FileNotFoundError as exc:
+        raise ValueError(f"文件 {path} 不存在！") from exc
+    with file_handle:
+        encoding, skip = _detect_bom(file_handle.read(4))
+        if encoding is None:
+            encoding = _scan_encoding(file_handle, block_size, encodings, path)
+        file_handle.seek(skip)
+        decoder = codecs.getincrementaldecoder(encoding)()
+        carry = ""
+        while True:
+            data = file_handle.read(block_size)
+            try:
+                text = carry + decoder.decode(data, final=not data)
+            except UnicodeDecodeError as exc:
+                raise _encoding_error(path, encodings) from exc
+            carry = ""
+            if data and text.endswith("\r"):  # "\r\n" 可能跨块，留到下一块再统一换行
+                text, carry = text[:-1], "\r"
+            if text:
+                yield _normalize_newlines(text)
+            if not data:
+                break
+
+
+def _read_or_error(path, encodings):
+    try:
+        return read_text(path, encodings), None
+    except (ValueError, OSError) as exc:
+        return None, exc
+
+
+def iter_texts(paths, workers=READ_WORKERS, prefetch=PREFETCH_DEPTH, encodings=ENCODINGS):
+    """
+    按顺序读取多个文件，同时在线程池中预读后续的 prefetch 个文件。
+    读取失败不会中断迭代，错误随结果返回。
+    参数:
+        paths (Iterable[str]): 文件路径
+        workers (int): 读取线程数
+        prefetch (int): 预读的文件数
+        encodings (Iterable[str]): 无 BOM 时依次尝试的编码
+    返回:
+        Iterator[tuple]: (路径, 文本, 错误)，成功时错误为 None，失败时文本为 None
+    """
+    if prefetch <= 0:
+        raise ValueError("prefetch 必须大于0")
+    encodings = tuple(encodings)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for path in paths:
+            pending.append((path, executor.submit(_read_or_error, path, encodings)))
+            if len(pending) > prefetch:
+                path, future = pending.popleft()
+                yield (path, *future.result())
+        while pending:
+            path, future = pending.popleft()
+            yield (path, *future.result())
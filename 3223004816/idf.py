@@ -0,0 +1,203 @@
+"""
+idf.py
+作者: wangyq
+修改日期: 2025-09-16
+
+功能:
+TF-IDF 加权 SimHash 使用的语料 IDF 表。
+普通 SimHash 中每个 token 的权重都是 ±1，“我们”、“进行”等常见词会主导指纹，只能靠 USELESS_WORDS 手工排除；
+按 IDF 加权后常见词的影响变小，不同文档的指纹区分度更高，下游检索可以使用更小的海明距离阈值。
+IDF 表由 build 命令对一个文档目录统计一次，保存为两个文件：
+    PREFIX.vocab  词表，UTF-8，每行一个 token，行号即下标
+    PREFIX.npy    float32 数组，第 i 项为第 i 个 token 的 IDF，最后一项为未登录词的 IDF
+加载时 .npy 以内存映射方式打开，词表在首次查询时才读取。
+IDF 采用平滑公式 ln((1 + N) / (1 + df)) + 1，N 为文档数，df 为包含该 token 的文档数。
+
+用法:
+    python idf.py build 语料目录 -o corpus_idf
+    python main.py 原文 待检测 结果 --idf corpus_idf
+"""
+
+import argparse
+import math
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from batch import init_worker
+from cluster import list_documents
+from document import Document
+from lazy_import import lazy_module
+from token_cache import get_default_cache, set_default_cache
+
+np = lazy_module("numpy", globals(), "np")
+
+VOCAB_SUFFIX = ".vocab"
+WEIGHTS_SUFFIX = ".npy"
+# 统计文档频率时每次分发给工作进程的文档数
+BUILD_CHUNK = 16
+
+
+def idf_value(df, total):
+    """
+    平滑 IDF：ln((1 + N) / (1 + df)) + 1。
+    参数:
+        df (int): 包含该 token 的文档数
+        total (int): 文档总数
+    返回:
+        float: IDF
+    """
+    return math.log((1 + total) / (1 + df)) + 1
+
+
+class IdfTable:
+    """
+    只读的 IDF 表，首次查询时才加载词表并以内存映射方式打开权重数组。
+    参数:
+        prefix (str): 文件前缀，对应 PREFIX.vocab 与 PREFIX.npy
+    """
+    __slots__ = ("prefix", "_index", "_weights")
+
+    def __init__(self, prefix):
+        for suffix in (VOCAB_SUFFIX, WEIGHTS_SUFFIX):
+            if not os.path.exists(prefix + suffix):
+                raise ValueError(f"IDF 表文件 {prefix + suffix} 不存在！")
+        self.prefix = prefix
+        self._index = None
+        self._weights = None
+
+    def __repr__(self):
+        return f"IdfTable({self.prefix!r})"
+
+    def __reduce__(self):
+        # 传给工作进程时只传前缀，同一进程内按前缀共享一个已加载的表
+        return load_idf, (self.prefix,)
+
+    def _load(self):
+        weights = np.load(self.prefix + WEIGHTS_SUFFIX, mmap_mode="r")
+        with open(self.prefix + VOCAB_SUFFIX, "r", encoding="utf-8") as file_handle:
+            words = file_handle.read().split("\n")
+        if words and words[-1] == "":
+            words.pop()
+        if len(weights) != len(words) + 1:
+            raise ValueError(f"IDF 表 {self.prefix} 的词表与权重数组长度不一致")
+        self._index = {word: i for i, word in enumerate(words)}
+        self._weights = weights
+
+    def __len__(self):
+        if self._index is None:
+            self._load()
+        return len(self._index)
+
+    def lookup(self, tokens):
+        """
+        查询一组 token 的 IDF，未登录词取表中保存的未登录词 IDF。
+        参数:
+            tokens (list[str]): token 列表
+        返回:
+            np.ndarray: 与输入等长的 float32 数组
+        """
+        if self._index is None:
+            self._load()
+        unknown = len(self._index)
+        index = self._index
+        return self._weights[[index.get(t, unknown) for t in tokens]]
+
+
+@lru_cache(maxsize=8)
+def load_idf(prefix):
+    """
+    按前缀打开 IDF 表，同一进程内重复打开同一前缀时返回同一个对象。
+    参数:
+        prefix (str): 文件前缀
+    返回:
+        IdfTable: IDF 表
+    """
+    return IdfTable(prefix)
+
+
+def _document_terms(path):
+    # 工作进程中读取并分词，返回文档中出现过的 token（去重），失败时返回错误信息
+    try:
+        return set(Document(path).tokens), None
+    except (ValueError, OSError) as exc:
+        return None, f"{path}: {exc}"
+
+
+def build_idf(paths, prefix, workers=None, cache=None):
+    """
+    统计一组文档的文档频率并写出 IDF 表。
+    参数:
+        paths (list[str]): 语料文件路径
+        prefix (str): 输出文件前缀
+        workers (int | None): 工作进程数，1 为在当前进程中统计
+        cache (TokenCache | None): 持久化缓存，已缓存的文档不再分词
+    返回:
+        tuple: (IdfTable, 成功统计的文档数, 错误信息列表)
+    """
+    df, errors, total = Counter(), [], 0
+    previous, executor = get_default_cache(), None
+    if workers == 1:
+        init_worker(cache)
+        results = map(_document_terms, paths)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(cache,))
+        results = executor.map(_document_terms, paths, chunksize=BUILD_CHUNK)
+    try:
+        for terms, error in results:
+            if error is not None:
+                errors.append(error)
+                continue
+            df.update(terms)
+            total += 1
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        set_default_cache(previous)
+    if total == 0:
+        raise ValueError("语料中没有可用的文档，无法生成 IDF 表")
+    write_idf(df, total, prefix)
+    return IdfTable(prefix), total, errors
+
+
+def write_idf(df, total, prefix):
+    """
+    由文档频率写出 IDF 表（词表按 token 排序）。
+    参数:
+        df (Mapping[str, int]): token -> 文档频率
+        total (int): 文档总数
+        prefix (str): 输出文件前缀
+    """
+    words = sorted(df)
+    weights = np.empty(len(words) + 1, dtype=np.float32)
+    weights[:-1] = [idf_value(df[w], total) for w in words]
+    weights[-1] = idf_value(0, total)
+    directory = os.path.dirname(os.path.abspath(prefix))
+    os.makedirs(directory, exist_ok=True)
+    with open(prefix + VOCAB_SUFFIX, "w", encoding="utf-8") as file_handle:
+        file_handle.write("".join(w + "\n" for w in words))
+    np.save(prefix + WEIGHTS_SUFFIX, weights)
+
+
+def main():
+    """
+    命令行入口：python idf.py build 语料目录 -o 前缀
+    """
+    parser = argparse.ArgumentParser(description="语料 IDF 表")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="统计目录中全部文档的文档频率并写出 IDF 表")
+    build.add_argument("corpus_dir", help="语料目录")
+    build.add_argument("-o", "--output", required=True, help="输出文件前缀（生成 PREFIX.vocab 与 PREFIX.npy）")
+    build.add_argument("--workers", type=int, default=None, help="工作进程数，默认为 CPU 核数")
+    args = parser.parse_args()
+
+    table, total, errors = build_idf(list_documents(args.corpus_dir), args.output, args.workers)
+    for error in errors:
+        print(f"跳过: {error}", file=sys.stderr)
+    print(f"已统计 {total} 篇文档、{len(table)} 个词，IDF 表写入 {args.output}{VOCAB_SUFFIX} / {args.output}{WEIGHTS_SUFFIX}")
+
+
+if __name__ == "__main__":
+    main()
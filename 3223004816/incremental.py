@@ -0,0 +1,196 @@
+"""
+incremental.py
+作者: wangyq
+修改日期: 2025-09-16
+
+功能:
+修改后重新提交的文档的增量处理：文档按换行切分为段落，以段落内容哈希为键缓存分词结果与 SimHash 权重向量。
+    - 重新提交时只对新增或改动的段落分词、计算权重，未改动的段落（即使位置移动）直接复用
+    - 文档的 SimHash 权重向量 v 与 n-gram 多重集合为各段落之和：删去的段落减去、新增的段落加上，不重新整体计算
+    - 跨越段落边界的 n-gram 只与相邻段落首尾的 n-1 个 token 有关，每次更新时按段落顺序重新计算
+jieba 不会跨越换行分词，逐段分词拼接后的结果与整体分词相同，因此指纹与 n-gram 哈希与整篇计算的结果一致。
+给定 TokenCache 时段落缓存跨进程、跨运行共享。
+"""
+
+import hashlib
+from collections import Counter, namedtuple
+
+from lazy_import import lazy_module
+from profiling import count
+from similarity_functions import fingerprint_from_weights, ngram_hash_sequence, simhash_weights
+from token_cache import TokenCache
+from tool_functions import tokenize
+
+np = lazy_module("numpy", globals(), "np")
+
+# 一次更新的统计：段落总数、复用（已在内存中）、从缓存加载、重新分词、移除的段落数
+UpdateStats = namedtuple("UpdateStats", "chunks reused cached tokenized removed")
+
+
+class _Chunk:
+    # 单个段落的分词结果、权重向量与段内 n-gram 多重集合
+    __slots__ = ("tokens", "weights", "grams")
+
+    def __init__(self, tokens, weights, n):
+        self.tokens = tokens
+        self.weights = weights
+        hashes, freq = np.unique(ngram_hash_sequence(tokens, n), return_counts=True)
+        self.grams = dict(zip(hashes.tolist(), freq.tolist()))
+
+
+def split_chunks(text):
+    """
+    按换行把文本切分为段落，去掉只含空白的行（它们不产生 token）。
+    参数:
+        text (str): 文本
+    返回:
+        list[str]: 段落
+    """
+    return [line for line in text.split("\n") if line.strip()]
+
+
+def chunk_digest(chunk):
+    """
+    段落的内容哈希。
+    参数:
+        chunk (str): 段落文本
+    返回:
+        str: 十六进制 SHA-1
+    """
+    return hashlib.sha1(chunk.encode("utf-8")).hexdigest()
+
+
+def _add_counts(total, counts, sign):
+    # total += sign * counts，计数降为 0 的项删除
+    for key, value in counts.items():
+        value = total.get(key, 0) + sign * value
+        if value:
+            total[key] = value
+        else:
+            del total[key]
+
+
+class IncrementalSignature:
+    """
+    可增量更新的文档签名（分词结果、SimHash 指纹与 n-gram 哈希）。
+        sig = IncrementalSignature(cache=cache)
+        sig.update(text)          # 首次提交
+        sig.update(edited_text)   # 重新提交：只处理改动的段落
+        sig.fingerprint(), sig.ngram_hashes()
+    参数:
+        hashbits (int): SimHash 指纹位数
+        n (int): n-gram 的长度
+        cache (TokenCache | None): 段落的持久化缓存
+    """
+    __slots__ = ("hashbits", "n", "cache", "_digests", "_chunks", "_v", "_grams", "_cross")
+
+    def __init__(self, hashbits=64, n=2, cache=None):
+        if not isinstance(hashbits, int) or hashbits <= 0:
+            raise ValueError("hashbits 必须为正整数")
+        if not isinstance(n, int) or n <= 0:
+            raise ValueError("n-gram 长度必须大于0")
+        self.hashbits = hashbits
+        self.n = n
+        self.cache = cache
+        self._digests = []        # 当前各段落的内容哈希（按顺序）
+        self._chunks = {}         # 内容哈希 -> _Chunk
+        self._v = np.zeros(hashbits, dtype=np.int64)
+        self._grams = {}          # 段内 n-gram 哈希 -> 次数（各段落之和）
+        self._cross = Counter()   # 跨越段落边界的 n-gram 哈希 -> 次数
+
+    def __len__(self):
+        return sum(len(self._chunks[d].tokens) for d in self._digests)
+
+    def update(self, text):
+        """
+        用文档的新版本更新签名。
+        参数:
+            text (str): 文档全文
+        返回:
+            UpdateStats: 本次更新的段落统计
+        """
+        pieces = split_chunks(text)
+        digests = [chunk_digest(piece) for piece in pieces]
+        old, new = Counter(self._digests), Counter(digests)
+
+        removed = old - new
+        for digest, times in removed.items():
+            self._apply(self._chunks[digest], -times)
+        missing = {d: piece for d, piece in zip(digests, pieces) if d not in self._chunks}
+        cached = self._load(missing)
+        for digest, piece in missing.items():
+            if digest not in cached:
+                tokens = tokenize(piece)
+                self._chunks[digest] = _Chunk(tokens, simhash_weights(tokens, self.hashbits), self.n)
+        tokenized = len(missing) - len(cached)
+        self._store([d for d in missing if d not in cached])
+        for digest, times in (new - old).items():
+            self._apply(self._chunks[digest], times)
+        for digest in removed:
+            if digest not in new:
+                del self._chunks[digest]
+
+        self._digests = digests
+        self._cross = self._cross_grams()
+        count("chunks.tokenized", tokenized)
+        return UpdateStats(len(digests), len(digests) - len(missing), len(cached), tokenized, sum(removed.values()))
+
+    def _apply(self, chunk, times):
+        # 加上（times > 0）或减去（times < 0）一个段落的贡献
+        self._v += times * chunk.weights
+        _add_counts(self._grams, chunk.grams, times)
+
+    def _load(self, missing):
+        # 从持久化缓存加载段落，返回命中的内容哈希集合
+        if self.cache is None or not missing:
+            return set()
+        keys = {TokenCache.chunk_key(d, self.hashbits): d for d in missing}
+        entries = self.cache.get_chunks(keys)
+        for key, entry in entries.items():
+            self._chunks[keys[key]] = _Chunk(entry.tokens, entry.weights, self.n)
+        return {keys[key] for key in entries}
+
+    def _store(self, digests):
+        if self.cache is not None and digests:
+            self.cache.put_chunks((TokenCache.chunk_key(d, self.hashbits), self._chunks[d].tokens,
+                                   self._chunks[d].weights) for d in digests)
+
+    def _cross_grams(self):
+        # 依次以前面末尾的 n-1 个 token 接上本段开头的 n-1 个 token，其中的 n-gram 都跨越段落边界
+        cross = Counter()
+        if self.n == 1:
+            return cross
+        tail = []
+        for digest in self._digests:
+            tokens = self._chunks[digest].tokens
+            if tail:
+                cross.update(ngram_hash_sequence(tail + tokens[:self.n - 1], self.n).tolist())
+            tail = (tail + tokens)[-(self.n - 1):]
+        return cross
+
+    @property
+    def tokens(self):
+        """全文的分词结果 list[str]，与 tokenize(text) 相同"""
+        result = []
+        for digest in self._digests:
+            result.extend(self._chunks[digest].tokens)
+        return result
+
+    @property
+    def weights(self):
+        """全文的 SimHash 权重向量（副本）"""
+        return self._v.copy()
+
+    def fingerprint(self):
+        """
+        返回全文的 SimHash 指纹，与 simhash(tokens, hashbits) 相同。
+        """
+        return fingerprint_from_weights(self._v)
+
+    def ngram_hashes(self):
+        """
+        返回全文 n-gram 的 64 位哈希（排序去重），与 ngram_hashes(tokens, n) 相同。
+        """
+        keys = set(self._grams)
+        keys.update(self._cross)
+        return np.array(sorted(keys), dtype=np.uint64)
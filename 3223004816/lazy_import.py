@@ -0,0 +1,72 @@
+"""
+lazy_import.py
+作者: wangyq
+修改日期: 2025-09-16
+
+功能:
+提供延迟导入：模块在首次访问其属性时才真正导入，并将调用方模块中的名字替换为真实模块，
+之后的访问没有额外开销。用于让 numpy、jieba 等重型依赖只在确实需要时才加载。
+"""
+
+import importlib
+import sys
+
+
+class LazyModule:
+    """
+    延迟导入的模块代理。
+    参数:
+        name (str): 模块名
+        namespace (dict | None): 调用方的 globals()，导入后其中的 alias 被替换为真实模块
+        alias (str | None): 调用方使用的名字
+        on_load (Callable | None): 首次导入后调用的初始化函数，参数为真实模块
+    """
+    __slots__ = ("_name", "_namespace", "_alias", "_on_load", "_module")
+
+    def __init__(self, name, namespace=None, alias=None, on_load=None):
+        self._name = name
+        self._namespace = namespace
+        self._alias = alias
+        self._on_load = on_load
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            module = importlib.import_module(self._name)
+            if self._on_load is not None:
+                self._on_load(module)
+            self._module = module
+            if self._namespace is not None and self._alias is not None:
+                self._namespace[self._alias] = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<LazyModule {self._name!r} ({state})>"
+
+
+def lazy_module(name, namespace=None, alias=None, on_load=None):
+    """
+    返回模块代理；模块已导入时直接返回真实模块。
+    参数:
+        name (str): 模块名
+        namespace (dict | None): 调用方的 globals()
+        alias (str | None): 调用方使用的名字
+        on_load (Callable | None): 首次导入后调用的初始化函数
+    返回:
+        LazyModule | module: 模块代理或真实模块
+    """
+    module = sys.modules.get(name)
+    if module is not None and on_load is None:
+        return module
+    return LazyModule(name, namespace, alias, on_load)
+
+
+def is_loaded(name):
+    """
+    判断模块是否已经导入。
+    """
+    return name in sys.modules
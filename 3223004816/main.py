@@ -8,107 +8,380 @@ main.py
 """
 
 import argparse
-from similarity_functions import lcs, edit_dist, jaccard2, simhash_res
-from tool_functions import tokenize, read_file, write_result
-# import time
+import json
+import os
+import sys
+import time
 
-def similarity_score(orig_path, copy_path):
+# 启动耗时测量中依次导入的模块
+STARTUP_MODULES = ('numpy', 'jieba', 'similarity_functions', 'tool_functions', 'document')
+
+def similarity_score(orig_path, copy_path, chunked=False, workers=None, idf=None, percent=None, time_budget_ms=None):
     """
     计算两个文件的相似度分数。
     参数:
         orig_path (str): 原文文件路径
         copy_path (str): 待检测文件路径
+        chunked (bool): 为 True 时按句子 / 段落分块近似计算 LCS（用于长文档）
+        workers (int | None): 分块模式下并行计算块对 LCS 的进程数
+        idf (IdfTable | None): 给定时 SimHash 按 TF-IDF 加权
+        percent (dict | None): 各指标权重，默认为 DEFAULT_PERCENT
+        time_budget_ms (float | None): 给定时由 planner 按文档长度与预算选择各指标的实现，result['plan'] 记录选择
     返回:
         tuple: (final_score, result)
             - final_score (float): 最终加权相似度百分比
             - result (dict): 各个相似度指标的结果
     """
-    # 定义各个相似度指标的权重比例
-    percent = {
-        'lcs': 0.2,        # LCS
-        'edit': 0,       # 编辑距离
-        'jaccard': 0,     # Jaccard
-        'simhash': 0.8      # Simhash
-    }
-    # start = time.time()
-    # 读取原文并分词
-    orig_text = read_file(orig_path)
-    orig_tokens = tokenize(orig_text)
-
-    # 读取待检测文本并分词
-    copy_text = read_file(copy_path)
-    copy_tokens = tokenize(copy_text)
-
-    # 校验输入是否为空
-    if len(orig_tokens) == 0:
-        raise ValueError("原文为空，无法计算重复率")
-    if len(copy_tokens) == 0:
-        raise ValueError("待检测文本为空，计算无效")
-
-    # LCS 计算
-    if percent['lcs'] != 0.0:
-        lcs_len = lcs(orig_tokens, copy_tokens)
-        lcs_sim = lcs_len / len(orig_tokens)
-    else:
-        lcs_sim = 0
-
-    # 编辑距离计算
-    if percent['edit'] != 0.0:
-        edit_distance_val = edit_dist(orig_tokens, copy_tokens)
-        edit_distance_sim = 1 - edit_distance_val / max(
-            len(orig_tokens), len(copy_tokens), 1
-        )
-    else:
-        edit_distance_sim = 0
+    from document import Document, compare
+    from profiling import session
+    with session("similarity_score"):
+        if chunked:
+            from chunked import compare_chunked
+            return compare_chunked(Document(orig_path), Document(copy_path), percent, workers, idf)
+        if time_budget_ms is not None:
+            from planner import compare_planned
+            return compare_planned(Document(orig_path), Document(copy_path), percent, time_budget_ms, idf)
+        return compare(Document(orig_path), Document(copy_path), percent, idf)
+
+
+def similarity_verdict(orig_path, copy_path, threshold, idf=None, percent=None):
+    """
+    判断两个文件的相似度是否达到阈值，判定已确定时跳过昂贵的指标。
+    参数:
+        orig_path (str): 原文文件路径
+        copy_path (str): 待检测文件路径
+        threshold (float): 阈值（百分比）
+        idf (IdfTable | None): 给定时 SimHash 按 TF-IDF 加权
+        percent (dict | None): 各指标权重，默认为 DEFAULT_PERCENT
+    返回:
+        ThresholdResult: 判定结果，见 document.compare_threshold
+    """
+    from document import Document, compare_threshold
+    return compare_threshold(Document(orig_path), Document(copy_path), threshold, percent, idf)
+
+
+def build_parser():
+    """
+    构建命令行参数解析器。
+    """
+    parser = argparse.ArgumentParser(description="计算两个文本文件的相似度")
+    parser.add_argument('orig_path', nargs='?', help='原文文件路径')
+    parser.add_argument('copy_path', nargs='?', help='待测试文件路径')
+    parser.add_argument('output_path', nargs='?', help='输出结果文件路径')
+
+    parser.add_argument('--cache', help='持久化分词缓存文件（SQLite），重复检查同一文件时跳过读取与分词')
+    parser.add_argument('--cache-max-mb', type=int, default=256, help='持久化缓存容量上限（MB）')
+    parser.add_argument('--server', default=os.environ.get('SIMCHECK_SERVER'),
+                        help='常驻服务地址（Unix 套接字路径或 host:port），服务运行时转发请求；'
+                             '默认读取环境变量 SIMCHECK_SERVER，或使用默认套接字')
+    parser.add_argument('--no-server', action='store_true', help='不转发到常驻服务，始终在本进程中计算')
+    parser.add_argument('--threshold', type=float, default=None,
+                        help='只判断重复率是否达到该阈值（百分比），判定确定后跳过昂贵的指标')
+    parser.add_argument('--report', nargs='?', const='-', metavar='PATH',
+                        help='输出重复片段报告（winnowing 定位的原文与待检测文本位置），写入 PATH，省略时打印')
+    parser.add_argument('--profile', action='store_true',
+                        help='在标准错误输出中打印各阶段耗时、token 数、DP 单元数与缓存命中率')
+    parser.add_argument('--stats-json', metavar='PATH',
+                        help='将各阶段统计以 JSON 写入 PATH（- 为标准输出）')
+    parser.add_argument('--chunked', action='store_true',
+                        help='长文档模式：按句子 / 段落分块，只对共享 n-gram 的块对计算 LCS（近似值，不超过精确值），'
+                             '块对在 --workers 个进程中并行')
+    parser.add_argument('--idf', metavar='PREFIX',
+                        help='使用 idf.py build 生成的语料 IDF 表（PREFIX.vocab / PREFIX.npy）计算 TF-IDF 加权的 SimHash，'
+                             '适用于所有模式')
+    parser.add_argument('--weights', default=os.environ.get('SIMCHECK_WEIGHTS'), metavar='SPEC',
+                        help='各指标权重：预设名（default / balanced）、"lcs=0.2,simhash=0.8" 或 JSON 文件，'
+                             '未列出的指标为 0，按总和归一化；默认读取环境变量 SIMCHECK_WEIGHTS，适用于所有模式')
+    parser.add_argument('--time-budget-ms', type=float, default=None, metavar='MS',
+                        help='单对比较的时间预算（毫秒）：按文档长度与代价模型为 LCS / 编辑距离选择精确、带状或抽样实现，'
+                             '并打印所选实现')
+    parser.add_argument('--store', metavar='PATH',
+                        help='结果库（.jsonl 为 JSONL，其余为 SQLite）：分批追加文档对、完整的指标向量、得分与耗时，'
+                             '之后可用 result_store.py rescore 换权重重新计分；适用于单对、批量与聚类模式')
+    parser.add_argument('--jieba-cache', default=None,
+                        help='jieba 预构建词典缓存文件位置，默认读取环境变量 SIMCHECK_JIEBA_CACHE 或使用系统临时目录')
+    parser.add_argument('--startup-time', nargs='?', const='-', metavar='PATH',
+                        help='测量各模块导入与 jieba 词典加载耗时并输出 JSON（追加到 PATH，省略时打印），然后退出')
+
+    batch = parser.add_argument_group('批量模式')
+    batch.add_argument('--manifest', help='清单文件，每行为 "原文路径,待检测路径"')
+    batch.add_argument('--orig-dir', help='原文目录（或单个原文文件），与 --copy-dir 按文件名配对')
+    batch.add_argument('--copy-dir', help='待检测文件目录')
+    batch.add_argument('-o', '--output', help='批量结果输出文件（.csv 或 .jsonl），给定 --store 时可省略')
+    batch.add_argument('--format', choices=('csv', 'jsonl'), help='输出格式，默认按扩展名判断')
+    batch.add_argument('--workers', type=int, default=None, help='工作进程数，默认为 CPU 核数')
+    batch.add_argument('--chunk-size', type=int, default=16, help='每次分发给工作进程的文件对数量')
+    batch.add_argument('--prefetch', type=int, default=8, help='在后台线程中预读的待检测文件数，0 为不预读')
+
+    cluster = parser.add_argument_group('聚类模式')
+    cluster.add_argument('--cluster-dir', metavar='DIR',
+                         help='对目录中的全部文档两两查重并聚类：阈值取 --threshold（默认 80），'
+                              '报告写入 -o（.json 为 JSON，省略时打印），并复用 --workers / --chunk-size / --cache')
+    return parser
+
+
+def measure_startup(modules=STARTUP_MODULES):
+    """
+    依次导入各模块并加载 jieba 词典，记录每一步的耗时（毫秒）。
+    已导入的模块耗时记为 0，因此应在全新进程中调用。
+    参数:
+        modules (Iterable[str]): 待导入的模块名
+    返回:
+        dict: 各步骤耗时，键为模块名、'jieba.initialize' 与 'total'
+    """
+    import importlib
+
+    timings = {}
+    start = time.perf_counter()
+    for name in modules:
+        t0 = time.perf_counter()
+        importlib.import_module(name)
+        timings[name] = (time.perf_counter() - t0) * 1000
+    from tool_functions import init_jieba
+    t0 = time.perf_counter()
+    init_jieba()
+    timings['jieba.initialize'] = (time.perf_counter() - t0) * 1000
+    timings['total'] = (time.perf_counter() - start) * 1000
+    return timings
+
+
+def report_startup(path):
+    """
+    测量启动耗时并以 JSON 输出；path 为 '-' 时打印，否则追加一行到文件。
+    """
+    line = json.dumps({'time': time.time(), 'ms': measure_startup()}, ensure_ascii=False)
+    if path == '-':
+        print(line)
+        return
+    with open(path, 'a', encoding='utf-8') as file_handle:
+        file_handle.write(line + '\n')
+
+
+def open_cache(args):
+    """
+    按命令行参数打开持久化缓存，未启用时返回 None。
+    """
+    if not args.cache:
+        return None
+    from token_cache import TokenCache
+    return TokenCache(args.cache, max_bytes=args.cache_max_mb * 1024 * 1024)
+
+
+def open_store(args):
+    """
+    按命令行参数打开结果库，未启用时返回 None。
+    """
+    if not args.store:
+        return None
+    from result_store import open_result_store
+    return open_result_store(args.store, args.percent)
 
-    # Jaccard 计算
-    if percent['jaccard'] != 0.0:
-        jaccard_sim = jaccard2(orig_tokens, copy_tokens, 2)
-    else:
-        jaccard_sim = 0
 
-    # Simhash 计算
-    if percent['simhash'] != 0.0:
-        simhash_sim = simhash_res(orig_tokens, copy_tokens)
+def open_idf(args):
+    """
+    按命令行参数打开 IDF 表（首次使用时才加载），未启用时返回 None。
+    """
+    if not args.idf:
+        return None
+    from idf import load_idf
+    return load_idf(args.idf)
+
+
+def score_via_server(args):
+    """
+    尝试通过常驻服务计算相似度，服务不可用时返回 None。
+    """
+    if args.no_server:
+        return None
+    from server import DEFAULT_SOCKET, is_trusted_socket, request_score
+
+    address = args.server
+    if address is None:
+        if not is_trusted_socket(DEFAULT_SOCKET):  # 只自动转发到当前用户自己的服务
+            return None
+        address = DEFAULT_SOCKET
+    try:
+        score, _ = request_score(address, args.orig_path, args.copy_path, args.percent)
+    except ConnectionError:
+        return None
+    return score
+
+
+def run_batch_mode(parser, args):
+    """
+    批量模式：生成文件对并行计算，结果写入单个文件。
+    """
+    from batch import load_manifest, pairs_from_dirs, run_batch
+
+    if args.orig_path or args.copy_path or args.output_path:
+        parser.error("批量模式下不能同时给定单对文件路径")
+    if not args.output and not args.store:
+        parser.error("批量模式需要 -o/--output 或 --store")
+    if args.manifest:
+        pairs = load_manifest(args.manifest)
+    elif args.orig_dir and args.copy_dir:
+        pairs = pairs_from_dirs(args.orig_dir, args.copy_dir)
     else:
-        simhash_sim = 0
-
-    # 加权计算最终相似度得分
-    final_score = (
-        percent['lcs'] * lcs_sim +
-        percent['edit'] * edit_distance_sim +
-        percent['jaccard'] * jaccard_sim +
-        percent['simhash'] * simhash_sim
-    ) * 100
-
-    result = {
-        'lcs': lcs_sim,
-        'edit': edit_distance_sim,
-        'jaccard': jaccard_sim,
-        'simhash': simhash_sim
-    }
-    # end = time.time()
-    # print(f"程序运行时间: {end - start:.4f} 秒")
-    return final_score, result
+        parser.error("--orig-dir 与 --copy-dir 需要同时给定")
+    store = open_store(args)
+    try:
+        count = run_batch(pairs, args.output, workers=args.workers,
+                          chunk_size=args.chunk_size, fmt=args.format, cache=open_cache(args),
+                          prefetch=args.prefetch, idf=open_idf(args), percent=args.percent, store=store)
+    finally:
+        if store is not None:
+            store.close()
+    print(f"已完成 {count} 对文本的比较，结果写入 {', '.join(p for p in (args.output, args.store) if p)}")
+
+
+def run_cluster_mode(parser, args):
+    """
+    聚类模式：分块得到候选文档对，只对候选对计算得分，按阈值聚类并输出报告。
+    """
+    from cluster import DEFAULT_THRESHOLD, cluster_documents, list_documents, write_cluster_report
+
+    if args.orig_path or args.copy_path or args.output_path:
+        parser.error("聚类模式下不能同时给定单对文件路径")
+    threshold = DEFAULT_THRESHOLD if args.threshold is None else args.threshold
+    store = open_store(args)
+    try:
+        report = cluster_documents(list_documents(args.cluster_dir), threshold, args.percent, workers=args.workers,
+                                   cache=open_cache(args), chunk_size=args.chunk_size, idf=open_idf(args),
+                                   store=store)
+    finally:
+        if store is not None:
+            store.close()
+    write_cluster_report(report, args.output or '-')
+    if args.output:
+        print(f"{report['documents']} 篇文档中找到 {len(report['clusters'])} 个重复簇，报告写入 {args.output}")
+
+
+def run_store_mode(args):
+    """
+    单对模式写入结果库：计算完整的指标向量，写入结果库后返回得分。
+    """
+    from batch import score_pair
+    from token_cache import set_default_cache
+
+    set_default_cache(open_cache(args))
+    row = score_pair((args.orig_path, args.copy_path), args.percent, idf=open_idf(args), full=True)
+    if row['error'] is not None:
+        raise ValueError(row['error'])
+    with open_store(args) as store:
+        store.add(row)
+    return row['score']
+
+
+def write_report(orig_path, copy_path, path):
+    """
+    生成重复片段报告；path 为 '-' 时打印，否则写入文件。
+    """
+    from document import Document
+    from winnowing import format_report, matched_spans
+
+    orig, copy = Document(orig_path), Document(copy_path)
+    report = format_report(orig, copy, matched_spans(orig, copy))
+    if path == '-':
+        print(report, end='')
+        return
+    with open(path, 'w', encoding='utf-8') as file_handle:
+        file_handle.write(report)
+
+
+def report_stats(stats, args):
+    """
+    按 --profile / --stats-json 输出统计结果。
+    """
+    if args.profile:
+        print(stats.format(), file=sys.stderr)
+    if args.stats_json:
+        line = json.dumps(stats.as_dict(), ensure_ascii=False)
+        if args.stats_json == '-':
+            print(line)
+        else:
+            with open(args.stats_json, 'w', encoding='utf-8') as file_handle:
+                file_handle.write(line + '\n')
+
+
+def run_threshold_mode(args):
+    """
+    阈值模式：输出是否达到阈值、得分区间与实际计算的指标，结果文件写入得分下界。
+    """
+    from token_cache import set_default_cache
+    from tool_functions import write_result
+
+    set_default_cache(open_cache(args))
+    verdict = similarity_verdict(args.orig_path, args.copy_path, args.threshold, open_idf(args), args.percent)
+    write_result(args.output_path, verdict.low)
+    answer = "是" if verdict.passed else "否"
+    print(f"重复率 ≥ {args.threshold:.2f} %: {answer}（得分区间 [{verdict.low:.2f}, {verdict.high:.2f}] %，"
+          f"已计算: {', '.join(verdict.computed) or '无'}）")
 
 
 def main():
     """
     主函数，解析命令行参数并计算相似度。
     """
-    parser = argparse.ArgumentParser(description="计算两个文本文件的相似度")
-    parser.add_argument('orig_path', help='原文文件路径')
-    parser.add_argument('copy_path', help='待测试文件路径')
-    parser.add_argument('output_path', help='输出结果文件路径')
+    parser = build_parser()
     args = parser.parse_args()
+    args.percent = None
+    if args.weights:
+        from planner import load_weights
+        try:
+            args.percent = load_weights(args.weights)
+        except ValueError as exc:
+            parser.error(str(exc))
+    if args.time_budget_ms is not None and (args.time_budget_ms <= 0 or args.chunked):
+        parser.error("--time-budget-ms 须为正数，且不能与 --chunked 同时使用")
+
+    if args.jieba_cache:
+        from tool_functions import JIEBA_CACHE_ENV, set_jieba_cache
+        os.environ[JIEBA_CACHE_ENV] = args.jieba_cache  # 以 spawn 方式启动的工作进程同样生效
+        set_jieba_cache(args.jieba_cache)
+    if args.startup_time:
+        report_startup(args.startup_time)
+        return
+    if args.cluster_dir:
+        run_cluster_mode(parser, args)
+        return
+    if args.manifest or args.orig_dir or args.copy_dir:
+        run_batch_mode(parser, args)
+        return
+    if not (args.orig_path and args.copy_path and args.output_path):
+        parser.error("需要给定 原文路径 待测试路径 输出路径，或使用批量模式")
+
+    if args.store and (args.threshold is not None or args.chunked or args.time_budget_ms):
+        parser.error("单对模式下 --store 不能与 --threshold / --chunked / --time-budget-ms 同时使用")
+    if args.threshold is not None:
+        run_threshold_mode(args)
+        return
 
-    # 计算相似度
-    score, _ = similarity_score(args.orig_path, args.copy_path)
+    # 计算相似度：常驻服务可用时转发，否则在本进程中计算（需要统计时始终在本进程中计算）
+    profile = args.profile or args.stats_json
+    score, result = None, {}
+    if args.store:
+        score = run_store_mode(args)
+    elif not (profile or args.chunked or args.idf or args.time_budget_ms):
+        score = score_via_server(args)
+    if score is None:
+        from profiling import session
+        from token_cache import set_default_cache
+        set_default_cache(open_cache(args))
+        with session("similarity_score", force=bool(profile)) as stats:
+            score, result = similarity_score(args.orig_path, args.copy_path, args.chunked, args.workers, open_idf(args),
+                                             args.percent, args.time_budget_ms)
+        if profile:
+            report_stats(stats, args)
 
     # 将最终得分写入输出文件
+    from tool_functions import write_result
     write_result(args.output_path, score)
 
     print(f"重复率: {score:.2f} %")
+    if 'plan' in result:
+        print("所选实现: " + ", ".join(f"{metric}={method}" for metric, method in result['plan'].items()))
+    if args.report:
+        write_report(args.orig_path, args.copy_path, args.report)
 
 
 if __name__ == '__main__':
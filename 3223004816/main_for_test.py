@@ -1,14 +1,10 @@
 import similarity_functions
 import tool_functions
+from planner import WEIGHT_PRESETS
 
 def similarity_score(orig_path, copy_path):
-    # 定义各个相似度指标的权重比例
-    percent = {
-        'lcs': 0.15,      # LCS
-        'edit': 0.15,     # 编辑距离
-        'j2': 0.1,        # Jaccard
-        'simhash': 0.6    # simhash
-    }
+    # 各个相似度指标的权重比例（与 main.py --weights balanced 相同）
+    percent = WEIGHT_PRESETS['balanced']
 
     # 处理原文
     orig_text = tool_functions.read_file(orig_path)
@@ -42,13 +38,13 @@ def similarity_score(orig_path, copy_path):
     # 加权计算最终相似度得分
     final_score = (percent['lcs'] * lcs_sim +
                    percent['edit'] * ed_sim +
-                   percent['j2'] * j2 +
+                   percent['jaccard'] * j2 +
                    percent['simhash'] * simhash_sim) * 100
 
     result = {
         'lcs': lcs_sim,
         'edit': ed_sim,
-        'j2': j2,
+        'jaccard': j2,
         'simhash': simhash_sim
     }
 
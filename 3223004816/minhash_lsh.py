@@ -0,0 +1,200 @@
+"""
+minhash_lsh.py
+作者: wangyq
+修改日期: 2025-09-16
+
+功能:
+基于 n-gram 的 MinHash 签名与 LSH 分桶索引，用于在整个语料中近似线性地找出
+Jaccard 相似度较高的候选文档对；候选对同时给出估计值与 jaccard2 的精确值以便核验。
+"""
+
+import numpy as np
+
+from similarity_functions import ngram_hashes, jaccard_sets
+
+# 2^31 - 1（梅森素数），保证 a * x + b 在 uint64 中不溢出
+MERSENNE_PRIME = (1 << 31) - 1
+# 计算签名时每批处理的 n-gram 数量，限制 (num_perm × 批大小) 矩阵的内存
+SIGNATURE_BATCH = 4096
+
+# numpy 2.0 起 trapz 更名为 trapezoid
+_trapezoid = getattr(np, "trapezoid", None) or np.trapz
+
+
+class MinHasher:
+    """
+    MinHash 签名生成器，使用 num_perm 个随机线性哈希 (a·x + b) mod p 模拟置换。
+    相同参数（num_perm、n、seed）生成的签名可以相互比较。
+    参数:
+        num_perm (int): 置换数（签名长度）
+        n (int): n-gram 的长度，与 jaccard2 的 n 对应
+        seed (int): 随机种子
+    """
+
+    def __init__(self, num_perm=128, n=2, seed=1):
+        if not isinstance(num_perm, int) or num_perm <= 0:
+            raise ValueError("num_perm 必须为正整数")
+        self.num_perm = num_perm
+        self.n = n
+        self.seed = seed
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, MERSENNE_PRIME, size=(num_perm, 1)).astype(np.uint64)
+        self._b = rng.randint(0, MERSENNE_PRIME, size=(num_perm, 1)).astype(np.uint64)
+
+    def signature(self, doc):
+        """
+        计算文档的 MinHash 签名。
+        参数:
+            doc (Document | list[str] | array): Document（复用其缓存的 n-gram 哈希）或分词序列
+        返回:
+            np.ndarray: 长度为 num_perm 的 uint64 签名；无 n-gram 时全部为 p
+        """
+        hashes = doc.ngram_hashes(self.n) if hasattr(doc, "ngram_hashes") else ngram_hashes(doc, self.n)
+        hashes = hashes % np.uint64(MERSENNE_PRIME)
+        sig = np.full(self.num_perm, MERSENNE_PRIME, dtype=np.uint64)
+        prime = np.uint64(MERSENNE_PRIME)
+        for start in range(0, len(hashes), SIGNATURE_BATCH):
+            batch = hashes[start:start + SIGNATURE_BATCH]
+            permuted = (self._a * batch + self._b) % prime  # (num_perm, 批大小)
+            np.minimum(sig, permuted.min(axis=1), out=sig)
+        return sig
+
+
+def estimate_jaccard(sig_a, sig_b):
+    """
+    由两个 MinHash 签名估计 Jaccard 相似度。
+    参数:
+        sig_a (np.ndarray): 签名 A
+        sig_b (np.ndarray): 签名 B
+    返回:
+        float: 估计的 Jaccard 相似度
+    """
+    if len(sig_a) != len(sig_b):
+        raise ValueError("两个签名的长度必须一致")
+    return float(np.count_nonzero(sig_a == sig_b)) / len(sig_a)
+
+
+def optimal_bands(threshold, num_perm, fp_weight=0.5, fn_weight=0.5):
+    """
+    选择 LSH 分段参数 (bands, rows)，使阈值两侧的假阳性与假阴性加权面积最小。
+    参数:
+        threshold (float): Jaccard 阈值
+        num_perm (int): 签名长度
+        fp_weight (float): 假阳性权重
+        fn_weight (float): 假阴性权重
+    返回:
+        tuple[int, int]: (bands, rows)，bands * rows <= num_perm
+    """
+    if not 0.0 < threshold < 1.0:
+        raise ValueError("threshold 必须在 (0, 1) 之间")
+    grid = np.linspace(0.0, 1.0, 201)
+    best, best_err = (1, num_perm), float("inf")
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        prob = 1.0 - (1.0 - grid ** rows) ** bands  # 成为候选对的概率
+        fp = _trapezoid(np.where(grid < threshold, prob, 0.0), grid)
+        fn = _trapezoid(np.where(grid >= threshold, 1.0 - prob, 0.0), grid)
+        err = fp_weight * fp + fn_weight * fn
+        if err < best_err:
+            best, best_err = (bands, rows), err
+    return best
+
+
+class LSHIndex:
+    """
+    MinHash 签名的 LSH 分桶索引：签名切成 bands 段，任意一段完全相同的文档互为候选。
+    参数:
+        threshold (float): Jaccard 阈值
+        num_perm (int): 签名长度
+    """
+
+    def __init__(self, threshold=0.5, num_perm=128):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands, self.rows = optimal_bands(threshold, num_perm)
+        self._buckets = [{} for _ in range(self.bands)]
+        self._keys = set()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _band_keys(self, sig):
+        if len(sig) != self.num_perm:
+            raise ValueError("签名长度与 num_perm 不一致")
+        rows = self.rows
+        return [sig[i * rows:(i + 1) * rows].tobytes() for i in range(self.bands)]
+
+    def insert(self, key, sig):
+        """
+        插入一个文档签名。
+        参数:
+            key: 文档标识（可哈希）
+            sig (np.ndarray): MinHash 签名
+        """
+        if key in self._keys:
+            raise ValueError(f"重复的文档标识: {key!r}")
+        self._keys.add(key)
+        for bucket, band in zip(self._buckets, self._band_keys(sig)):
+            bucket.setdefault(band, []).append(key)
+
+    def query(self, sig):
+        """
+        返回与签名至少有一段相同的已索引文档。
+        参数:
+            sig (np.ndarray): MinHash 签名
+        返回:
+            set: 候选文档标识
+        """
+        found = set()
+        for bucket, band in zip(self._buckets, self._band_keys(sig)):
+            found.update(bucket.get(band, ()))
+        return found
+
+    def candidate_pairs(self):
+        """
+        返回所有落入同一桶的文档对。
+        返回:
+            set[tuple]: 候选文档对 (key_a, key_b)，按插入顺序排列
+        """
+        pairs = set()
+        for bucket in self._buckets:
+            for keys in bucket.values():
+                if len(keys) < 2:
+                    continue
+                for i, key_a in enumerate(keys):
+                    for key_b in keys[i + 1:]:
+                        pairs.add((key_a, key_b))
+        return pairs
+
+
+def find_similar_pairs(docs, threshold=0.5, num_perm=128, n=2, seed=1):
+    """
+    在一组文档中找出 Jaccard 相似度可能超过阈值的文档对。
+    先用 LSH 生成候选对，再以签名估计值过滤，最后给出精确的 jaccard2 结果用于核验。
+    参数:
+        docs (dict | list): 文档标识 -> Document 的映射，或 Document 列表（以下标为标识）
+        threshold (float): Jaccard 阈值
+        num_perm (int): 签名长度
+        n (int): n-gram 的长度
+        seed (int): 随机种子
+    返回:
+        list[dict]: 每项包含 a、b、estimate、jaccard，按精确值降序
+    """
+    if not isinstance(docs, dict):
+        docs = dict(enumerate(docs))
+    hasher = MinHasher(num_perm, n, seed)
+    index = LSHIndex(threshold, num_perm)
+    signatures = {}
+    for key, doc in docs.items():
+        signatures[key] = hasher.signature(doc)
+        index.insert(key, signatures[key])
+
+    results = []
+    for key_a, key_b in index.candidate_pairs():
+        estimate = estimate_jaccard(signatures[key_a], signatures[key_b])
+        if estimate < threshold:
+            continue
+        exact = jaccard_sets(docs[key_a].ngram_set(n), docs[key_b].ngram_set(n))
+        results.append({'a': key_a, 'b': key_b, 'estimate': estimate, 'jaccard': exact})
+    results.sort(key=lambda item: (-item['jaccard'], str(item['a']), str(item['b'])))
+    return results
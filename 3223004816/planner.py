@@ -0,0 +1,196 @@
+"""
+planner.py
+作者: wangyq
+修改日期: 2025-09-16
+
+功能:
+指标权重的配置与按时间预算选择各指标实现的计划器。
+    - 权重可以是预设名、"lcs=0.2,simhash=0.8" 形式的字符串或 JSON 文件，统一由 load_weights 解析
+    - plan_metrics 按两篇文档的长度与可选的时间预算（毫秒），用代价模型为 LCS / 编辑距离各选一种实现：
+        dp       两行动态规划（精确，仅极短序列时最便宜）
+        bit      位并行 / 位向量（精确，默认）
+        banded   带状 DP（距离不超过带宽时精确，超过时退回抽样估计）
+        sampled  等间距窗口抽样（近似，代价与文档长度无关）
+      Jaccard 与 SimHash 本身只需线性时间，不参与选择
+    - compare_planned 按计划计算，result['plan'] 记录各指标实际使用的实现（差异很少时为 "myers"）
+代价模型单位为微秒，系数为实测标定，只用于比较候选实现，不保证实际耗时不超过预算。
+"""
+
+import json
+import os
+from collections import namedtuple
+
+from document import DEFAULT_PERCENT, LCS_ROW_COST, LCS_ROW_SCALE, METRICS, as_document, compare
+
+# 权重预设：default 为命令行默认值，balanced 为 main_for_test 的性能测试所用
+WEIGHT_PRESETS = {
+    'default': DEFAULT_PERCENT,
+    'balanced': {'lcs': 0.15, 'edit': 0.15, 'jaccard': 0.1, 'simhash': 0.6},
+}
+# 代价模型（微秒）：两行 DP 每个单元格的耗时
+LCS_DP_CELL = 0.35
+EDIT_DP_CELL = 0.5
+# 位向量编辑距离约 n·(EDIT_ROW_COST + m / EDIT_ROW_SCALE)
+EDIT_ROW_COST = 1.5
+EDIT_ROW_SCALE = 1800
+# 带状 DP 每个单元格的耗时（不计提前结束）
+BANDED_CELL = 0.4
+# 抽样估计的默认窗口数与窗口宽度（token）
+SAMPLE_WINDOWS = 16
+SAMPLE_WIDTH = 256
+# 近似实现：使用时不再尝试 Myers 差分（其代价上限与一次位并行 LCS 相当）
+APPROXIMATE = ('banded', 'sampled')
+
+
+class Plan(namedtuple("Plan", "methods band windows width cost_ms")):
+    """
+    各指标的实现选择。
+        methods (dict): 指标 -> 实现名，权重为 0 的指标为 "skip"
+        band (int | None): banded 使用的距离上界
+        windows / width (int): sampled 使用的窗口数与窗口宽度
+        cost_ms (float): 代价模型估计的总耗时（毫秒）
+    """
+    __slots__ = ()
+
+    @property
+    def exact(self):
+        """计划中是否全部为精确实现"""
+        return not any(method in APPROXIMATE for method in self.methods.values())
+
+
+def load_weights(spec=None):
+    """
+    解析指标权重。未列出的指标权重为 0，结果按总和归一化。
+    参数:
+        spec (str | dict | None): 预设名、"lcs=0.2,simhash=0.8"、JSON 文件路径或权重字典；None 为默认权重
+    返回:
+        dict: 指标 -> 权重
+    异常:
+        ValueError: 指标名未知、权重为负或全部为 0、文件格式错误时抛出
+    """
+    if spec is None:
+        return dict(DEFAULT_PERCENT)
+    if isinstance(spec, dict):
+        weights = spec
+    elif spec in WEIGHT_PRESETS:
+        return dict(WEIGHT_PRESETS[spec])
+    elif os.path.isfile(spec):
+        with open(spec, 'r', encoding='utf-8') as file_handle:
+            try:
+                weights = json.load(file_handle)
+            except json.JSONDecodeError as exc:
+                raise ValueError(f"权重文件 {spec} 不是合法的 JSON: {exc}") from None
+        if not isinstance(weights, dict):
+            raise ValueError(f"权重文件 {spec} 应为 {{指标: 权重}} 形式的对象")
+    else:
+        weights = {}
+        for item in spec.split(','):
+            metric, sep, value = item.partition('=')
+            if not sep:
+                raise ValueError(f"无法解析权重 {item!r}，应为 指标=权重 或预设名 {', '.join(WEIGHT_PRESETS)}")
+            weights[metric.strip()] = value.strip()
+
+    percent = dict.fromkeys(METRICS, 0.0)
+    for metric, value in weights.items():
+        if metric not in percent:
+            raise ValueError(f"未知的指标: {metric}（可选 {', '.join(METRICS)}）")
+        try:
+            percent[metric] = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"指标 {metric} 的权重必须为数字") from None
+        if percent[metric] < 0:
+            raise ValueError(f"指标 {metric} 的权重不能为负")
+    total = sum(percent.values())
+    if total <= 0:
+        raise ValueError("至少需要一个指标的权重大于 0")
+    return {metric: w / total for metric, w in percent.items()}
+
+
+def _sample_cost(metric, width):
+    # 一个窗口的代价：LCS 在 B 上的片段两侧各放宽半个窗口
+    if metric == 'lcs':
+        return width * (LCS_ROW_COST + 2 * width / LCS_ROW_SCALE)
+    return width * (EDIT_ROW_COST + width / EDIT_ROW_SCALE)
+
+
+def exact_costs(metric, m, n):
+    """
+    代价模型估计的精确实现耗时。
+    参数:
+        metric (str): 'lcs' 或 'edit'
+        m (int): 原文 token 数
+        n (int): 待检测文本 token 数
+    返回:
+        dict: 实现名 -> 估计耗时（微秒）
+    """
+    if metric == 'lcs':  # 位并行 LCS 逐个处理 A 的元素，位宽为 len(B)
+        return {'dp': m * n * LCS_DP_CELL, 'bit': m * (LCS_ROW_COST + n / LCS_ROW_SCALE)}
+    return {'dp': m * n * EDIT_DP_CELL, 'bit': n * (EDIT_ROW_COST + m / EDIT_ROW_SCALE)}
+
+
+def plan_metrics(m, n, percent=None, time_budget_ms=None, idf=None):
+    """
+    为一对文档选择各指标的实现。
+    无预算时 LCS / 编辑距离取代价最小的精确实现；给定预算时按估计代价从小到大依次分配，
+    每个指标可用剩余预算的平均份额：精确实现放得下就用精确实现，否则编辑距离优先尝试带状 DP，
+    再退回抽样估计（窗口数按份额缩减，至少一个窗口）。
+    参数:
+        m (int): 原文 token 数
+        n (int): 待检测文本 token 数
+        percent (dict | None): 各指标权重，默认为 DEFAULT_PERCENT
+        time_budget_ms (float | None): 时间预算（毫秒），None 为不限
+        idf (IdfTable | None): SimHash 是否按 TF-IDF 加权（只影响记录的实现名）
+    返回:
+        Plan: 计划
+    """
+    percent = DEFAULT_PERCENT if percent is None else percent
+    if time_budget_ms is not None and time_budget_ms <= 0:
+        raise ValueError("时间预算必须为正数")
+    methods = {metric: 'skip' for metric in METRICS if percent[metric] == 0.0}
+    if 'jaccard' not in methods:
+        methods['jaccard'] = 'array'
+    if 'simhash' not in methods:
+        methods['simhash'] = 'simhash' if idf is None else 'tfidf'
+
+    costs = {metric: exact_costs(metric, m, n) for metric in ('lcs', 'edit') if metric not in methods}
+    remaining = None if time_budget_ms is None else time_budget_ms * 1000
+    band, windows, total = None, SAMPLE_WINDOWS, 0.0
+    order = sorted(costs, key=lambda metric: min(costs[metric].values()))
+    for i, metric in enumerate(order):
+        method = min(costs[metric], key=costs[metric].get)
+        cost = costs[metric][method]
+        if remaining is not None:
+            share = remaining / (len(order) - i)
+            if cost > share:
+                longest = max(m, n)
+                per_window = _sample_cost(metric, SAMPLE_WIDTH)
+                # 带状 DP 须为超过带宽时的抽样估计留出预算
+                k = int((share - SAMPLE_WINDOWS * per_window) / (BANDED_CELL * longest) - 1) // 2
+                if metric == 'edit' and k >= max(1, abs(m - n)):
+                    method, band = 'banded', k
+                    cost = (2 * k + 1) * longest * BANDED_CELL + SAMPLE_WINDOWS * per_window
+                else:
+                    method = 'sampled'
+                    windows = max(1, min(windows, int(share // per_window)))
+                    cost = windows * per_window
+            remaining -= cost
+        methods[metric] = method
+        total += cost
+    return Plan({metric: methods[metric] for metric in METRICS}, band, windows, SAMPLE_WIDTH, total / 1000)
+
+
+def compare_planned(doc_a, doc_b, percent=None, time_budget_ms=None, idf=None):
+    """
+    按文档长度与时间预算选择实现后计算相似度，result['plan'] 记录各指标实际使用的实现。
+    参数:
+        doc_a (Document | str): 原文
+        doc_b (Document | str): 待检测文本
+        percent (dict | None): 各指标权重，默认为 DEFAULT_PERCENT
+        time_budget_ms (float | None): 时间预算（毫秒），None 为不限
+        idf (IdfTable | None): 给定时 SimHash 按 TF-IDF 加权
+    返回:
+        tuple: (final_score, result)，同 compare
+    """
+    doc_a, doc_b = as_document(doc_a), as_document(doc_b)
+    plan = plan_metrics(len(doc_a.ids), len(doc_b.ids), percent, time_budget_ms, idf)
+    return compare(doc_a, doc_b, percent, idf, plan)
@@ -0,0 +1,231 @@
+"""
+profiling.py
+作者: wangyq
+修改日期: 2025-09-16
+
+功能:
+轻量的分阶段计时与计数：读取、分词、各项指标的耗时，token 数、DP 单元数与缓存命中率。
+只有在 session() 期间（命令行 --profile / --stats-json，或注册了回调）才记录，
+未启用时 stage() 返回共享的空上下文、count() 直接返回，开销可忽略。
+每次 session 结束后把统计结果交给通过 add_hook 注册的回调，便于上报到外部监控系统。
+统计状态为进程内全局，不支持多线程并发记录。
+"""
+
+import time
+
+# 当前正在记录的统计对象，None 表示未启用
+_active = None
+# session 结束时调用的回调
+_hooks = []
+# 名称 -> 返回 functools 缓存 cache_info() 的函数
+_caches = {}
+
+
+class Stats:
+    """
+    一次 session 的统计结果。
+    属性:
+        name (str): session 名称
+        stages (dict[str, float]): 各阶段累计耗时（秒）
+        calls (dict[str, int]): 各阶段进入次数
+        counts (dict[str, int]): 计数器（token 数、DP 单元数等）
+        caches (dict[str, tuple[int, int]]): 各缓存在本次 session 中的 (命中, 未命中) 次数
+        total (float): session 总耗时（秒）
+    """
+    __slots__ = ("name", "stages", "calls", "counts", "caches", "total")
+
+    def __init__(self, name=""):
+        self.name = name
+        self.stages = {}
+        self.calls = {}
+        self.counts = {}
+        self.caches = {}
+        self.total = 0.0
+
+    def add_time(self, stage_name, seconds):
+        self.stages[stage_name] = self.stages.get(stage_name, 0.0) + seconds
+        self.calls[stage_name] = self.calls.get(stage_name, 0) + 1
+
+    def add_count(self, counter, n):
+        self.counts[counter] = self.counts.get(counter, 0) + n
+
+    def hit_rate(self, cache_name):
+        """
+        返回缓存命中率，没有访问时为 None。
+        """
+        hits, misses = self.caches.get(cache_name, (0, 0))
+        return hits / (hits + misses) if hits + misses else None
+
+    def as_dict(self):
+        """
+        转换为可 JSON 序列化的字典（耗时单位为毫秒）。
+        """
+        return {
+            "name": self.name,
+            "total_ms": self.total * 1000,
+            "stages": {k: {"ms": v * 1000, "calls": self.calls[k]} for k, v in self.stages.items()},
+            "counts": dict(self.counts),
+            "caches": {k: {"hits": h, "misses": m, "hit_rate": self.hit_rate(k)}
+                       for k, (h, m) in self.caches.items()},
+        }
+
+    def format(self):
+        """
+        生成便于阅读的文本表格。
+        """
+        lines = [f"{self.name or 'session'}: {self.total * 1000:.2f} ms"]
+        for stage_name, seconds in self.stages.items():
+            lines.append(f"  {stage_name:<20}{seconds * 1000:>12.2f} ms  x{self.calls[stage_name]}")
+        for counter, n in self.counts.items():
+            lines.append(f"  {counter:<20}{n:>12}")
+        for cache_name, (hits, misses) in self.caches.items():
+            rate = self.hit_rate(cache_name)
+            shown = "-" if rate is None else f"{rate * 100:.1f} %"
+            lines.append(f"  {cache_name:<20}{shown:>12}  ({hits} 命中 / {misses} 未命中)")
+        return "\n".join(lines)
+
+
+class _NullStage:
+    # 未启用时共享的空上下文
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("stats", "name", "start")
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def stage(name):
+    """
+    记录一个阶段的耗时：with stage("tokenize"): ...
+    同名阶段的耗时与次数累加；未启用时不做任何事。
+    参数:
+        name (str): 阶段名
+    """
+    if _active is None:
+        return _NULL_STAGE
+    return _Stage(_active, name)
+
+
+def count(name, n=1):
+    """
+    累加计数器；未启用时不做任何事。
+    参数:
+        name (str): 计数器名
+        n (int): 增量
+    """
+    if _active is not None:
+        _active.add_count(name, n)
+
+
+def cache_access(name, hit):
+    """
+    记录一次缓存访问（用于没有 cache_info 的缓存，如持久化分词缓存）；未启用时不做任何事。
+    参数:
+        name (str): 缓存名
+        hit (bool): 是否命中
+    """
+    if _active is not None:
+        hits, misses = _active.caches.get(name, (0, 0))
+        _active.caches[name] = (hits + 1, misses) if hit else (hits, misses + 1)
+
+
+def enabled():
+    """
+    当前是否正在记录。
+    """
+    return _active is not None
+
+
+def register_cache(name, cache_info):
+    """
+    登记一个进程内缓存，session 会统计它在期间的命中与未命中次数。
+    参数:
+        name (str): 缓存名
+        cache_info (Callable): 返回带 hits / misses 属性对象的函数（如 lru_cache 的 cache_info）
+    """
+    _caches[name] = cache_info
+
+
+def add_hook(callback):
+    """
+    注册回调，每次 session 结束时以 Stats 为参数调用。注册回调后 session 总会记录。
+    参数:
+        callback (Callable[[Stats], None]): 回调函数
+    """
+    _hooks.append(callback)
+
+
+def remove_hook(callback):
+    """
+    移除已注册的回调。
+    """
+    _hooks.remove(callback)
+
+
+class session:
+    """
+    记录一次操作的统计信息，结束时调用已注册的回调：
+        with session("similarity_score", force=True) as stats: ...
+    没有回调且 force 为 False 时不记录，as 得到 None；已有 session 时嵌套的 session 并入外层。
+    参数:
+        name (str): session 名称
+        force (bool): 没有回调时也记录
+    """
+    __slots__ = ("name", "force", "stats", "_start", "_snapshot")
+
+    def __init__(self, name="", force=False):
+        self.name = name
+        self.force = force
+        self.stats = None
+
+    def __enter__(self):
+        global _active
+        if _active is not None or not (self.force or _hooks):
+            return _active
+        self.stats = _active = Stats(self.name)
+        self._snapshot = {name: _cache_counts(info) for name, info in _caches.items()}
+        self._start = time.perf_counter()
+        return self.stats
+
+    def __exit__(self, *exc):
+        global _active
+        if self.stats is None:
+            return False
+        stats = self.stats
+        stats.total = time.perf_counter() - self._start
+        for name, info in _caches.items():
+            hits, misses = _cache_counts(info)
+            base_hits, base_misses = self._snapshot.get(name, (0, 0))
+            if hits - base_hits or misses - base_misses:
+                prev_hits, prev_misses = stats.caches.get(name, (0, 0))
+                stats.caches[name] = (prev_hits + hits - base_hits, prev_misses + misses - base_misses)
+        _active = None
+        for hook in list(_hooks):
+            hook(stats)
+        return False
+
+
+def _cache_counts(info):
+    data = info()
+    return data.hits, data.misses
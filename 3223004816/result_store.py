@@ -0,0 +1,337 @@
+"""
+result_store.py
+作者: wangyq
+修改日期: 2025-09-16
+
+功能:
+批量结果库，代替每对文本写一个只含得分的结果文件。
+每行保存文档对、完整的指标向量（lcs / edit / jaccard / simhash）、得分、耗时与错误信息，
+之后换一组权重可以直接重新计分，不必重新计算任何指标。
+    - ResultStore       SQLite（WAL 模式），文档路径存入 documents 表，结果按 run（一次运行及其权重）分组
+    - JsonlResultStore  JSONL，每行一个结果，追加写入
+两者都在内存中攒满 batch_size 行后一次写入（SQLite 为一个事务）。
+写入的行应来自 batch.score_pair(..., full=True)，否则权重为 0 的指标按 0 保存，重新计分时不准确。
+
+用法:
+    python main.py --orig-dir 原文目录 --copy-dir 待检测目录 --store results.db
+    python result_store.py rescore results.db --weights balanced -o rescored.csv
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+from batch import FIELDS, write_rows
+from document import DEFAULT_PERCENT, METRICS, weighted_score
+
+# 每个事务 / 每次写文件的行数
+BATCH_SIZE = 1000
+# 等待其他进程释放写锁的最长时间（秒）
+BUSY_TIMEOUT = 30.0
+# SQLite 单条语句的参数个数上限较小，批量查询时分批
+_SQL_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    weights TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS results (
+    run INTEGER NOT NULL,
+    orig INTEGER NOT NULL,
+    copy INTEGER NOT NULL,
+    score REAL,
+    lcs REAL,
+    edit REAL,
+    jaccard REAL,
+    simhash REAL,
+    elapsed_ms REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS results_run ON results (run);
+CREATE INDEX IF NOT EXISTS results_pair ON results (orig, copy);
+"""
+# 按 FIELDS 的顺序读出结果，{score} 为得分列或重新计分的表达式
+_SELECT_SQL = ("SELECT o.path, c.path, {score}, r.lcs, r.edit, r.jaccard, r.simhash, r.elapsed_ms, r.error "
+               "FROM results r JOIN documents o ON o.id = r.orig JOIN documents c ON c.id = r.copy")
+
+
+class ResultStore:
+    """
+    基于 SQLite 的结果库。每个 ResultStore 对象首次写入时登记一次 run，记录开始时间与使用的权重。
+    文档路径统一转为绝对路径。
+    参数:
+        path (str): SQLite 数据库文件路径
+        percent (dict | None): 本次运行计算得分所用的权重，默认为 DEFAULT_PERCENT
+        batch_size (int): 每个事务写入的行数
+    """
+
+    def __init__(self, path, percent=None, batch_size=BATCH_SIZE):
+        if batch_size <= 0:
+            raise ValueError("batch_size 必须大于0")
+        self.path = path
+        self.percent = DEFAULT_PERCENT if percent is None else percent
+        self.batch_size = batch_size
+        self.run = None
+        self._pending = []
+        self._doc_ids = {}
+        self._conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, row):
+        """
+        加入一行结果，攒满 batch_size 行时写入。
+        参数:
+            row (dict): 一行结果，字段见 batch.FIELDS
+        """
+        self._pending.append(row)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def record(self, rows):
+        """
+        逐行写入并原样产出结果，可直接串在 iter_scores 与 write_rows 之间；结束时写入剩余的行。
+        参数:
+            rows (Iterable[dict]): 结果行
+        返回:
+            Iterator[dict]: 同一组结果行
+        """
+        try:
+            for row in rows:
+                self.add(row)
+                yield row
+        finally:
+            self.flush()
+
+    def flush(self):
+        """
+        在一个事务中写入尚未写入的行。
+        """
+        if not self._pending:
+            return
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self.run is None:
+                self.run = conn.execute("INSERT INTO runs (started, weights) VALUES (?, ?)",
+                                        (time.time(), json.dumps(self.percent))).lastrowid
+            ids = self._document_ids([os.path.abspath(row[key]) for row in self._pending for key in ('orig', 'copy')])
+            conn.executemany(
+                "INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(self.run, ids[os.path.abspath(row['orig'])], ids[os.path.abspath(row['copy'])], row['score'],
+                  *(row[metric] for metric in METRICS), row.get('elapsed_ms'), row['error']) for row in self._pending],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._pending = []
+
+    def _document_ids(self, paths):
+        # 登记新出现的文档路径并返回 路径 -> id，已查询过的路径在内存中缓存
+        missing = [p for p in dict.fromkeys(paths) if p not in self._doc_ids]
+        if missing:
+            self._conn.executemany("INSERT OR IGNORE INTO documents (path) VALUES (?)", [(p,) for p in missing])
+            for start in range(0, len(missing), _SQL_BATCH):
+                batch = missing[start:start + _SQL_BATCH]
+                marks = ",".join("?" * len(batch))
+                self._doc_ids.update(
+                    (path, doc_id) for doc_id, path in
+                    self._conn.execute(f"SELECT id, path FROM documents WHERE path IN ({marks})", batch))
+        return self._doc_ids
+
+    def _select(self, score, params, run):
+        self.flush()
+        sql = _SELECT_SQL.format(score=score)
+        if run is not None:
+            sql += " WHERE r.run = ?"
+            params = (*params, run)
+        for values in self._conn.execute(sql + " ORDER BY r.rowid", params):
+            yield dict(zip(FIELDS, values))
+
+    def rows(self, run=None):
+        """
+        按写入顺序读出结果。
+        参数:
+            run (int | None): 只读出该次运行的结果，None 为全部
+        返回:
+            Iterator[dict]: 结果行，字段见 batch.FIELDS
+        """
+        return self._select("r.score", (), run)
+
+    def rescore(self, percent, run=None):
+        """
+        用新的权重由已保存的指标向量重新计分（在 SQL 中完成，不重新计算指标）。出错的行得分为 None。
+        参数:
+            percent (dict): 各指标权重
+            run (int | None): 只处理该次运行的结果，None 为全部
+        返回:
+            Iterator[dict]: 结果行，score 为新的得分
+        """
+        score = "(" + " + ".join(f"? * r.{metric}" for metric in METRICS) + ") * 100"
+        return self._select(score, tuple(percent[metric] for metric in METRICS), run)
+
+    def runs(self):
+        """
+        返回全部运行的 (id, 开始时间, 权重) 列表。
+        """
+        self.flush()
+        return [(run, started, json.loads(weights))
+                for run, started, weights in self._conn.execute("SELECT id, started, weights FROM runs ORDER BY id")]
+
+    def __len__(self):
+        self.flush()
+        return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        """
+        写入剩余的行并关闭数据库连接。
+        """
+        if self._conn is not None:
+            self.flush()
+            self._conn.close()
+            self._conn = None
+
+
+class JsonlResultStore:
+    """
+    基于 JSONL 的结果库，每行为一个结果（字段见 batch.FIELDS），追加写入。不区分运行，也不保存权重。
+    参数:
+        path (str): JSONL 文件路径
+        percent (dict | None): 接口与 ResultStore 一致，不保存
+        batch_size (int): 每次写文件的行数
+    """
+
+    def __init__(self, path, percent=None, batch_size=BATCH_SIZE):
+        if batch_size <= 0:
+            raise ValueError("batch_size 必须大于0")
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = []
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, row):
+        """
+        加入一行结果，攒满 batch_size 行时写入。
+        """
+        self._pending.append(row)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def record(self, rows):
+        """
+        逐行写入并原样产出结果，见 ResultStore.record。
+        """
+        try:
+            for row in rows:
+                self.add(row)
+                yield row
+        finally:
+            self.flush()
+
+    def flush(self):
+        """
+        一次写入尚未写入的行。
+        """
+        if not self._pending:
+            return
+        self._file.write("".join(json.dumps({key: row.get(key) for key in FIELDS}, ensure_ascii=False) + "\n"
+                                 for row in self._pending))
+        self._file.flush()
+        self._pending = []
+
+    def rows(self, run=None):
+        """
+        按写入顺序读出结果（run 参数仅为与 ResultStore 保持一致）。
+        """
+        self.flush()
+        with open(self.path, "r", encoding="utf-8") as file_handle:
+            for line in file_handle:
+                if line.strip():
+                    yield json.loads(line)
+
+    def rescore(self, percent, run=None):
+        """
+        用新的权重由已保存的指标向量重新计分，出错的行得分为 None。
+        """
+        for row in self.rows(run):
+            row['score'] = None if row['error'] is not None else weighted_score(row, percent)
+            yield row
+
+    def __len__(self):
+        return sum(1 for _ in self.rows())
+
+    def close(self):
+        """
+        写入剩余的行并关闭文件。
+        """
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+def open_result_store(path, percent=None, batch_size=BATCH_SIZE):
+    """
+    按扩展名打开结果库：.jsonl / .json 为 JSONL，其余为 SQLite。
+    参数:
+        path (str): 文件路径
+        percent (dict | None): 本次运行的权重
+        batch_size (int): 每批写入的行数
+    返回:
+        ResultStore | JsonlResultStore: 结果库
+    """
+    if os.path.splitext(path)[1].lower() in ('.jsonl', '.json'):
+        return JsonlResultStore(path, percent, batch_size)
+    return ResultStore(path, percent, batch_size)
+
+
+def main():
+    """
+    命令行入口：python result_store.py rescore 结果库 --weights 权重 -o 输出文件
+    """
+    from planner import load_weights
+
+    parser = argparse.ArgumentParser(description="批量结果库")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rescore = sub.add_parser("rescore", help="用新的权重由已保存的指标向量重新计分，不重新计算指标")
+    rescore.add_argument("store", help="结果库（.db 等为 SQLite，.jsonl 为 JSONL）")
+    rescore.add_argument("--weights", required=True, metavar="SPEC",
+                         help='各指标权重：预设名、"lcs=0.2,simhash=0.8" 或 JSON 文件，同 main.py --weights')
+    rescore.add_argument("--run", type=int, default=None, help="只处理该次运行的结果（仅 SQLite）")
+    rescore.add_argument("-o", "--output", required=True, help="输出文件（.csv 或 .jsonl）")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.store):
+        parser.error(f"结果库 {args.store} 不存在")
+    try:
+        percent = load_weights(args.weights)
+    except ValueError as exc:
+        parser.error(str(exc))
+    with open_result_store(args.store) as store:
+        count = write_rows(args.output, store.rescore(percent, args.run))
+    print(f"已重新计分 {count} 行，结果写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
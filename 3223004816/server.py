@@ -0,0 +1,361 @@
+"""
+server.py
+作者: wangyq
+修改日期: 2025-09-16
+
+功能:
+常驻服务模式：在 Unix 套接字或本机 TCP 端口上监听，保持 jieba 词典与各级缓存常驻内存，
+接收 (原文, 待检测) 路径或文本并返回 similarity_score 的各项结果；CPU 计算交给进程池。
+同时提供轻量客户端 request_score，命令行在服务运行时直接转发请求。
+
+安全: 服务以启动用户的身份读取请求中的任意路径。Unix 套接字模式下套接字权限为 0600，只有当前用户可以连接；
+TCP 模式只允许监听本机回环地址，但信任本机的所有用户（任何本地进程都能借服务读取当前用户可读的文件），
+只应在单用户机器上使用。
+
+协议: 每行一个 JSON 请求，每行一个 JSON 响应。
+    请求: {"orig": 路径, "copy": 路径} 或 {"orig_text": 文本, "copy_text": 文本}，可选 "percent"
+          {"op": "ping"} 用于探测服务
+    响应: {"ok": true, "score": 分数, "result": {...}} 或 {"ok": false, "error": 错误信息}
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import json
+import os
+import signal
+import socket
+import stat
+import tempfile
+from functools import lru_cache
+
+_UID = os.getuid() if hasattr(os, 'getuid') else None
+# 默认 Unix 套接字所在的私有目录：优先 $XDG_RUNTIME_DIR，否则为临时目录下按用户区分、权限 0700 的子目录
+RUNTIME_DIR = os.environ.get("XDG_RUNTIME_DIR") or os.path.join(tempfile.gettempdir(), f"simcheck-{_UID or 0}")
+# 默认 Unix 套接字路径
+DEFAULT_SOCKET = os.path.join(RUNTIME_DIR, "simcheck.sock")
+# 客户端默认超时（秒）
+CLIENT_TIMEOUT = 30.0
+# 客户端建立连接的超时（秒），服务不可用时尽快回退到本地计算
+CONNECT_TIMEOUT = 1.0
+# 单个请求行的最大长度（字节）
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+# 每个工作进程缓存的原文 Document 数量
+DOCUMENT_CACHE_SIZE = 64
+
+
+def parse_address(address):
+    """
+    解析服务地址："host:port" 为 TCP，其余视为 Unix 套接字路径。
+    参数:
+        address (str): 服务地址
+    返回:
+        tuple: ("tcp", (host, port)) 或 ("unix", path)
+    """
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return "tcp", (host or "127.0.0.1", int(port))
+    return "unix", address
+
+
+def is_loopback(host):
+    """
+    判断 TCP 监听地址是否为本机回环地址。
+    参数:
+        host (str): 主机名或 IP 地址
+    返回:
+        bool: "localhost" 或回环 IP 时为 True
+    """
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _is_private(st):
+    # 属于当前用户，且组与其他用户无写权限
+    return _UID is None or (st.st_uid == _UID and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH))
+
+
+def is_trusted_socket(path):
+    """
+    判断 Unix 套接字是否可以信任（自动转发前检查，防止其他本地用户抢先创建同名套接字返回伪造结果）：
+    套接字与其所在目录都须属于当前用户，且组与其他用户无写权限。
+    参数:
+        path (str): 套接字路径
+    返回:
+        bool: 可信且存在时为 True
+    """
+    try:
+        st = os.lstat(path)
+        parent = os.stat(os.path.dirname(os.path.abspath(path)))
+    except OSError:
+        return False
+    return stat.S_ISSOCK(st.st_mode) and _is_private(st) and _is_private(parent)
+
+
+def ensure_private_dir(directory):
+    """
+    创建（或检查）存放套接字的私有目录，权限为 0700。
+    参数:
+        directory (str): 目录
+    异常:
+        ValueError: 目录已存在但不属于当前用户或其他用户可写时抛出
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not _is_private(os.stat(directory)):
+        raise ValueError(f"套接字目录 {directory} 不属于当前用户或其他用户可写，拒绝使用")
+
+
+# ---------------------------- 客户端 ----------------------------
+
+def request(address, payload, timeout=CLIENT_TIMEOUT):
+    """
+    向服务发送一个请求并等待响应。
+    参数:
+        address (str): 服务地址
+        payload (dict): 请求内容
+        timeout (float): 超时时间（秒）
+    返回:
+        dict: 响应内容
+    异常:
+        ConnectionError: 服务未运行或连接中断时抛出
+    """
+    kind, target = parse_address(address)
+    family = socket.AF_INET if kind == "tcp" else socket.AF_UNIX
+    try:
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            sock.settimeout(min(timeout, CONNECT_TIMEOUT))
+            sock.connect(target)
+            sock.settimeout(timeout)
+            sock.sendall(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as reader:
+                line = reader.readline()
+    except (OSError, ValueError) as exc:
+        raise ConnectionError(f"无法连接相似度服务 {address}: {exc}") from exc
+    if not line:
+        raise ConnectionError(f"相似度服务 {address} 未返回结果")
+    return json.loads(line)
+
+
+def request_score(address, orig_path, copy_path, percent=None, timeout=CLIENT_TIMEOUT):
+    """
+    请求服务计算两个文件的相似度，接口与 main.similarity_score 一致。
+    参数:
+        address (str): 服务地址
+        orig_path (str): 原文文件路径
+        copy_path (str): 待检测文件路径
+        percent (dict | None): 各指标权重
+        timeout (float): 超时时间（秒）
+    返回:
+        tuple: (final_score, result)
+    异常:
+        ConnectionError: 服务不可用时抛出
+        ValueError: 服务端计算失败（如文件不存在、文本为空）时抛出
+    """
+    payload = {"orig": os.path.abspath(orig_path), "copy": os.path.abspath(copy_path)}
+    if percent is not None:
+        payload["percent"] = percent
+    response = request(address, payload, timeout)
+    if not response.get("ok"):
+        raise ValueError(response.get("error", "未知错误"))
+    return response["score"], response["result"]
+
+
+def is_running(address):
+    """
+    探测服务是否在运行。
+    """
+    try:
+        return request(address, {"op": "ping"}, timeout=1.0).get("ok", False)
+    except ConnectionError:
+        return False
+
+
+# ---------------------------- 服务端 ----------------------------
+
+@lru_cache(maxsize=DOCUMENT_CACHE_SIZE)
+def _document_for(path, size, mtime_ns):
+    # 以 路径+大小+修改时间 为键缓存原文，文件被修改后自动失效
+    from document import Document
+    return Document(path)
+
+
+def _stat_document(path):
+    from document import Document
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return Document(path)  # 交给 read_file 抛出统一的异常
+    return _document_for(path, st.st_size, st.st_mtime_ns)
+
+
+def handle_request(payload):
+    """
+    在工作进程中处理一个请求。
+    参数:
+        payload (dict): 请求内容
+    返回:
+        dict: 响应内容
+    """
+    from document import Document, compare
+
+    if payload.get("op") == "ping":
+        return {"ok": True}
+    try:
+        if "orig_text" in payload or "copy_text" in payload:
+            orig = Document(text=payload.get("orig_text", ""))
+            copy = Document(text=payload.get("copy_text", ""))
+        elif "orig" in payload and "copy" in payload:
+            orig, copy = _stat_document(payload["orig"]), Document(payload["copy"])
+        else:
+            return {"ok": False, "error": "请求需要 orig/copy 路径或 orig_text/copy_text 文本"}
+        score, result = compare(orig, copy, payload.get("percent"))
+    except (ValueError, TypeError, KeyError) as exc:
+        return {"ok": False, "error": str(exc)}
+    return {"ok": True, "score": score, "result": result}
+
+
+class SimilarityServer:
+    """
+    基于 asyncio 的相似度服务。
+    参数:
+        address (str): 监听地址（Unix 套接字路径或 host:port，TCP 只允许本机回环地址）
+        workers (int | None): 工作进程数，默认为 CPU 核数
+        cache (TokenCache | None): 持久化缓存
+    异常:
+        ValueError: TCP 地址不是本机回环地址时抛出
+    """
+
+    def __init__(self, address=DEFAULT_SOCKET, workers=None, cache=None):
+        kind, target = parse_address(address)
+        if kind == "tcp" and not is_loopback(target[0]):
+            raise ValueError(f"TCP 模式只能监听本机回环地址，收到 {target[0]}：服务会读取请求中的任意路径，不能对外开放")
+        self.address = address
+        self.workers = workers
+        self.cache = cache
+        self._executor = None
+        self._server = None
+
+    async def _handle_client(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:  # 超过 MAX_REQUEST_BYTES 时 readline 将 LimitOverrunError 转为 ValueError
+                    await self._reply(writer, {"ok": False, "error": "请求过长"})
+                    break
+                if not line:
+                    break
+                try:
+                    payload = json.loads(line)
+                    if not isinstance(payload, dict):
+                        raise ValueError("请求必须为 JSON 对象")
+                except ValueError as exc:
+                    response = {"ok": False, "error": f"请求格式错误: {exc}"}
+                else:
+                    response = await loop.run_in_executor(self._executor, handle_request, payload)
+                await self._reply(writer, response)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _reply(writer, response):
+        writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+        await writer.drain()
+
+    async def start(self):
+        """
+        启动进程池并开始监听。
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        from batch import init_worker
+
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                             initargs=(self.cache,))
+        # 预热：在开始监听前启动全部工作进程并加载 jieba 词典，
+        # 既让首个请求无需等待，也避免工作进程继承监听套接字
+        loop = asyncio.get_running_loop()
+        warmups = self.workers or os.cpu_count() or 1
+        await asyncio.gather(*(
+            loop.run_in_executor(self._executor, handle_request, {"op": "ping"}) for _ in range(warmups)
+        ))
+        kind, target = parse_address(self.address)
+        if kind == "tcp":
+            self._server = await asyncio.start_server(self._handle_client, *target, limit=MAX_REQUEST_BYTES)
+        else:
+            if os.path.abspath(target) == DEFAULT_SOCKET:
+                ensure_private_dir(RUNTIME_DIR)
+            if os.path.exists(target) and not is_running(target):
+                os.unlink(target)  # 清理上次异常退出遗留的套接字文件
+            self._server = await asyncio.start_unix_server(self._handle_client, target, limit=MAX_REQUEST_BYTES)
+            os.chmod(target, 0o600)
+
+    async def serve_forever(self, on_ready=None):
+        """
+        启动并持续提供服务，直到被取消。
+        参数:
+            on_ready (Callable[[], None] | None): 开始监听后调用（启动失败时不调用）
+        """
+        await self.start()
+        if on_ready is not None:
+            on_ready()
+        try:  # 收到 SIGTERM 时取消服务，走正常的清理流程
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except (NotImplementedError, RuntimeError):
+            pass
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        """
+        停止监听并关闭进程池。
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        kind, target = parse_address(self.address)
+        if kind == "unix" and os.path.exists(target):
+            os.unlink(target)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def main():
+    """
+    启动常驻服务。
+    """
+    parser = argparse.ArgumentParser(description="相似度计算常驻服务")
+    parser.add_argument('--address', default=DEFAULT_SOCKET,
+                        help='监听地址：Unix 套接字路径（仅当前用户可连接）或 host:port（只允许本机回环地址，'
+                             '信任本机所有用户，任何本地进程都能借服务读取当前用户可读的文件）')
+    parser.add_argument('--workers', type=int, default=None, help='工作进程数，默认为 CPU 核数')
+    parser.add_argument('--cache', help='持久化分词缓存文件（SQLite）')
+    args = parser.parse_args()
+
+    cache = None
+    if args.cache:
+        from token_cache import TokenCache
+        cache = TokenCache(args.cache)
+    try:
+        server = SimilarityServer(args.address, args.workers, cache)
+    except ValueError as exc:
+        parser.error(str(exc))
+    try:
+        asyncio.run(server.serve_forever(lambda: print(f"相似度服务已启动: {args.address}", flush=True)))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+"""
+simhash_index.py
+作者: wangyq
+修改日期: 2025-09-16
+
+功能:
+基于 SimHash 指纹的近重复检索索引（Manku et al. 的分块置换表方案）。
+将指纹切分为 k+1 块，由抽屉原理，海明距离不超过 k 的两个指纹至少有一块完全相同；
+每块对应一张按“该块置于最高位”的循环置换值排序的表，查询只需在每张表中二分查找前缀区间，
+无需线性扫描全部指纹。索引以 numpy uint64 数组保存，可整体内存映射加载。
+"""
+
+import numpy as np
+
+from similarity_functions import simhash, hamming
+
+# 索引文件的魔数（"SIMHIDX1"）
+MAGIC = int.from_bytes(b"SIMHIDX1", "little")
+# 待合并缓冲区的最小容量，超过后并入排序表
+MERGE_THRESHOLD = 4096
+
+_MASK64 = (1 << 64) - 1
+# 8 位查表法 popcount，用于不支持 np.bitwise_count 的 numpy 版本
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount64(arr):
+    """
+    逐元素统计 uint64 数组中 1 的个数。
+    参数:
+        arr (np.ndarray): uint64 数组
+    返回:
+        np.ndarray: 每个元素的 1 的个数
+    """
+    arr = np.ascontiguousarray(arr, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(arr).astype(np.int64)
+    return _POPCOUNT8[arr.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.int64)
+
+
+def _rotl(values, r):
+    """
+    对 uint64 数组（或标量）循环左移 r 位。
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    r %= 64
+    if r == 0:
+        return values.copy()
+    return (values << np.uint64(r)) | (values >> np.uint64(64 - r))
+
+
+def _blocks(hashbits, k):
+    """
+    将 hashbits 位尽量均匀地切分为 k+1 块。
+    返回:
+        list[tuple[int, int]]: 每块的 [起始位, 结束位)
+    """
+    count = k + 1
+    size, extra = divmod(hashbits, count)
+    blocks, start = [], 0
+    for i in range(count):
+        end = start + size + (1 if i < extra else 0)
+        blocks.append((start, end))
+        start = end
+    return blocks
+
+
+class SimhashIndex:
+    """
+    SimHash 近重复索引。
+    参数:
+        k (int): 查询的最大海明距离
+        hashbits (int): 指纹位数，不超过 64
+    """
+
+    def __init__(self, k=3, hashbits=64):
+        if not isinstance(k, int) or k < 0:
+            raise ValueError("k 必须为非负整数")
+        if not isinstance(hashbits, int) or not 0 < hashbits <= 64:
+            raise ValueError("hashbits 必须为 1~64 之间的整数")
+        if k + 1 > hashbits:
+            raise ValueError("k + 1 不能超过 hashbits")
+        self.k = k
+        self.hashbits = hashbits
+        self._blocks = _blocks(hashbits, k)
+        empty = np.zeros(0, dtype=np.uint64)
+        # 每张表：(排序后的置换指纹, 对应的文档 id)
+        self._tables = [(empty, empty) for _ in self._blocks]
+        self._pending_fps = []
+        self._pending_ids = []
+
+    def __len__(self):
+        return len(self._tables[0][0]) + len(self._pending_fps)
+
+    @classmethod
+    def build(cls, fingerprints, ids=None, k=3, hashbits=64):
+        """
+        由一批指纹批量构建索引。
+        参数:
+            fingerprints (Iterable[int]): 指纹
+            ids (Iterable[int] | None): 文档 id，默认为 0..N-1
+            k (int): 查询的最大海明距离
+            hashbits (int): 指纹位数
+        返回:
+            SimhashIndex: 索引
+        """
+        index = cls(k, hashbits)
+        index.add_many(fingerprints, ids)
+        return index
+
+    def _shift(self, block):
+        # 循环左移量：使该块的最高位移到第 63 位
+        return 64 - block[1]
+
+    def add(self, fingerprint, doc_id):
+        """
+        增量插入单个指纹，先写入缓冲区，积累到一定数量后并入排序表。
+        参数:
+            fingerprint (int): 指纹
+            doc_id (int): 文档 id（非负整数）
+        """
+        if not isinstance(fingerprint, int) or fingerprint < 0 or fingerprint >> self.hashbits:
+            raise ValueError("指纹必须为不超过 hashbits 位的非负整数")
+        self._pending_fps.append(fingerprint)
+        self._pending_ids.append(doc_id)
+        if len(self._pending_fps) >= max(MERGE_THRESHOLD, len(self._tables[0][0]) // 64):
+            self.flush()
+
+    def add_many(self, fingerprints, ids=None):
+        """
+        批量插入指纹并立即并入排序表。
+        参数:
+            fingerprints (Iterable[int]): 指纹
+            ids (Iterable[int] | None): 文档 id，默认接续当前索引大小编号
+        """
+        fps = np.fromiter((int(fp) & _MASK64 for fp in fingerprints), dtype=np.uint64)
+        if ids is None:
+            ids = np.arange(len(self), len(self) + len(fps), dtype=np.uint64)
+        else:
+            ids = np.fromiter((int(i) for i in ids), dtype=np.uint64)
+        if len(ids) != len(fps):
+            raise ValueError("fingerprints 与 ids 的数量必须一致")
+        self.flush()
+        self._merge(fps, ids)
+
+    def add_document(self, doc, doc_id):
+        """
+        插入一篇文档（Document 或分词序列）的指纹。
+        """
+        self.add(self._fingerprint_of(doc), doc_id)
+
+    def flush(self):
+        """
+        将缓冲区中的指纹并入排序表。
+        """
+        if not self._pending_fps:
+            return
+        fps = np.array(self._pending_fps, dtype=np.uint64)
+        ids = np.array(self._pending_ids, dtype=np.uint64)
+        self._pending_fps, self._pending_ids = [], []
+        self._merge(fps, ids)
+
+    def _merge(self, fps, ids):
+        if len(fps) == 0:
+            return
+        tables = []
+        for block, (table_fps, table_ids) in zip(self._blocks, self._tables):
+            permuted = _rotl(fps, self._shift(block))
+            all_fps = np.concatenate((table_fps, permuted))
+            all_ids = np.concatenate((table_ids, ids))
+            order = np.argsort(all_fps, kind="stable")
+            tables.append((all_fps[order], all_ids[order]))
+        self._tables = tables
+
+    def _fingerprint_of(self, doc):
+        if isinstance(doc, int):
+            return doc
+        fingerprint = getattr(doc, "fingerprint", None)
+        if fingerprint is not None:
+            return fingerprint(self.hashbits)
+        return simhash(doc, self.hashbits)
+
+    def query(self, doc, k=None):
+        """
+        查询与给定文档海明距离不超过 k 的已索引文档。
+        参数:
+            doc (int | Document | list[str] | array): 指纹、Document 或分词序列
+            k (int | None): 最大海明距离，不超过建索引时的 k，默认为建索引时的 k
+        返回:
+            list[tuple[int, int]]: (文档 id, 海明距离)，按距离、id 升序
+        """
+        k = self.k if k is None else k
+        if not 0 <= k <= self.k:
+            raise ValueError(f"k 必须在 0~{self.k} 之间")
+        fingerprint = self._fingerprint_of(doc)
+        found = {}
+        for block, (table_fps, table_ids) in zip(self._blocks, self._tables):
+            if len(table_fps) == 0:
+                continue
+            width = block[1] - block[0]
+            query = int(_rotl(np.uint64(fingerprint & _MASK64), self._shift(block)))
+            low_bits = 64 - width
+            lo = (query >> low_bits) << low_bits      # 该块前缀相同的区间下界
+            hi = lo | ((1 << low_bits) - 1)           # 区间上界
+            start = np.searchsorted(table_fps, np.uint64(lo), side="left")
+            end = np.searchsorted(table_fps, np.uint64(hi), side="right")
+            if start == end:
+                continue
+            dists = popcount64(table_fps[start:end] ^ np.uint64(query))
+            hit = dists <= k
+            found.update(zip(table_ids[start:end][hit].tolist(), dists[hit].tolist()))
+        for fp, doc_id in zip(self._pending_fps, self._pending_ids):
+            dist = hamming(fp, fingerprint)
+            if dist <= k:
+                found[doc_id] = dist
+        return sorted(found.items(), key=lambda item: (item[1], item[0]))
+
+    def save(self, path):
+        """
+        保存为单个 .npy 文件：第 0 列为元数据，其后每张表占两行（置换指纹、文档 id）。
+        参数:
+            path (str): 输出文件路径
+        """
+        self.flush()
+        n = len(self._tables[0][0])
+        data = np.zeros((2 * len(self._tables), n + 1), dtype=np.uint64)
+        data[0, 0], data[1, 0] = MAGIC, self.hashbits
+        for t, (table_fps, table_ids) in enumerate(self._tables):
+            data[2 * t, 1:] = table_fps
+            data[2 * t + 1, 1:] = table_ids
+        with open(path, "wb") as file_handle:
+            np.save(file_handle, data)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        加载索引文件。
+        参数:
+            path (str): 索引文件路径
+            mmap (bool): 是否以只读内存映射方式加载
+        返回:
+            SimhashIndex: 索引
+        异常:
+            ValueError: 文件不存在或格式不正确时抛出
+        """
+        try:
+            data = np.load(path, mmap_mode="r" if mmap else None)
+        except FileNotFoundError as exc:
+            raise ValueError(f"文件 {path} 不存在！") from exc
+        if data.ndim != 2 or data.dtype != np.uint64 or data.shape[0] < 2 or int(data[0, 0]) != MAGIC:
+            raise ValueError(f"文件 {path} 不是有效的 SimHash 索引")
+        index = cls(data.shape[0] // 2 - 1, int(data[1, 0]))
+        index._tables = [(data[2 * t, 1:], data[2 * t + 1, 1:]) for t in range(len(index._blocks))]
+        return index
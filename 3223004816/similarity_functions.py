@@ -6,26 +6,99 @@ similarity_functions.py
 功能: 提供多种文本相似度计算方法，包括：最长公共子序列 (LCS)、编辑距离 (Edit Distance)、Jaccard 相似度、SimHash 与海明距离。
 """
 import hashlib
-import numpy as np
+from array import array
+from collections import Counter
+from functools import lru_cache
+from lazy_import import is_loaded, lazy_module
+from profiling import register_cache
+from token_vocab import VOCAB
 
-def lcs(a, b):
+# numpy 仅在 SimHash / n-gram 哈希等向量化路径中使用，延迟导入以加快启动
+np = lazy_module("numpy", globals(), "np")
+
+# SimHash 中 token -> 哈希摘要的 LRU 缓存容量
+SIMHASH_CACHE_SIZE = 1 << 16
+# n-gram 打包为单个整数键时每个 id 占用的位数
+NGRAM_ID_BITS = 32
+# n-gram 滚动哈希的乘数（64 位奇数）
+NGRAM_HASH_PRIME = 0x100000001B3
+# NgramHasher 未合并的哈希数超过该值（且超过已合并集合的大小）时合并一次
+NGRAM_FOLD_MIN = 1 << 16
+# 带状 DP 的最大带宽，上界更大时改用位向量实现
+BANDED_MAX_WIDTH = 33
+
+def _is_id_array(seq):
+    """
+    判断输入是否为一维整数 id 数组（array('i') 或 numpy 整数数组）。
+    """
+    if isinstance(seq, array):
+        return seq.typecode in "bBhHiIlLqQ"
+    if not is_loaded("numpy"):  # numpy 未导入时不可能是 numpy 数组
+        return False
+    return isinstance(seq, np.ndarray) and seq.ndim == 1 and np.issubdtype(seq.dtype, np.integer)
+
+
+def _as_tokens(seq, name="tokens"):
     """
-    通过动态规划计算两个序列的最长公共子序列长度（LCS）。
+    校验并规整输入序列：字符串列表原样返回，整数 id 数组（array / numpy）转为 int 列表。
     参数:
-        a (list[str]): 序列 A
-        b (list[str]): 序列 B
+        seq (list[str] | array | np.ndarray): 输入序列
+        name (str): 报错时使用的参数名
+    返回:
+        tuple: (序列, 是否为 id 形式)
+    """
+    if isinstance(seq, list):
+        for x in seq:
+            if not isinstance(x, str):
+                raise TypeError("列表元素必须为字符串")
+        return seq, False
+    if _is_id_array(seq):
+        return seq.tolist(), True
+    raise TypeError(f"{name} 必须为字符串列表或整数 id 数组")
+
+
+def _as_token_pair(a, b):
+    """
+    校验一对输入序列，两者须同为字符串列表或同为 id 数组（空序列不限）。
+    参数:
+        a, b: 输入序列
+    返回:
+        tuple: (规整后的 a, 规整后的 b, 是否为 id 形式)
+    """
+    a, a_ids = _as_tokens(a, "输入")
+    b, b_ids = _as_tokens(b, "输入")
+    if a and b and a_ids != b_ids:
+        raise TypeError("两个序列必须同为字符串列表或同为 id 数组")
+    return a, b, a_ids or b_ids
+
+
+def lcs(a, b, method="bit"):
+    """
+    计算两个序列的最长公共子序列长度（LCS）。
+    参数:
+        a (list[str] | array): 序列 A（字符串列表或 id 数组）
+        b (list[str] | array): 序列 B（与 A 同一形式）
+        method (str): "bit" 为位并行实现（默认），"dp" 为两行动态规划参考实现
     返回:
         int: LCS 的长度
     """
-    if not isinstance(a, list) or not isinstance(b, list):
-        raise TypeError("输入必须为列表")
-    if not all(isinstance(x, str) for x in a + b):
-        raise TypeError("列表元素必须为字符串")
-    if not a or not b:
-        return 0  # 空序列直接返回0
+    a, b, _ = _as_token_pair(a, b)
+    if method not in LCS_METHODS:
+        raise ValueError(f"未知的 LCS 方法: {method}")
     if not a or not b:  # 如果任意序列为空，LCS 长度为 0
         return 0
+    return LCS_METHODS[method](a, b)
 
+
+def lcs_dp(a, b):
+    """
+    通过两行动态规划计算 LCS 长度，O(m·n)，作为位并行实现的参考。
+    参数:
+        a (list[str]): 序列 A（非空）
+        b (list[str]): 序列 B（非空）
+    返回:
+        int: LCS 的长度
+    """
     m, n = len(a), len(b)
 
     # 仅保留两行 DP，prev 为上一行，cur 为当前行
@@ -45,19 +118,106 @@ def lcs(a, b):
     return prev[n]  # 返回 LCS 长度
 
 
-def edit_dist(a, b):
+def match_masks(seq):
+    """
+    为序列中每个元素构造匹配位掩码：第 j 位为 1 表示 seq[j] 等于该元素。
+    参数:
+        seq (list[str]): 输入序列
+    返回:
+        dict: 元素 -> 位掩码（Python 大整数）
+    """
+    masks = {}
+    for j, x in enumerate(seq):
+        masks[x] = masks.get(x, 0) | (1 << j)
+    return masks
+
+
+def lcs_bitparallel(a, b):
+    """
+    位并行计算 LCS 长度（Allison–Dix / Hyyrö）。
+    以 b 为列构造匹配位掩码，a 的每个元素只需常数次大整数运算推进一行，
+    总计约 m·n/64 次机器字运算，结果与 lcs_dp 完全一致。
+    参数:
+        a (list[str]): 序列 A（非空）
+        b (list[str]): 序列 B（非空）
+    返回:
+        int: LCS 的长度
+    """
+    n = len(b)
+    full = (1 << n) - 1
+    masks = match_masks(b)
+    v = full  # v 中 0 的个数即当前行的 LCS 长度
+    for x in a:
+        match = masks.get(x)
+        if match is None:  # 无匹配时该行不变
+            continue
+        u = v & match
+        v = ((v + u) | (v - u)) & full
+    return n - bin(v).count("1")
+
+
+# LCS 可选实现
+LCS_METHODS = {
+    "bit": lcs_bitparallel,
+    "dp": lcs_dp,
+}
+
+
+def common_count(a, b):
+    """
+    计算两个序列作为多重集的交集大小，O(m+n)。
+    它是 LCS 长度的上界，也给出编辑距离的下界 max(m, n) - common_count(a, b)。
+    参数:
+        a (list[str] | array): 序列 A
+        b (list[str] | array): 序列 B
+    返回:
+        int: 多重集交集的元素个数
+    """
+    a, b, _ = _as_token_pair(a, b)
+    return sum((Counter(a) & Counter(b)).values())
+
+
+def edit_dist(a, b, max_distance=None, method="bit"):
     """
-    通过动态规划计算两个序列的编辑距离。
+    计算两个序列的编辑距离。
+    给定 max_distance 时，一旦确定距离超过上界即提前返回 max_distance + 1，
+    适用于只需判断是否达到阈值的场景；上界较小时自动改用带状 DP。
+    参数:
+        a (list[str] | array): 序列 A（字符串列表或 id 数组）
+        b (list[str] | array): 序列 B（与 A 同一形式）
+        max_distance (int | None): 距离上界，None 表示计算精确值
+        method (str): "bit" 为位向量实现（默认），"dp" 为两行动态规划，"banded" 为带状 DP（需给定上界）
+    返回:
+        int: 编辑距离；超过 max_distance 时为 max_distance + 1
+    """
+    a, b, _ = _as_token_pair(a, b)
+    if method not in EDIT_METHODS:
+        raise ValueError(f"未知的编辑距离方法: {method}")
+    if max_distance is None:
+        if method == "banded":
+            raise ValueError("banded 方法需要给定 max_distance")
+        return edit_dist_dp(a, b) if method == "dp" else edit_dist_bitvector(a, b)
+
+    if not isinstance(max_distance, int) or max_distance < 0:
+        raise ValueError("max_distance 必须为非负整数")
+    if abs(len(a) - len(b)) > max_distance:  # 长度差即为距离下界
+        return max_distance + 1
+    if method == "banded" or (method == "bit" and 2 * max_distance + 1 <= BANDED_MAX_WIDTH):
+        return edit_dist_banded(a, b, max_distance)
+    if method == "dp":
+        return min(edit_dist_dp(a, b), max_distance + 1)
+    return edit_dist_bitvector(a, b, max_distance)
+
+
+def edit_dist_dp(a, b):
+    """
+    通过两行动态规划计算编辑距离，O(m·n)，作为位向量实现的参考。
     参数:
         a (list[str]): 序列 A
         b (list[str]): 序列 B
     返回:
         int: 编辑距离
     """
-    if not isinstance(a, list) or not isinstance(b, list):
-        raise TypeError("输入必须为列表")
-    if not all(isinstance(x, str) for x in a + b):
-        raise TypeError("列表元素必须为字符串")
     m, n = len(a), len(b)
 
     # 仅保留两行 DP，prev 为上一行，cur 为当前行
@@ -79,23 +239,189 @@ def edit_dist(a, b):
     return prev[n]  # 返回编辑距离
 
 
+def edit_dist_bitvector(a, b, max_distance=None):
+    """
+    位向量计算编辑距离（Myers 1999 / Hyyrö 的全局距离形式）。
+    以 a 为模式构造匹配位掩码，b 的每个元素用常数次大整数运算推进一列，
+    结果与 edit_dist_dp 完全一致。
+    参数:
+        a (list[str]): 序列 A
+        b (list[str]): 序列 B
+        max_distance (int | None): 距离上界，超过时提前返回 max_distance + 1
+    返回:
+        int: 编辑距离
+    """
+    m, n = len(a), len(b)
+    if m == 0 or n == 0:
+        dist = m + n
+        return dist if max_distance is None else min(dist, max_distance + 1)
+
+    full = (1 << m) - 1
+    high = 1 << (m - 1)
+    masks = match_masks(a)
+    pv, mv = full, 0  # 纵向差分的 +1 / -1 位向量
+    score = m  # 当前列最后一行的值 D[m][j]
+    for j, x in enumerate(b, 1):
+        eq = masks.get(x, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        # 全局距离：第 0 行的横向差分恒为 +1，移入 1
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+        # 每列最多使 D[m][j] 减 1，剩余列数也无法拉回上界时提前结束
+        if max_distance is not None and score - (n - j) > max_distance:
+            return max_distance + 1
+    return score if max_distance is None else min(score, max_distance + 1)
+
+
+def edit_dist_banded(a, b, max_distance):
+    """
+    带状动态规划计算有上界的编辑距离（Ukkonen），只计算 |i-j| <= max_distance 的单元格，
+    某一行全部超过上界时提前结束。
+    参数:
+        a (list[str]): 序列 A
+        b (list[str]): 序列 B
+        max_distance (int): 距离上界
+    返回:
+        int: 编辑距离；超过 max_distance 时为 max_distance + 1
+    """
+    m, n = len(a), len(b)
+    k = max_distance
+    inf = k + 1  # 超过上界的值统一截断为 k + 1
+    if abs(m - n) > k:
+        return inf
+
+    prev = [min(j, inf) for j in range(n + 1)]
+    cur = [inf] * (n + 1)
+    for i in range(1, m + 1):
+        lo, hi = max(1, i - k), min(n, i + k)
+        cur[0] = min(i, inf)
+        if lo > 1:
+            cur[lo - 1] = inf  # 带外单元格视为超过上界
+        ai = a[i - 1]
+        row_min = cur[0] if lo == 1 else inf
+        for j in range(lo, hi + 1):
+            val = min(
+                prev[j] + 1,  # 删除
+                cur[j - 1] + 1,  # 插入
+                prev[j - 1] + (0 if ai == b[j - 1] else 1)  # 替换
+            )
+            if val > inf:
+                val = inf
+            cur[j] = val
+            if val < row_min:
+                row_min = val
+        if hi < n:
+            cur[hi + 1] = inf  # 下一行读取时位于带外
+        if row_min > k:  # 整行超过上界，距离不可能回落
+            return inf
+        prev, cur = cur, prev
+
+    return prev[n]
+
+
+# 编辑距离可选实现
+EDIT_METHODS = ("bit", "dp", "banded")
+
+
+def sample_windows(m, windows, width):
+    """
+    在长度为 m 的序列上等间距取若干个窗口。
+    参数:
+        m (int): 序列长度
+        windows (int): 窗口数
+        width (int): 窗口宽度
+    返回:
+        list[tuple]: (起点, 终点) 列表；序列不长于窗口时为整个序列
+    """
+    if windows <= 0 or width <= 0:
+        raise ValueError("窗口数与窗口宽度必须为正整数")
+    if m <= width:
+        return [(0, m)]
+    windows = min(windows, -(-m // width))  # 窗口数不超过铺满序列所需的数量
+    if windows == 1:
+        start = (m - width) // 2
+        return [(start, start + width)]
+    return [(s, s + width) for s in (k * (m - width) // (windows - 1) for k in range(windows))]
+
+
+def lcs_sampled(a, b, windows, width):
+    """
+    抽样估计 LCS 长度：在 A 上等间距取窗口，与 B 中按比例对应位置（两侧各放宽半个窗口）的片段求 LCS，
+    以各窗口的匹配比例的均值乘以 len(a) 作为估计。代价约为 windows · 2·width² / 64 次字运算，与文档长度无关。
+    文档整体顺序基本一致（抄袭、改写）时估计接近精确值；大段移位时偏低。
+    参数:
+        a (list[str] | array): 序列 A（字符串列表或 id 数组）
+        b (list[str] | array): 序列 B（与 A 同一形式）
+        windows (int): 窗口数
+        width (int): 窗口宽度
+    返回:
+        int: LCS 长度的估计值
+    """
+    m, n = len(a), len(b)
+    if m == 0 or n == 0:
+        return 0
+    ratios = []
+    for start, end in sample_windows(m, windows, width):
+        center = start * n // m
+        lo, hi = max(0, center - width // 2), min(n, center + (end - start) + width // 2)
+        ratios.append(lcs(a[start:end], b[lo:hi]) / (end - start))
+    return round(sum(ratios) / len(ratios) * m)
+
+
+def edit_dist_sampled(a, b, windows, width):
+    """
+    抽样估计编辑距离：在 A 上等间距取窗口，与 B 中按比例对应的片段求编辑距离，
+    以各窗口的归一化距离的均值乘以 max(len(a), len(b)) 作为估计。
+    参数:
+        a (list[str] | array): 序列 A（字符串列表或 id 数组）
+        b (list[str] | array): 序列 B（与 A 同一形式）
+        windows (int): 窗口数
+        width (int): 窗口宽度
+    返回:
+        int: 编辑距离的估计值
+    """
+    m, n = len(a), len(b)
+    if m == 0 or n == 0:
+        return m + n
+    ratios = []
+    for start, end in sample_windows(m, windows, width):
+        lo, hi = start * n // m, max(end * n // m, start * n // m + 1)
+        ratios.append(edit_dist(a[start:end], b[lo:hi]) / max(end - start, hi - lo))
+    return round(sum(ratios) / len(ratios) * max(m, n))
+
+
 def ngrams( tokens, n ):
     """
     生成指定序列的 n-gram 集合。
+    id 数组输入时，每个 n-gram 按 NGRAM_ID_BITS 位一段打包为单个整数键，
+    n * NGRAM_ID_BITS <= 64 时以 int64 向量化生成。
     参数:
-        tokens (list[str]): 输入序列
+        tokens (list[str] | array): 输入序列（字符串列表或 id 数组）
         n (int): n-gram 的长度
     返回:
-        set[tuple]: n-gram 集合
+        set[tuple] | set[int]: n-gram 集合
     """
-    if not isinstance(tokens, list):
-        raise TypeError("tokens 必须为列表")
+    is_ids = _is_id_array(tokens)
+    if not is_ids:
+        if not isinstance(tokens, list):
+            raise TypeError("tokens 必须为列表")
     if not isinstance(n, int):
         raise TypeError("n 必须为整数")
     if n <= 0:
         raise ValueError("n-gram 长度必须大于0")
     if n <= 0:
         return set()
+    if is_ids:
+        return _packed_ngrams(tokens, n)
 
     ngram_set = set()
     for i in range(len(tokens) - n + 1):
@@ -104,59 +430,439 @@ def ngrams( tokens, n ):
 
     return ngram_set
 
+def _packed_ngrams(ids, n):
+    """
+    将 id 序列的 n-gram 打包为整数键集合。
+    参数:
+        ids (array | np.ndarray): id 序列
+        n (int): n-gram 的长度
+    返回:
+        set[int]: n-gram 键集合
+    """
+    count = len(ids) - n + 1
+    if count <= 0:
+        return set()
+    if n * NGRAM_ID_BITS <= 64:
+        arr = np.asarray(ids).astype(np.int64)
+        keys = arr[:count].copy()
+        for k in range(1, n):
+            keys = (keys << NGRAM_ID_BITS) | arr[k:k + count]
+        return set(keys.tolist())
+    seq = ids.tolist()
+    keys = seq[:count]
+    for k in range(1, n):  # 超过 64 位时使用 Python 大整数，仍然无碰撞
+        keys = [(x << NGRAM_ID_BITS) | y for x, y in zip(keys, seq[k:k + count])]
+    return set(keys)
+
+
 def jaccard2( a, b, n = 2 ):
     """
     计算两个序列的 Jaccard 相似度（基于 n-gram）。
     参数:
-        a (list[str]): 序列 A
-        b (list[str]): 序列 B
+        a (list[str] | array): 序列 A（字符串列表或 id 数组）
+        b (list[str] | array): 序列 B（与 A 同一形式）
         n (int): n-gram 的长度，默认 2
     返回:
         float: Jaccard 相似度
     """
     if not isinstance(n, int):
         raise TypeError("n 必须为整数")
-    ngrams_a = ngrams(a, n)
-    ngrams_b = ngrams(b, n)
+    if len(a) and len(b) and _is_id_array(a) != _is_id_array(b):
+        raise TypeError("两个序列必须同为字符串列表或同为 id 数组")
+    return jaccard_sets(ngrams(a, n), ngrams(b, n))
+
 
+def jaccard_sets( ngrams_a, ngrams_b ):
+    """
+    计算两个已生成的 n-gram 集合的 Jaccard 相似度。
+    参数:
+        ngrams_a (set): 集合 A
+        ngrams_b (set): 集合 B
+    返回:
+        float: Jaccard 相似度
+    """
     if not ngrams_a and not ngrams_b:   # 两个集合都为空，定义相似度为1
         return 1.0
     if not ngrams_a or not ngrams_b:    # 其中一个为空，定义相似度为0
         return 0.0
-    return len(ngrams_a & ngrams_b) / len(ngrams_a | ngrams_b)  # 相似度 = 交集 / 并集
+    inter = len(ngrams_a & ngrams_b)
+    return inter / (len(ngrams_a) + len(ngrams_b) - inter)  # 相似度 = 交集 / 并集
+
+
+def _as_id_array(tokens):
+    # 字符串列表通过共享词表转为 id，id 数组原样返回，均转为 int64 的 numpy 数组
+    if _is_id_array(tokens):
+        return np.asarray(tokens).astype(np.int64)
+    if not isinstance(tokens, list):
+        raise TypeError("tokens 必须为字符串列表或整数 id 数组")
+    for x in tokens:
+        if not isinstance(x, str):
+            raise TypeError("tokens 中所有元素必须为字符串")
+    return np.asarray(VOCAB.encode(tokens), dtype=np.int64)
+
+
+def ngram_key_sets( tokens, ns, exact = False ):
+    """
+    一次遍历生成多个 n 的 n-gram 键数组（排序去重），是 ngrams 的向量化版本，可直接用于 jaccard_arrays。
+    n * NGRAM_ID_BITS <= 64（n <= 2）时把 id 打包为一个 64 位整数，键与 n-gram 一一对应，没有碰撞；
+    更长的 n-gram 默认对 id 做多项式滚动哈希（各个 n 共用同一次滚动），每个 n-gram 一个 64 位键：
+    两个不同 n-gram 碰撞的概率约为 2⁻⁶⁴，U 个不同 n-gram 中出现任一碰撞的概率不超过 U² / 2⁶⁵
+    （U = 10⁶ 时约 3×10⁻⁸），一次碰撞至多使交集大小偏差 1，可以忽略。
+    exact 为 True 时长 n-gram 以 n 个 id 的原始字节为键，结果与 ngrams 完全一致，代价是更多内存与更慢的排序。
+    id 只在同一进程的共享词表中有意义，键不能跨进程比较（跨进程请使用 ngram_hashes）。
+    参数:
+        tokens (list[str] | array): 输入序列（字符串列表或 id 数组）
+        ns (Iterable[int]): 各个 n-gram 长度
+        exact (bool): 长 n-gram 是否使用无碰撞的精确键
+    返回:
+        dict[int, np.ndarray]: n -> 排序去重后的键数组（uint64，精确模式的长 n-gram 为定长字节）
+    """
+    ns = sorted(set(ns))
+    for n in ns:
+        if not isinstance(n, int):
+            raise TypeError("n 必须为整数")
+        if n <= 0:
+            raise ValueError("n-gram 长度必须大于0")
+    ids = _as_id_array(tokens)
+    result, hashed = {}, []
+    for n in ns:
+        count = len(ids) - n + 1
+        if count <= 0:
+            result[n] = np.zeros(0, dtype=np.uint64)
+        elif n * NGRAM_ID_BITS <= 64:
+            keys = ids[:count].copy()
+            for k in range(1, n):
+                keys = (keys << NGRAM_ID_BITS) | ids[k:k + count]
+            result[n] = np.unique(keys.astype(np.uint64))
+        elif exact:
+            rows = np.ascontiguousarray(np.lib.stride_tricks.sliding_window_view(ids, n))
+            result[n] = np.unique(rows.view(np.dtype((np.void, rows.itemsize * n))).ravel())
+        else:
+            hashed.append(n)
+    if hashed:
+        # 多项式滚动：由长度 k-1 的前缀哈希与下一个 id 得到长度 k 的哈希，各个 n 共用同一次滚动
+        mixed = _mix64(ids.astype(np.uint64) + np.uint64(1))
+        rolled = mixed
+        for k in range(2, hashed[-1] + 1):
+            count = len(ids) - k + 1
+            rolled = rolled[:count] * np.uint64(NGRAM_HASH_PRIME) + mixed[k - 1:k - 1 + count]
+            if k in hashed:
+                result[k] = np.unique(_mix64(rolled))
+    return result
+
+
+def jaccard_arrays( keys_a, keys_b ):
+    """
+    由两个排序去重的键数组计算 Jaccard 相似度，交集大小由有序数组合并求得。
+    参数:
+        keys_a (np.ndarray): 键数组 A（ngram_key_sets 或 ngram_hashes 的结果）
+        keys_b (np.ndarray): 键数组 B
+    返回:
+        float: Jaccard 相似度，两者都为空时为 1，只有一个为空时为 0
+    """
+    if len(keys_a) == 0 and len(keys_b) == 0:
+        return 1.0
+    if len(keys_a) == 0 or len(keys_b) == 0:
+        return 0.0
+    inter = len(np.intersect1d(keys_a, keys_b, assume_unique=True))
+    return inter / (len(keys_a) + len(keys_b) - inter)
+
+
+def jaccard_np( a, b, n = 2, exact = False ):
+    """
+    jaccard2 的向量化版本，结果与 jaccard2 相同（n > 2 且 exact 为 False 时见 ngram_key_sets 的碰撞说明）。
+    参数:
+        a (list[str] | array): 序列 A（字符串列表或 id 数组）
+        b (list[str] | array): 序列 B
+        n (int): n-gram 的长度，默认 2
+        exact (bool): 长 n-gram 是否使用无碰撞的精确键
+    返回:
+        float: Jaccard 相似度
+    """
+    return jaccard_multi(a, b, (n,), exact)[n]
+
+
+def jaccard_multi( a, b, ns = (2, 3, 4), exact = False ):
+    """
+    一次遍历计算多个 n 的 Jaccard 相似度。
+    参数:
+        a (list[str] | array): 序列 A（字符串列表或 id 数组）
+        b (list[str] | array): 序列 B（与 A 同一形式）
+        ns (Iterable[int]): 各个 n-gram 长度
+        exact (bool): 长 n-gram 是否使用无碰撞的精确键
+    返回:
+        dict[int, float]: n -> Jaccard 相似度
+    """
+    if len(a) and len(b) and _is_id_array(a) != _is_id_array(b):
+        raise TypeError("两个序列必须同为字符串列表或同为 id 数组")
+    keys_a, keys_b = ngram_key_sets(a, ns, exact), ngram_key_sets(b, ns, exact)
+    return {n: jaccard_arrays(keys_a[n], keys_b[n]) for n in keys_a}
+
+
+def token_hashes( tokens, vocab = VOCAB ):
+    """
+    计算每个 token 的 64 位哈希（MD5 摘要的前 8 字节），与进程、词表 id 分配无关。
+    参数:
+        tokens (list[str] | array): 输入序列（字符串列表或 id 数组）
+        vocab (Vocabulary): id 数组对应的词表
+    返回:
+        np.ndarray: 与输入等长的 uint64 数组
+    """
+    if _is_id_array(tokens):
+        uniq_ids, inverse = np.unique(np.asarray(tokens), return_inverse=True)
+        return token_hashes(vocab.decode(uniq_ids.tolist()))[inverse.reshape(-1)]
+    if not isinstance(tokens, list):
+        raise TypeError("tokens 必须为列表")
+    if not tokens:
+        return np.zeros(0, dtype=np.uint64)
+    digests = b"".join(_token_digest(t) for t in tokens)
+    return np.frombuffer(digests, dtype="<u8").reshape(-1, 2)[:, 0].astype(np.uint64)
+
+
+def _mix64(h):
+    """
+    splitmix64 终结函数，打散滚动哈希的低位相关性（uint64 数组，按位回绕）。
+    """
+    h = h ^ (h >> np.uint64(30))
+    h = h * np.uint64(0xBF58476D1CE4E5B9)
+    h = h ^ (h >> np.uint64(27))
+    h = h * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
 
 
-def simhash( tokens, hashbits = 64 ):
+def ngram_hashes( tokens, n ):
+    """
+    生成 n-gram 的 64 位哈希集合（已排序去重），是 ngrams 的向量化哈希版本。
+    不同 n-gram 的哈希碰撞概率约为 集合大小² / 2⁶⁵，可忽略。
+    参数:
+        tokens (list[str] | array): 输入序列（字符串列表或 id 数组）
+        n (int): n-gram 的长度
+    返回:
+        np.ndarray: 排序去重后的 uint64 数组
+    """
+    if not isinstance(n, int):
+        raise TypeError("n 必须为整数")
+    if n <= 0:
+        raise ValueError("n-gram 长度必须大于0")
+    return np.unique(_roll_hashes(token_hashes(tokens), n))
+
+
+def ngram_hash_sequence( tokens, n ):
+    """
+    按位置生成每个 n-gram 的 64 位哈希（不去重），第 i 个元素对应 tokens[i:i+n]。
+    哈希与 ngram_hashes 一致，可用于 winnowing 等需要位置信息的场景。
+    参数:
+        tokens (list[str] | array): 输入序列（字符串列表或 id 数组）
+        n (int): n-gram 的长度
+    返回:
+        np.ndarray: 长度为 max(0, len(tokens) - n + 1) 的 uint64 数组
+    """
+    if not isinstance(n, int):
+        raise TypeError("n 必须为整数")
+    if n <= 0:
+        raise ValueError("n-gram 长度必须大于0")
+    return _roll_hashes(token_hashes(tokens), n)
+
+
+def _roll_hashes(hashes, n):
+    """
+    由 token 哈希序列计算每个 n-gram 的哈希（未去重）。
+    参数:
+        hashes (np.ndarray): token 哈希（uint64）
+        n (int): n-gram 的长度
+    返回:
+        np.ndarray: 长度为 len(hashes) - n + 1 的 uint64 数组
+    """
+    count = len(hashes) - n + 1
+    if count <= 0:
+        return np.zeros(0, dtype=np.uint64)
+    rolled = hashes[:count].copy()
+    prime = np.uint64(NGRAM_HASH_PRIME)
+    for k in range(1, n):  # 多项式滚动：h = h * P + t（按 2^64 回绕）
+        rolled = rolled * prime + hashes[k:k + count]
+    return _mix64(rolled)
+
+
+class NgramHasher:
+    """
+    流式 n-gram 哈希累加器：分批输入 token，跨批次保留末尾 n-1 个 token，
+    最终结果与对完整序列调用 ngram_hashes 相同。
+    各批的哈希在未合并的部分超过 max(NGRAM_FOLD_MIN, 已合并集合大小) 时并入已合并集合，
+    内存约为不同 n-gram 数的两倍加上 NGRAM_FOLD_MIN，与输入总长度无关；合并的总代价为均摊 O(N log N)。
+    参数:
+        n (int): n-gram 的长度
+    """
+    __slots__ = ("n", "_tail", "_merged", "_parts", "_pending")
+
+    def __init__(self, n=2):
+        if not isinstance(n, int) or n <= 0:
+            raise ValueError("n-gram 长度必须大于0")
+        self.n = n
+        self._tail = np.zeros(0, dtype=np.uint64)
+        self._merged = np.zeros(0, dtype=np.uint64)
+        self._parts = []
+        self._pending = 0  # _parts 中的哈希总数
+
+    def update(self, tokens):
+        """
+        追加一批 token。
+        参数:
+            tokens (list[str] | array): 分词序列（字符串列表或 id 数组）
+        """
+        hashes = np.concatenate((self._tail, token_hashes(tokens)))
+        rolled = _roll_hashes(hashes, self.n)
+        if len(rolled):
+            part = np.unique(rolled)
+            self._parts.append(part)
+            self._pending += len(part)
+            if self._pending > max(NGRAM_FOLD_MIN, len(self._merged)):
+                self._fold()
+        self._tail = hashes[len(hashes) - (self.n - 1):] if self.n > 1 else hashes[:0]
+
+    def _fold(self):
+        # 将未合并的各批并入已合并集合
+        if self._parts:
+            self._merged = np.unique(np.concatenate([self._merged, *self._parts]))
+            self._parts, self._pending = [], 0
+
+    def digest(self):
+        """
+        返回目前为止全部 n-gram 的哈希（排序去重）。
+        """
+        self._fold()
+        return self._merged
+
+
+@lru_cache(maxsize=SIMHASH_CACHE_SIZE)
+def _token_digest(token):
+    """
+    计算单个 token 的 MD5 摘要（带 LRU 缓存，跨调用共享）。
+    参数:
+        token (str): 输入 token
+    返回:
+        bytes: 16 字节 MD5 摘要
+    """
+    return hashlib.md5(token.encode("utf-8")).digest()
+
+
+register_cache("token_digest", _token_digest.cache_info)
+
+
+def _token_bits(tokens, hashbits):
+    """
+    将一组 token 的哈希一次性展开为 0/1 位矩阵。
+    第 i 列对应 int(md5, 16) 的第 i 位，与逐位移位的结果一致；
+    hashbits 超过 128 时高位补 0。
+    参数:
+        tokens (list[str]): 互不相同的 token
+        hashbits (int): 指纹长度
+    返回:
+        np.ndarray: 形状为 (len(tokens), hashbits) 的 uint8 矩阵
+    """
+    digests = b"".join(_token_digest(t) for t in tokens)
+    raw = np.frombuffer(digests, dtype=np.uint8).reshape(len(tokens), 16)
+    # hexdigest 转整数为大端序，翻转字节后按小端逐位展开，第 i 列即第 i 位
+    bits = np.unpackbits(raw[:, ::-1], axis=1, bitorder="little")
+    if hashbits <= bits.shape[1]:
+        return bits[:, :hashbits]
+    pad = np.zeros((len(tokens), hashbits - bits.shape[1]), dtype=np.uint8)
+    return np.hstack((bits, pad))
+
+
+def simhash( tokens, hashbits = 64, vocab = VOCAB, idf = None ):
     """
    计算序列的 SimHash 指纹。
+   只对去重后的 token 求哈希，按出现次数加权，位展开与累加均为向量化运算。
+   id 数组输入时通过词表还原 token 再求哈希，指纹与字符串输入完全一致。
    参数:
-       tokens (list[str]): 输入序列
+       tokens (list[str] | array): 输入序列（字符串列表或 id 数组）
        hashbits (int): 指纹长度（默认 64 位）
+       vocab (Vocabulary): id 数组对应的词表，默认为共享词表
+       idf (IdfTable | None): 给定时按 TF-IDF 加权（见 simhash_weights）
    返回:
        int: SimHash 指纹
    """
-    if not isinstance(tokens, list):
+    return fingerprint_from_weights(simhash_weights(tokens, hashbits, vocab, idf))
+
+
+def simhash_weights( tokens, hashbits = 64, vocab = VOCAB, idf = None ):
+    """
+    计算 SimHash 的权重向量 v：每个 token 在第 i 位贡献 +1（哈希该位为 1）或 -1。
+    给定 idf 时每个 token 的贡献再乘以其 IDF（TF-IDF 加权），常见词对指纹的影响随之变小。
+    权重向量可直接相加，用于分批或增量计算指纹。
+    参数:
+        tokens (list[str] | array): 输入序列（字符串列表或 id 数组）
+        hashbits (int): 指纹长度
+        vocab (Vocabulary): id 数组对应的词表
+        idf (IdfTable | None): 提供 lookup(tokens) -> IDF 数组的对象，见 idf.IdfTable
+    返回:
+        np.ndarray: 长度为 hashbits 的权重向量，不加权时为 int64，加权时为 float64
+    """
+    if _is_id_array(tokens):
+        uniq_ids, freq = np.unique(np.asarray(tokens), return_counts=True)
+        uniq = vocab.decode(uniq_ids.tolist())
+        weights = freq.astype(np.int64)
+    elif isinstance(tokens, list):
+        for x in tokens:
+            if not isinstance(x, str):
+                raise TypeError("tokens 中所有元素必须为字符串")
+        counts = Counter(tokens)  # 去重并统计词频
+        uniq = list(counts)
+        weights = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+    else:
         raise TypeError("tokens 必须为列表")
-    if not all(isinstance(x, str) for x in tokens):
-        raise TypeError("tokens 中所有元素必须为字符串")
     if hashbits <= 0:
         raise ValueError("hashbits 必须大于0")
-    v = np.zeros(hashbits, dtype=int)  # 初始化权重向量（numpy数组，便于向量化）
-
-    for token in tokens:
-        # 将 token 做 MD5 哈希并转换为整数
-        h = int(hashlib.md5(token.encode("utf-8")).hexdigest(), 16)
-        # 将整数转换为二进制数组 0/1，长度为 hashbits
-        bits = np.array([(h >> i) & 1 for i in range(hashbits)], dtype=int)
-        # 更新权重向量：1 -> +1, 0 -> -1
-        v += np.where(bits == 1, 1, -1)
-
-    # 根据权重向量生成最终指纹：权重大于等于0为1，否则为0
-    fingerprint = 0
-    for i in range(hashbits):
-        if v[i] >= 0:
-            fingerprint |= 1 << i
-    return fingerprint
+    if idf is not None:
+        weights = weights * np.asarray(idf.lookup(uniq), dtype=np.float64)
+    v = np.zeros(hashbits, dtype=weights.dtype)  # 权重向量
+
+    if uniq:
+        bits = _token_bits(uniq, hashbits)
+        # 每个 token 贡献 词频 * (+1/-1)：1 -> +1, 0 -> -1
+        v = weights @ (2 * bits.astype(weights.dtype) - 1)
+    return v
+
+
+def fingerprint_from_weights( v ):
+    """
+    由权重向量生成 SimHash 指纹：权重大于等于0的位为1，否则为0。
+    参数:
+        v (np.ndarray): 权重向量
+    返回:
+        int: SimHash 指纹
+    """
+    packed = np.packbits(np.asarray(v) >= 0, bitorder="little")
+    return int.from_bytes(packed.tobytes(), "little")
+
+
+class SimhashAccumulator:
+    """
+    流式 SimHash 累加器：分批累加权重向量，结果与对完整序列调用 simhash 相同。
+    参数:
+        hashbits (int): 指纹长度
+    """
+    __slots__ = ("hashbits", "v")
+
+    def __init__(self, hashbits=64):
+        if not isinstance(hashbits, int) or hashbits <= 0:
+            raise ValueError("hashbits 必须为正整数")
+        self.hashbits = hashbits
+        self.v = np.zeros(hashbits, dtype=np.int64)
+
+    def update(self, tokens):
+        """
+        累加一批 token。
+        参数:
+            tokens (list[str] | array): 分词序列（字符串列表或 id 数组）
+        """
+        self.v += simhash_weights(tokens, self.hashbits)
+
+    def fingerprint(self):
+        """
+        返回当前的 SimHash 指纹。
+        """
+        return fingerprint_from_weights(self.v)
 
 # 计算两个整数的海明距离，即二进制位不同的数量
 def hamming( x, y ):
@@ -177,8 +883,8 @@ def simhash_res( orig_tokens, copy_tokens, hashbits = 64 ):
     """
     计算两个序列的 SimHash 相似度。
     参数:
-        orig_tokens (list[str]): 原文分词序列
-        copy_tokens (list[str]): 待测文本分词序列
+        orig_tokens (list[str] | array): 原文分词序列（字符串列表或 id 数组）
+        copy_tokens (list[str] | array): 待测文本分词序列
         hashbits (int): SimHash 指纹位数，默认 64
     返回:
         float: 相似度，取值范围 [0,1]
@@ -187,5 +893,18 @@ def simhash_res( orig_tokens, copy_tokens, hashbits = 64 ):
         raise ValueError("hashbits 必须为正整数")
     simhash1 = simhash(orig_tokens, hashbits)   # 原文指纹
     simhash2 = simhash(copy_tokens, hashbits)   # 待测文本指纹
-    distance = hamming( simhash1, simhash2 )    # 计算海明距离
-    return 1 - distance / hashbits              # 转换为相似度（1-海明距离/总位数）
+    return fingerprint_sim(simhash1, simhash2, hashbits)
+
+
+def fingerprint_sim( fp1, fp2, hashbits = 64 ):
+    """
+    由两个 SimHash 指纹计算相似度。
+    参数:
+        fp1 (int): 指纹 1
+        fp2 (int): 指纹 2
+        hashbits (int): 指纹位数，默认 64
+    返回:
+        float: 相似度，取值范围 [0,1]
+    """
+    distance = hamming( fp1, fp2 )    # 计算海明距离
+    return 1 - distance / hashbits    # 转换为相似度（1-海明距离/总位数）
@@ -1,9 +1,13 @@
 import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import codecs
 import pytest
-from tool_functions import tokenize, read_file, write_result
-from similarity_functions import lcs, edit_dist, ngrams, jaccard2, simhash, simhash_res, hamming
+from tool_functions import tokenize, read_file, write_result, iter_text_chunks, iter_token_chunks
+from similarity_functions import lcs, edit_dist, ngrams, jaccard2, simhash, simhash_res, hamming, \
+    jaccard_np, jaccard_multi, ngram_key_sets
+from token_vocab import VOCAB, Vocabulary
 
+STREAM_TEXT = "我啊真的喜欢你呢。\n今天吃了吗？Python3 测试特殊字符#@$%^\n" * 20 + "长文本" * 30
 
 
 @pytest.mark.parametrize("text, expected", [
@@ -23,6 +27,66 @@ def test_tokenize_various_cases(text, expected):
     tokens = tokenize(text)
     assert tokens == expected
 
+def test_tokenize_as_ids():
+    text = "我喜欢Python3，我喜欢测试"
+    ids = tokenize(text, as_ids=True)
+    assert ids.typecode == 'i'
+    assert VOCAB.decode(ids) == tokenize(text)
+    assert len(tokenize("", as_ids=True)) == 0
+
+def test_vocabulary_intern():
+    vocab = Vocabulary()
+    ids = vocab.encode(['a', 'b', 'a'])
+    assert list(ids) == [0, 1, 0]
+    assert vocab.decode(ids) == ['a', 'b', 'a']
+    assert len(vocab) == 2 and 'b' in vocab
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+def test_iter_token_chunks_matches_tokenize(tmp_path, chunk_size):
+    text = STREAM_TEXT
+    path = tmp_path / "big.txt"
+    path.write_text(text, encoding="utf-8")
+    chunks = list(iter_text_chunks(str(path), chunk_size))
+    assert "".join(chunks) == text
+    streamed = [t for tokens in iter_token_chunks(str(path), chunk_size) for t in tokens]
+    assert streamed == tokenize(text)
+
+@pytest.mark.parametrize("data", [
+    STREAM_TEXT.encode("gbk"),
+    codecs.BOM_UTF8 + STREAM_TEXT.encode("utf-8"),
+    codecs.BOM_UTF16_LE + STREAM_TEXT.replace("\n", "\r\n").encode("utf-16-le"),
+])
+def test_iter_token_chunks_detects_encoding(tmp_path, data):
+    path = tmp_path / "encoded.txt"
+    path.write_bytes(data)
+    assert "".join(iter_text_chunks(str(path), 7)) == read_file(str(path)) == STREAM_TEXT
+    streamed = [t for tokens in iter_token_chunks(str(path), 7) for t in tokens]
+    assert streamed == tokenize(read_file(str(path)))
+
+def test_tokenize_parallel_matches_tokenize(monkeypatch):
+    import tool_functions
+    monkeypatch.setattr(tool_functions, "PARALLEL_MIN_CHARS", 16)
+    text = "我啊真的喜欢你呢。\n今天吃了吗？Python3 测试特殊字符#@$%^\n" * 40
+    assert tool_functions.tokenize_parallel(text, workers=2) == tokenize(text)
+    assert list(tool_functions.tokenize_parallel(text, workers=2, as_ids=True)) == list(tokenize(text, as_ids=True))
+    # 多次调用复用同一个进程池
+    pool = tool_functions.shared_pool(2)
+    assert tool_functions.shared_pool(2) is pool
+    tool_functions.shutdown_shared_pool()
+    assert tool_functions.shared_pool(2) is not pool
+    tool_functions.shutdown_shared_pool()
+
+def test_split_paragraphs():
+    from tool_functions import split_paragraphs
+    text = "第一段\n第二段\n第三段\n末尾"
+    pieces = split_paragraphs(text, 2)
+    assert "".join(pieces) == text
+    assert all(p.endswith("\n") for p in pieces[:-1])
+
+def test_iter_text_chunks_not_exist():
+    with pytest.raises(ValueError):
+        list(iter_text_chunks("non_existent_file.txt"))
+
 def test_read_write_file(tmp_path):
     file_path = tmp_path / "test.txt"
     # 写入结果
@@ -43,6 +107,18 @@ def test_lcs_cases():
     assert lcs(['a','b'], ['b','a']) == 1      # 部分匹配
     assert lcs(['a','a','b'], ['a','b','b']) == 2  # 重复元素
 
+def test_lcs_bitparallel_matches_dp():
+    import random
+    rng = random.Random(0)
+    for _ in range(200):
+        a = [rng.choice('abcde') for _ in range(rng.randint(0, 30))]
+        b = [rng.choice('abcdef') for _ in range(rng.randint(0, 80))]  # 跨越 64 位字长
+        assert lcs(a, b) == lcs(a, b, method='dp')
+
+def test_lcs_method_error():
+    with pytest.raises(ValueError):
+        lcs(['a'], ['a'], method='unknown')
+
 def test_edit_dist_cases():
     assert edit_dist([], []) == 0               # 空序列
     assert edit_dist(['a'], ['b']) == 1         # 单元素不同
@@ -50,6 +126,33 @@ def test_edit_dist_cases():
     assert edit_dist(['a','b'], ['a','b']) == 0 # 相同序列
     assert edit_dist(['a','b','c'], []) == 3   # 一边空
 
+@pytest.mark.parametrize("method", ['bit', 'dp'])
+def test_edit_dist_methods_match(method):
+    import random
+    rng = random.Random(1)
+    for _ in range(200):
+        a = [rng.choice('abcd') for _ in range(rng.randint(0, 30))]
+        b = [rng.choice('abcde') for _ in range(rng.randint(0, 80))]
+        assert edit_dist(a, b, method=method) == edit_dist(a, b, method='dp')
+
+@pytest.mark.parametrize("method", ['bit', 'dp', 'banded'])
+def test_edit_dist_max_distance(method):
+    import random
+    rng = random.Random(2)
+    for _ in range(200):
+        a = [rng.choice('abcd') for _ in range(rng.randint(0, 30))]
+        b = [rng.choice('abcde') for _ in range(rng.randint(0, 40))]
+        exact = edit_dist(a, b, method='dp')
+        for k in (0, 2, 5, 50):
+            # 超过上界时返回 k + 1
+            assert edit_dist(a, b, max_distance=k, method=method) == min(exact, k + 1)
+
+def test_edit_dist_max_distance_error():
+    with pytest.raises(ValueError):
+        edit_dist(['a'], ['b'], max_distance=-1)
+    with pytest.raises(ValueError):
+        edit_dist(['a'], ['b'], method='banded')
+
 def test_ngrams_cases():
     assert ngrams([], 2) == set()               # 空序列
     assert ngrams(['a','b','c'], 2) == {('a','b'), ('b','c')}  # n-gram正常
@@ -60,6 +163,31 @@ def test_jaccard2_cases():
     assert jaccard2(['a','b'], ['b','c'], 2) == 0.0  # 完全不同
     assert 0 <= jaccard2(['a','b','c'], ['b','c','d'], 2) <= 1  # 范围检查
 
+@pytest.mark.parametrize("exact", [False, True])
+def test_jaccard_np_matches_jaccard2(exact):
+    import random
+    rng = random.Random(5)
+    for _ in range(200):
+        a = [str(rng.randrange(5)) for _ in range(rng.randint(0, 30))]
+        b = [str(rng.randrange(5)) for _ in range(rng.randint(0, 30))]
+        multi = jaccard_multi(a, b, (1, 2, 3, 4), exact)
+        for n in (1, 2, 3, 4):
+            assert jaccard_np(a, b, n, exact) == multi[n] == jaccard2(a, b, n)
+        assert jaccard_np(VOCAB.encode(a), VOCAB.encode(b), 3, exact) == jaccard2(a, b, 3)
+
+def test_ngram_key_sets():
+    ids = VOCAB.encode(['a', 'b', 'a', 'b', 'a'])
+    keys = ngram_key_sets(ids, (1, 2, 3, 6))
+    assert [len(keys[n]) for n in (1, 2, 3, 6)] == [2, 2, 2, 0]
+    assert list(keys[2]) == sorted(keys[2])
+    assert len(ngram_key_sets(ids, (3,), exact=True)[3]) == 2
+    with pytest.raises(ValueError):
+        ngram_key_sets(ids, (0,))
+    with pytest.raises(TypeError):
+        ngram_key_sets("abc", (2,))
+    with pytest.raises(TypeError):
+        jaccard_np(['a'], VOCAB.encode(['a']), 2)
+
 def test_simhash_cases():
     fp1 = simhash(['a','b'])
     fp2 = simhash(['a','b'])
@@ -68,6 +196,50 @@ def test_simhash_cases():
     assert isinstance(fp1, int)
     assert fp1 != fp3 or fp1 == fp3               # 不保证顺序敏感度，可允许相同或不同
 
+def _simhash_reference(tokens, hashbits=64):
+    # 逐 token 逐位累加的原始实现，用于校验向量化版本
+    import hashlib
+    v = [0] * hashbits
+    for token in tokens:
+        h = int(hashlib.md5(token.encode("utf-8")).hexdigest(), 16)
+        for i in range(hashbits):
+            v[i] += 1 if (h >> i) & 1 else -1
+    return sum(1 << i for i in range(hashbits) if v[i] >= 0)
+
+@pytest.mark.parametrize("tokens, hashbits", [
+    ([], 64),
+    (['a'], 64),
+    (['我', '喜欢', '我', 'Python3'], 64),
+    (['长', '文本'] * 50, 64),
+    (['a', 'b', 'c'], 13),      # 非 8 的倍数
+    (['a', 'b', 'c'], 200),     # 超过 MD5 的 128 位
+])
+def test_simhash_matches_reference(tokens, hashbits):
+    assert simhash(tokens, hashbits) == _simhash_reference(tokens, hashbits)
+
+def test_streaming_accumulators():
+    from similarity_functions import SimhashAccumulator, NgramHasher, ngram_hashes
+    import numpy as np
+    tokens = ['我', '喜欢', 'Python3', '我', '喜欢', '测试'] * 5
+    acc, hasher = SimhashAccumulator(), NgramHasher(3)
+    for i in range(0, len(tokens), 4):
+        acc.update(tokens[i:i + 4])
+        hasher.update(tokens[i:i + 4])
+    assert acc.fingerprint() == simhash(tokens)
+    assert np.array_equal(hasher.digest(), ngram_hashes(tokens, 3))
+    assert SimhashAccumulator().fingerprint() == simhash([])
+
+def test_ngram_hasher_folds_parts(monkeypatch):
+    import similarity_functions
+    import numpy as np
+    monkeypatch.setattr(similarity_functions, "NGRAM_FOLD_MIN", 8)
+    tokens = [f"词{i % 50}" for i in range(2000)]  # 只有 50 种 2-gram
+    hasher = similarity_functions.NgramHasher(2)
+    for i in range(0, len(tokens), 10):
+        hasher.update(tokens[i:i + 10])
+        assert hasher._pending <= 60  # 未合并的部分不随输入增长
+    assert np.array_equal(hasher.digest(), similarity_functions.ngram_hashes(tokens, 2))
+
 def test_hamming_cases():
     assert hamming(0b1010, 0b1001) == 2          # 基本位差
     assert hamming(0b1111, 0b1111) == 0          # 相等
@@ -79,6 +251,26 @@ def test_simhash_res_cases():
     assert 0 <= sim <= 1
     assert 0 <= sim2 <= 1
 
+def test_metrics_accept_id_arrays():
+    import random
+    import numpy as np
+    rng = random.Random(3)
+    for _ in range(50):
+        a = [rng.choice(['我', '你', '喜欢', 'Python3', '测试']) for _ in range(rng.randint(0, 40))]
+        b = [rng.choice(['我', '你', '喜欢', 'Python3', '文本']) for _ in range(rng.randint(0, 40))]
+        ia, ib = VOCAB.encode(a), VOCAB.encode(b)
+        na = np.asarray(ia, dtype=np.int32)
+        assert lcs(ia, ib) == lcs(a, b)
+        assert edit_dist(ia, ib) == edit_dist(a, b)
+        for n in (1, 2, 3):
+            assert len(ngrams(ia, n)) == len(ngrams(a, n))
+            assert jaccard2(ia, ib, n) == jaccard2(a, b, n)
+        assert simhash(ia) == simhash(a) == simhash(na)
+
+def test_mixed_token_forms_error():
+    with pytest.raises(TypeError):
+        lcs(['a'], VOCAB.encode(['a']))
+
 def test_lcs_type_error():
     with pytest.raises(TypeError):
         lcs("abc", ["a", "b"])
@@ -0,0 +1,86 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import csv
+import json
+import pytest
+from batch import load_manifest, pairs_from_dirs, run_batch
+
+ORIG = "今天是星期天，天气晴，今天晚上我要去看电影。"
+COPY = "今天是周天，天气晴朗，我晚上要去看电影。"
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    (tmp_path / "orig").mkdir()
+    (tmp_path / "copy").mkdir()
+    (tmp_path / "orig" / "a.txt").write_text(ORIG, encoding="utf-8")
+    (tmp_path / "copy" / "a.txt").write_text(COPY, encoding="utf-8")
+    (tmp_path / "copy" / "b.txt").write_text(ORIG, encoding="utf-8")
+    return tmp_path
+
+def test_load_manifest(corpus):
+    manifest = corpus / "pairs.csv"
+    manifest.write_text("# 注释\norig/a.txt,copy/a.txt\n\norig/a.txt,copy/b.txt\n", encoding="utf-8")
+    pairs = load_manifest(str(manifest))
+    assert [os.path.basename(c) for _, c in pairs] == ["a.txt", "b.txt"]
+    assert all(os.path.isabs(o) for o, _ in pairs)
+
+def test_load_manifest_errors(corpus):
+    with pytest.raises(ValueError):
+        load_manifest(str(corpus / "missing.csv"))
+    bad = corpus / "bad.csv"
+    bad.write_text("only_one_column\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        load_manifest(str(bad))
+
+def test_pairs_from_dirs(corpus):
+    assert len(pairs_from_dirs(str(corpus / "orig"), str(corpus / "copy"))) == 1
+    assert len(pairs_from_dirs(str(corpus / "orig" / "a.txt"), str(corpus / "copy"))) == 2
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_batch_csv(corpus, workers):
+    pairs = pairs_from_dirs(str(corpus / "orig" / "a.txt"), str(corpus / "copy"))
+    pairs.append((str(corpus / "orig" / "a.txt"), str(corpus / "missing.txt")))
+    out = corpus / "result.csv"
+    assert run_batch(pairs, str(out), workers=workers, chunk_size=1) == 3
+    with open(out, encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert float(rows[1]['score']) == pytest.approx(100)
+    assert rows[2]['error']
+
+def test_run_batch_jsonl(corpus):
+    pairs = pairs_from_dirs(str(corpus / "orig"), str(corpus / "copy"))
+    out = corpus / "result.jsonl"
+    run_batch(pairs, str(out), workers=1)
+    rows = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    assert len(rows) == 1 and 0 <= rows[0]['score'] <= 100
+
+@pytest.mark.parametrize("workers, prefetch", [(1, 0), (2, 4)])
+def test_run_batch_reads_gbk(corpus, workers, prefetch):
+    (corpus / "copy" / "gbk.txt").write_bytes(ORIG.encode("gbk"))
+    pairs = pairs_from_dirs(str(corpus / "orig" / "a.txt"), str(corpus / "copy")) * 5
+    out = corpus / "result.jsonl"
+    assert run_batch(pairs, str(out), workers=workers, chunk_size=2, prefetch=prefetch) == 15
+    rows = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    assert [os.path.basename(r['copy']) for r in rows] == ["a.txt", "b.txt", "gbk.txt"] * 5
+    assert rows[2]['score'] == pytest.approx(100) and rows[2]['error'] is None
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_batch_records_os_errors(corpus, workers):
+    (corpus / "copy" / "dir").mkdir()
+    manifest = corpus / "pairs.csv"
+    manifest.write_text("orig/a.txt,copy/dir\norig/a.txt,copy/a.txt\n", encoding="utf-8")
+    out = corpus / "result.csv"
+    assert run_batch(load_manifest(str(manifest)), str(out), workers=workers, prefetch=0) == 2
+    with open(out, encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert rows[0]['error'] and not rows[0]['score']
+    assert not rows[1]['error'] and float(rows[1]['score']) > 0
+
+def test_prefetch_error_is_recorded(corpus, monkeypatch):
+    import batch
+    (corpus / "copy" / "dir").mkdir()
+    pairs = [(str(corpus / "orig" / "a.txt"), str(corpus / "copy" / "dir"))]
+    monkeypatch.setattr(batch, "Document", None)  # 预读失败的文件对不应再读取或构造 Document
+    rows = list(batch.iter_scores(pairs, workers=1, prefetch=2))
+    assert rows[0]['error'] and rows[0]['score'] is None
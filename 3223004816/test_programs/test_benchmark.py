@@ -0,0 +1,32 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from benchmark import parse_size, synthetic_text, mutate_text, run_benchmarks, compare_baseline
+
+
+def test_parse_size():
+    assert parse_size("1K") == 1024 and parse_size("10M") == 10 << 20 and parse_size("512") == 512
+    with pytest.raises(ValueError):
+        parse_size("abc")
+
+def test_synthetic_text_size_and_edits():
+    text = synthetic_text(30 * 1024, seed=1)
+    assert abs(len(text.encode("utf-8")) - 30 * 1024) < 64
+    assert text == synthetic_text(30 * 1024, seed=1)
+    assert mutate_text(text, 0) == text
+    changed = mutate_text(text, 0.05, seed=2)
+    assert changed != text and abs(len(changed) - len(text)) < len(text) * 0.05
+
+def test_run_and_compare_baseline():
+    report = run_benchmarks(sizes=["2K", 4096], functions=["tokenize", "lcs"], repeat=1,
+                            max_quadratic_bytes=2048)
+    rows = {(r["name"], r["size"]): r for r in report["results"]}
+    assert rows[("tokenize", 2048)]["seconds"] > 0 and rows[("tokenize", 2048)]["peak_bytes"] > 0
+    assert "skipped" in rows[("lcs", 4096)]
+    assert compare_baseline(report, report) == []
+    slower = {"results": [dict(r, seconds=r["seconds"] * 3 + 1) if "seconds" in r else r
+                          for r in report["results"]]}
+    regressions = compare_baseline(slower, report, tolerance=0.2)
+    assert {(r["name"], r["metric"]) for r in regressions} == {("tokenize", "seconds"), ("lcs", "seconds")}
+    with pytest.raises(ValueError):
+        run_benchmarks(functions=["nope"])
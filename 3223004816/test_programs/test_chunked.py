@@ -0,0 +1,69 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+import chunked
+from chunked import segment, candidate_chunks, best_chain, chunked_lcs, compare_chunked
+from benchmark import synthetic_text, mutate_text
+from document import Document, compare
+from similarity_functions import lcs
+
+LCS_ONLY = {'lcs': 1, 'edit': 0, 'jaccard': 0, 'simhash': 0}
+
+
+@pytest.fixture(scope="module")
+def pair():
+    orig = synthetic_text(20000, 3)
+    return orig, mutate_text(orig, 0.03, 4)
+
+
+def test_segment_covers_all_tokens(pair):
+    doc = Document(text=pair[0])
+    chunks = segment(doc, 16, 64)
+    assert chunks[0][0] == 0 and chunks[-1][1] == len(doc.ids)
+    assert all(x[1] == y[0] for x, y in zip(chunks, chunks[1:]))
+    assert all(end - start <= 64 for start, end in chunks)
+    assert all(end - start >= 16 for start, end in chunks[:-1])
+    with pytest.raises(ValueError):
+        segment(doc, 10, 5)
+
+def test_segment_short_document():
+    doc = Document(text="今天天气很好。")
+    assert segment(doc) == [(0, len(doc.ids))]
+
+def test_candidate_chunks():
+    a = [{1, 2, 3, 4}, {5, 6}, {9}]
+    b = [{5, 6, 7}, {1, 2, 3, 8}, {4}]
+    assert candidate_chunks(a, b) == [(0, 1), (1, 0)]
+    assert candidate_chunks(a, b, max_postings=0) == []
+
+def test_best_chain():
+    # (0,1)+(1,0) 交叉，只能取其一；(0,0)+(1,1)+(2,2) 是递增链
+    pairs = [(0, 0), (0, 1), (1, 0), (1, 1), (2, 2)]
+    assert best_chain(pairs, [3, 10, 10, 3, 1], 3) == 11
+    assert best_chain(pairs, [5, 1, 1, 5, 5], 3) == 15
+    # 同一原文块的多个候选不能同时使用
+    assert best_chain([(0, 0), (0, 1)], [4, 4], 2) == 4
+
+def test_chunked_lcs_is_close_lower_bound(pair):
+    doc_a, doc_b = Document(text=pair[0]), Document(text=pair[1])
+    exact = lcs(doc_a.ids, doc_b.ids)
+    approx = chunked_lcs(doc_a, doc_b, workers=1)
+    assert approx <= exact
+    assert approx >= 0.9 * exact
+    same = Document(text=pair[0])
+    assert chunked_lcs(doc_a, same, workers=1) == len(doc_a.ids)
+
+def test_chunked_lcs_parallel_matches_serial(pair, monkeypatch):
+    serial = chunked_lcs(Document(text=pair[0]), Document(text=pair[1]), workers=1)
+    monkeypatch.setattr(chunked, "PARALLEL_MIN_CELLS", 0)
+    assert chunked_lcs(Document(text=pair[0]), Document(text=pair[1]), workers=2) == serial
+
+def test_compare_chunked(pair):
+    score, result = compare_chunked(Document(text=pair[0]), Document(text=pair[1]), workers=1)
+    exact_score, exact = compare(Document(text=pair[0]), Document(text=pair[1]))
+    assert result['simhash'] == exact['simhash']
+    assert result['lcs'] <= exact['lcs'] and score == pytest.approx(exact_score, abs=2)
+    score, result = compare_chunked(Document(text=pair[0]), Document(text=pair[1]), LCS_ONLY, workers=1)
+    assert score == pytest.approx(result['lcs'] * 100)
+    unrelated = Document(text=synthetic_text(3000, 99))
+    assert compare_chunked(Document(text=pair[0]), unrelated, LCS_ONLY, workers=1)[1]['lcs'] < 0.2
@@ -0,0 +1,80 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import pytest
+from cluster import UnionFind, simhash_radius, list_documents, cluster_documents, format_cluster_report, \
+    write_cluster_report
+from document import DEFAULT_PERCENT
+
+BASE = "今天是星期天，天气晴，今天晚上我要去看电影。明天是星期一，我要早起去上班，路上买一杯咖啡。"
+OTHER = "春眠不觉晓，处处闻啼鸟。夜来风雨声，花落知多少。床前明月光，疑是地上霜。"
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    files = {
+        "a.txt": BASE,
+        "b.txt": BASE.replace("咖啡", "牛奶"),
+        "c.txt": BASE.replace("星期天", "周日"),
+        "d.txt": OTHER,
+        "e.txt": OTHER.replace("多少", "几何"),
+        "f.txt": "机器学习是人工智能的一个分支，研究计算机如何从数据中学习规律。",
+        "g.txt": "",
+    }
+    for name, text in files.items():
+        (tmp_path / name).write_text(text, encoding="utf-8")
+    return tmp_path
+
+
+def test_union_find():
+    uf = UnionFind(6)
+    assert uf.union(0, 1) and uf.union(2, 3) and uf.union(1, 3)
+    assert not uf.union(0, 2)
+    assert uf.find(0) == uf.find(3) != uf.find(4)
+    assert sorted(uf.groups()) == [[0, 1, 2, 3], [4], [5]]
+
+def test_simhash_radius():
+    assert simhash_radius(100) == 0
+    assert simhash_radius(0) == 64
+    # 默认权重下 simhash 占 0.8，阈值 95 时海明距离最多 4
+    assert simhash_radius(95, DEFAULT_PERCENT) == 4
+    assert simhash_radius(90, {'lcs': 0.5, 'edit': 0.5, 'jaccard': 0, 'simhash': 0}) == 64
+
+def test_list_documents(corpus):
+    assert [os.path.basename(p) for p in list_documents(str(corpus))] == [c + ".txt" for c in "abcdefg"]
+    with pytest.raises(ValueError):
+        list_documents(str(corpus / "missing"))
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_cluster_documents(corpus, workers):
+    paths = list_documents(str(corpus))
+    report = cluster_documents(paths, threshold=60, workers=workers)
+    assert report['documents'] == 7
+    # 空文档不参与聚类，但在 errors 中报告
+    assert [os.path.basename(e['path']) for e in report['errors']] == ["g.txt"]
+    assert "有效词语" in report['errors'][0]['error']
+    members = [[os.path.basename(p) for p in c['members']] for c in report['clusters']]
+    assert sorted(members) == [["a.txt", "b.txt", "c.txt"], ["d.txt", "e.txt"]]
+    scores = [c['max_score'] for c in report['clusters']]
+    assert scores == sorted(scores, reverse=True)
+    for cluster in report['clusters']:
+        assert all(pair['score'] >= 60 for pair in cluster['pairs'])
+        assert cluster['max_score'] == cluster['pairs'][0]['score']
+    # 候选对远少于全部 21 对
+    assert report['candidates'] < 21
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_cluster_skips_unreadable(corpus, workers):
+    (corpus / "sub").mkdir()
+    paths = list_documents(str(corpus)) + [str(corpus / "sub")]
+    report = cluster_documents(paths, threshold=60, workers=workers)
+    assert [e['path'] for e in report['errors']] == [str(corpus / "g.txt"), str(corpus / "sub")]
+    assert len(report['clusters']) == 2
+
+def test_cluster_report_output(corpus, tmp_path):
+    report = cluster_documents(list_documents(str(corpus)), threshold=60, workers=1)
+    text = format_cluster_report(report)
+    assert "a.txt" in text and "f.txt" not in text
+    out = tmp_path / "report.json"
+    write_cluster_report(report, str(out))
+    assert json.loads(out.read_text(encoding="utf-8")) == report
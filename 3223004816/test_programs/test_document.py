@@ -0,0 +1,96 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+import random
+from document import Document, compare, compare_many, compare_threshold, stream_signature
+from similarity_functions import lcs, edit_dist, jaccard2, simhash_res, common_count
+from tool_functions import tokenize
+
+ORIG = "今天是星期天，天气晴，今天晚上我要去看电影。"
+COPY = "今天是周天，天气晴朗，我晚上要去看电影。"
+ALL_METRICS = {'lcs': 0.25, 'edit': 0.25, 'jaccard': 0.25, 'simhash': 0.25}
+
+
+def test_document_lazy_and_memoized(tmp_path):
+    path = tmp_path / "orig.txt"
+    path.write_text(ORIG, encoding="utf-8")
+    doc = Document(str(path))
+    assert doc.tokens == tokenize(ORIG)
+    assert doc.tokens is doc.tokens                  # 只计算一次
+    assert doc.ngram_set(2) is doc.ngram_set(2)
+    assert doc.fingerprint() == doc.fingerprint()
+    assert len(doc) == len(tokenize(ORIG))
+
+def test_document_requires_source():
+    with pytest.raises(ValueError):
+        Document()
+
+def test_compare_matches_token_metrics():
+    orig, copy = tokenize(ORIG), tokenize(COPY)
+    score, result = compare(Document(text=ORIG), Document(text=COPY), ALL_METRICS)
+    assert result['lcs'] == lcs(orig, copy) / len(orig)
+    assert result['edit'] == 1 - edit_dist(orig, copy) / max(len(orig), len(copy))
+    assert result['jaccard'] == jaccard2(orig, copy, 2)
+    assert result['simhash'] == simhash_res(orig, copy)
+    assert score == pytest.approx(sum(result.values()) * 25)
+
+def test_compare_many_reuses_orig():
+    orig = Document(text=ORIG)
+    copies = [Document(text=COPY), Document(text=ORIG)]
+    results = compare_many(orig, copies)
+    assert results[0] == compare(orig, copies[0])
+    assert results[1][0] == pytest.approx(100)
+
+def test_compare_empty_error():
+    with pytest.raises(ValueError):
+        compare(Document(text="啊吧"), Document(text=COPY))
+    with pytest.raises(ValueError):
+        compare(Document(text=ORIG), Document(text=""))
+
+@pytest.mark.parametrize("encoding", ["utf-8", "gbk"])
+def test_stream_signature(tmp_path, encoding):
+    import numpy as np
+    path = tmp_path / "big.txt"
+    path.write_text((ORIG + "\n" + COPY + "\n") * 50, encoding=encoding)
+    count, fingerprint, hashes = stream_signature(str(path), chunk_size=64)
+    doc = Document(str(path))
+    assert count == len(doc)
+    assert fingerprint == doc.fingerprint()
+    assert np.array_equal(hashes, doc.ngram_hashes())
+
+def test_common_count_bounds():
+    orig, copy = tokenize(ORIG), tokenize(COPY)
+    common = common_count(orig, copy)
+    assert lcs(orig, copy) <= common
+    assert edit_dist(orig, copy) >= max(len(orig), len(copy)) - common
+
+def test_threshold_agrees_with_compare():
+    rng = random.Random(3)
+    words = ["今天", "天气", "晴", "电影", "晚上", "我", "去", "看"]
+    orig = Document(text="".join(rng.choice(words) for _ in range(80)))
+    for _ in range(30):
+        copy = Document(text="".join(rng.choice(words) for _ in range(rng.randint(5, 120))))
+        score, result = compare(orig, copy, ALL_METRICS)
+        for threshold in (0, 30, 60, 90, 100):
+            verdict = compare_threshold(orig, copy, threshold, ALL_METRICS)
+            assert verdict.passed == (score >= threshold)
+            assert verdict.low <= score + 1e-9 and score <= verdict.high + 1e-9
+            for metric, value in verdict.result.items():
+                if value is not None:
+                    assert value == result[metric]
+
+def test_threshold_skips_expensive_metrics(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("判定已确定时不应计算 LCS")
+    monkeypatch.setattr("document.lcs", fail)
+    orig, copy = Document(text=ORIG), Document(text="完全不同的一段文字内容")
+    verdict = compare_threshold(orig, copy, 80)
+    assert not verdict.passed and verdict.computed == ['simhash']
+    assert verdict.result['lcs'] is None
+
+def test_threshold_exact_when_undecided():
+    orig, copy = Document(text=ORIG), Document(text=COPY)
+    score, _ = compare(orig, copy, ALL_METRICS)
+    verdict = compare_threshold(orig, copy, score, ALL_METRICS)
+    assert verdict.passed and verdict.low == verdict.high == score
+    assert verdict.computed == ['simhash', 'jaccard', 'lcs', 'edit']
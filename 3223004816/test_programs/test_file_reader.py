@@ -0,0 +1,71 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import codecs
+import pytest
+import file_reader
+from file_reader import decode_bytes, read_text, iter_texts, iter_decoded
+from tool_functions import read_file
+
+TEXT = "今天是星期天，天气晴。\n今天晚上我要去看电影。\n"
+
+
+@pytest.mark.parametrize("data, encoding", [
+    (TEXT.encode("utf-8"), "utf-8"),
+    (codecs.BOM_UTF8 + TEXT.encode("utf-8"), "utf-8"),
+    (TEXT.encode("gb18030"), "gb18030"),
+    (codecs.BOM_UTF16_LE + TEXT.encode("utf-16-le"), "utf-16-le"),
+])
+def test_decode_detects_encoding(data, encoding):
+    assert decode_bytes(data) == (TEXT, encoding)
+
+def test_decode_normalizes_newlines():
+    assert decode_bytes("甲\r\n乙\r丙".encode("utf-8"))[0] == "甲\n乙\n丙"
+
+def test_read_text_small_and_mmap(tmp_path, monkeypatch):
+    path = tmp_path / "gbk.txt"
+    path.write_bytes((TEXT * 50).encode("gbk"))
+    assert read_file(str(path)) == TEXT * 50
+    monkeypatch.setattr(file_reader, "MMAP_MIN_BYTES", 1)  # 强制走内存映射
+    assert read_text(str(path)) == TEXT * 50
+    empty = tmp_path / "empty.txt"
+    empty.write_bytes(b"")
+    assert read_text(str(empty)) == ""
+
+def test_read_errors(tmp_path):
+    with pytest.raises(ValueError, match="不存在"):
+        read_file(str(tmp_path / "missing.txt"))
+    bad = tmp_path / "bad.bin"
+    bad.write_bytes(b"\x80\x81\xfd" * 3)
+    with pytest.raises(ValueError, match="编码"):
+        read_text(str(bad), encodings=("utf-8",))
+
+@pytest.mark.parametrize("data", [
+    (TEXT * 20).encode("gbk"),
+    codecs.BOM_UTF8 + (TEXT * 20).replace("\n", "\r\n").encode("utf-8"),
+    codecs.BOM_UTF16_BE + (TEXT * 20).replace("\n", "\r").encode("utf-16-be"),
+])
+@pytest.mark.parametrize("block_size", [1, 5, 4096])
+def test_iter_decoded_matches_read_text(tmp_path, data, block_size):
+    path = tmp_path / "stream.txt"
+    path.write_bytes(data)
+    assert "".join(iter_decoded(str(path), block_size)) == read_text(str(path)) == TEXT * 20
+
+def test_iter_decoded_errors(tmp_path):
+    with pytest.raises(ValueError, match="不存在"):
+        list(iter_decoded(str(tmp_path / "missing.txt")))
+    bad = tmp_path / "bad.txt"
+    bad.write_bytes(TEXT.encode("utf-8") + b"\x80\x81\xfd")
+    with pytest.raises(ValueError, match="编码"):
+        list(iter_decoded(str(bad), 4, encodings=("utf-8",)))
+
+def test_iter_texts_keeps_order(tmp_path):
+    paths = []
+    for i in range(20):
+        path = tmp_path / f"{i}.txt"
+        path.write_text(f"第{i}篇", encoding="utf-8")
+        paths.append(str(path))
+    paths.insert(5, str(tmp_path / "missing.txt"))
+    results = list(iter_texts(paths, workers=3, prefetch=4))
+    assert [p for p, _, _ in results] == paths
+    assert results[5][1] is None and isinstance(results[5][2], ValueError)
+    assert [t for _, t, _ in results[:5]] == [f"第{i}篇" for i in range(5)]
@@ -0,0 +1,70 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import math
+import pickle
+import numpy as np
+import pytest
+from idf import IdfTable, build_idf, idf_value, load_idf, write_idf
+from document import Document, compare
+from similarity_functions import simhash, simhash_weights
+
+CORPUS = [
+    "我们今天讨论机器学习的基本方法。",
+    "我们明天讨论深度学习的训练技巧。",
+    "我们昨天去公园散步，天气很好。",
+]
+
+
+@pytest.fixture
+def table(tmp_path):
+    paths = []
+    for i, text in enumerate(CORPUS):
+        path = tmp_path / f"{i}.txt"
+        path.write_text(text, encoding="utf-8")
+        paths.append(str(path))
+    paths.append(str(tmp_path / "missing.txt"))
+    table, total, errors = build_idf(paths, str(tmp_path / "idf" / "corpus"), workers=1)
+    assert total == 3 and len(errors) == 1
+    return table
+
+
+def test_idf_values(table):
+    assert isinstance(np.load(table.prefix + ".npy", mmap_mode="r"), np.memmap)
+    weights = table.lookup(["我们", "讨论", "公园", "从未出现"])
+    assert weights.dtype == np.float32
+    assert weights.tolist() == pytest.approx([idf_value(3, 3), idf_value(2, 3), idf_value(1, 3), idf_value(0, 3)])
+    assert idf_value(3, 3) == 1 and idf_value(0, 3) == pytest.approx(math.log(4) + 1)
+
+def test_weighted_simhash_matches_reference(table):
+    tokens = Document(text=CORPUS[0] + CORPUS[1]).tokens
+    v = np.zeros(64)
+    for token in tokens:
+        h = simhash([token])  # 单个 token 的指纹即其哈希的低 64 位
+        w = float(table.lookup([token])[0])
+        v += [w if (h >> i) & 1 else -w for i in range(64)]
+    assert simhash_weights(tokens, 64, idf=table) == pytest.approx(v)
+    assert simhash(tokens, idf=table) == sum(1 << i for i in range(64) if v[i] >= 0)
+
+def test_uniform_idf_equals_plain_simhash(tmp_path):
+    tokens = Document(text=CORPUS[2]).tokens
+    write_idf({t: 1 for t in tokens}, 1, str(tmp_path / "flat"))
+    assert simhash(tokens, idf=IdfTable(str(tmp_path / "flat"))) == simhash(tokens)
+
+def test_compare_with_idf(table):
+    a, b = Document(text=CORPUS[0]), Document(text=CORPUS[1])
+    _, plain = compare(a, b)
+    _, weighted = compare(a, b, idf=table)
+    assert weighted['lcs'] == plain['lcs']
+    assert a.fingerprint(idf=table) == simhash(a.tokens, idf=table)
+    assert a.fingerprint() == simhash(a.tokens)
+
+def test_load_and_pickle(table):
+    shared = load_idf(table.prefix)
+    assert load_idf(table.prefix) is shared
+    assert pickle.loads(pickle.dumps(table)) is shared
+    with pytest.raises(ValueError):
+        IdfTable(table.prefix + "_missing")
+
+def test_build_requires_documents(tmp_path):
+    with pytest.raises(ValueError):
+        build_idf([str(tmp_path / "missing.txt")], str(tmp_path / "corpus"), workers=1)
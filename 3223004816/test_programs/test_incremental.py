@@ -0,0 +1,75 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import pytest
+from incremental import IncrementalSignature, split_chunks
+from benchmark import synthetic_text, mutate_text
+from similarity_functions import ngram_hashes, simhash
+from token_cache import TokenCache
+from document import Document
+from tool_functions import tokenize
+
+
+def _check(sig, text):
+    tokens = tokenize(text)
+    assert sig.tokens == tokens and len(sig) == len(tokens)
+    assert sig.fingerprint() == simhash(tokens, sig.hashbits)
+    assert np.array_equal(sig.ngram_hashes(), ngram_hashes(tokens, sig.n))
+
+
+@pytest.fixture(scope="module")
+def text():
+    return synthetic_text(6000, 5)
+
+
+def test_split_chunks():
+    assert split_chunks("甲\n\n  \n乙\r\n丙") == ["甲", "乙\r", "丙"]
+    assert split_chunks("") == []
+
+@pytest.mark.parametrize("n", [1, 2, 3])
+def test_matches_whole_document(text, n):
+    sig = IncrementalSignature(n=n)
+    stats = sig.update(text)
+    assert stats.tokenized == stats.chunks == len(split_chunks(text))
+    _check(sig, text)
+
+def test_update_only_tokenizes_changed_chunks(text):
+    sig = IncrementalSignature(n=3)
+    sig.update(text)
+    lines = text.split("\n")
+    lines[2] = mutate_text(lines[2], 0.2, 1)
+    lines.insert(0, "新增的第一段。")
+    del lines[5]
+    edited = "\n".join(lines)
+    stats = sig.update(edited)
+    assert stats.tokenized == 2 and stats.removed == 2
+    _check(sig, edited)
+    # 段落移动与重复不需要重新分词
+    moved = "\n".join(lines[3:] + lines[:3] + lines[:1])
+    stats = sig.update(moved)
+    assert stats.tokenized == 0
+    _check(sig, moved)
+    sig.update("")
+    assert sig.tokens == [] and len(sig.ngram_hashes()) == 0
+
+def test_cached_chunks_shared_across_instances(text, tmp_path):
+    cache = TokenCache(str(tmp_path / "cache.db"))
+    IncrementalSignature(cache=cache).update(text)
+    sig = IncrementalSignature(cache=cache)
+    stats = sig.update(text + "\n最后追加的一段。")
+    assert stats.tokenized == 1 and stats.cached == stats.chunks - 1
+    _check(sig, text + "\n最后追加的一段。")
+
+def test_document_reuses_chunks_on_cache_miss(text, tmp_path, monkeypatch):
+    cache = TokenCache(str(tmp_path / "cache.db"))
+    path = tmp_path / "a.txt"
+    path.write_text(text, encoding="utf-8")
+    Document(str(path), cache=cache).tokens
+    edited = text.replace("\n", "\n补充一句。\n", 1)
+    path.write_text(edited, encoding="utf-8")
+    calls = []
+    monkeypatch.setattr("incremental.tokenize", lambda piece: calls.append(piece) or tokenize(piece))
+    doc = Document(str(path), cache=cache)
+    assert doc.tokens == tokenize(edited) and calls == ["补充一句。"]
+    assert doc.fingerprint() == simhash(doc.tokens)
+    assert np.array_equal(doc.ngram_hashes(), ngram_hashes(doc.tokens, 2))
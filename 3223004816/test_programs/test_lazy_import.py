@@ -0,0 +1,36 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import subprocess
+from lazy_import import LazyModule, lazy_module
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def _run(code):
+    return subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+
+def test_proxy_replaces_itself():
+    namespace = {}
+    calls = []
+    proxy = LazyModule("colorsys", namespace, "cs", on_load=calls.append)
+    namespace["cs"] = proxy
+    assert proxy.rgb_to_hsv(1, 0, 0)[0] == 0
+    import colorsys
+    assert namespace["cs"] is colorsys and calls == [colorsys]
+    assert lazy_module("colorsys") is colorsys
+
+def test_main_import_is_light():
+    out = _run("import sys, main; print([m for m in ('numpy', 'jieba', 'document') if m in sys.modules])")
+    assert out.strip() == "[]"
+
+def test_numpy_loaded_on_first_use():
+    out = _run("import sys, similarity_functions as s; a = 'numpy' in sys.modules; "
+               "s.simhash(['今天', '天气']); print(a, 'numpy' in sys.modules)")
+    assert out.split() == ["False", "True"]
+
+def test_startup_time_report(tmp_path):
+    path = tmp_path / "startup.jsonl"
+    subprocess.run([sys.executable, "main.py", "--startup-time", str(path)], cwd=ROOT, check=True)
+    timings = json.loads(path.read_text(encoding="utf-8"))["ms"]
+    assert {"numpy", "jieba", "jieba.initialize", "total"} <= set(timings)
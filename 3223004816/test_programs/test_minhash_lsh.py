@@ -0,0 +1,67 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import random
+import numpy as np
+import pytest
+from minhash_lsh import MinHasher, LSHIndex, estimate_jaccard, optimal_bands, find_similar_pairs
+from similarity_functions import jaccard2, ngram_hashes, ngrams
+from document import Document
+from token_vocab import VOCAB
+
+
+def _variants(seed=0, docs=20, length=200, edits=15):
+    rng = random.Random(seed)
+    words = [f"w{i}" for i in range(400)]
+    result = {}
+    for i in range(docs):
+        base = [rng.choice(words) for _ in range(length)]
+        copy = list(base)
+        for _ in range(edits):
+            copy[rng.randrange(length)] = rng.choice(words)
+        result[f"d{i}"], result[f"d{i}c"] = base, copy
+    return result
+
+def test_ngram_hashes_count_matches_ngrams():
+    tokens = ['a', 'b', 'c', 'a', 'b', 'd']
+    for n in (1, 2, 3):
+        assert len(ngram_hashes(tokens, n)) == len(ngrams(tokens, n))
+    assert np.array_equal(ngram_hashes(VOCAB.encode(tokens), 2), ngram_hashes(tokens, 2))
+
+def test_estimate_close_to_exact():
+    hasher = MinHasher(num_perm=256)
+    docs = _variants(docs=5)
+    for i in range(5):
+        a, b = docs[f"d{i}"], docs[f"d{i}c"]
+        estimate = estimate_jaccard(hasher.signature(a), hasher.signature(b))
+        assert abs(estimate - jaccard2(a, b, 2)) < 0.12
+
+def test_identical_and_empty_signatures():
+    hasher = MinHasher(num_perm=64)
+    assert estimate_jaccard(hasher.signature(['a', 'b', 'c']), hasher.signature(['a', 'b', 'c'])) == 1.0
+    assert estimate_jaccard(hasher.signature([]), hasher.signature([])) == 1.0
+
+def test_optimal_bands():
+    bands, rows = optimal_bands(0.5, 128)
+    assert bands * rows <= 128
+    assert 0.3 < (1 / bands) ** (1 / rows) < 0.7
+    with pytest.raises(ValueError):
+        optimal_bands(1.5, 128)
+
+def test_lsh_index_query():
+    hasher = MinHasher(num_perm=128)
+    docs = _variants(docs=10)
+    index = LSHIndex(threshold=0.5, num_perm=128)
+    for key, tokens in docs.items():
+        index.insert(key, hasher.signature(tokens))
+    assert len(index) == 20
+    assert "d3c" in index.query(hasher.signature(docs["d3"]))
+    with pytest.raises(ValueError):
+        index.insert("d3", hasher.signature(docs["d3"]))
+
+def test_find_similar_pairs():
+    docs = {key: Document(text=" ".join(tokens)) for key, tokens in _variants(docs=15).items()}
+    pairs = find_similar_pairs(docs, threshold=0.5)
+    found = {(p['a'], p['b']) for p in pairs}
+    assert {(f"d{i}", f"d{i}c") for i in range(15)} <= found
+    for p in pairs:
+        assert p['jaccard'] == jaccard2(docs[p['a']].tokens, docs[p['b']].tokens, 2)
@@ -0,0 +1,78 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import random
+from array import array
+import pytest
+from myers_diff import diff_distance, lcs_myers, edit_script, diff
+from similarity_functions import lcs_dp, edit_dist
+from document import Document, compare, near_distance
+from tool_functions import tokenize
+
+ORIG = "今天是星期天，天气晴，今天晚上我要去看电影。明天是星期一，我要早起去上班，路上买一杯咖啡。"
+
+
+def _mutate(rng, seq, edits, alphabet):
+    seq = list(seq)
+    for _ in range(edits):
+        op = rng.random()
+        if op < 0.33 and seq:
+            del seq[rng.randrange(len(seq))]
+        elif op < 0.66:
+            seq.insert(rng.randint(0, len(seq)), rng.randrange(alphabet))
+        elif seq:
+            seq[rng.randrange(len(seq))] = rng.randrange(alphabet)
+    return seq
+
+def test_matches_dp_on_random_sequences():
+    rng = random.Random(7)
+    for _ in range(500):
+        alphabet = rng.randint(1, 5)
+        a = [rng.randrange(alphabet) for _ in range(rng.randint(0, 40))]
+        b = _mutate(rng, a, rng.randint(0, 6), alphabet) if rng.random() < 0.5 else \
+            [rng.randrange(alphabet) for _ in range(rng.randint(0, 40))]
+        a, b = array("i", a), array("i", b)
+        expected = lcs_dp(a.tolist(), b.tolist()) if len(a) and len(b) else 0
+        assert lcs_myers(a, b) == expected
+        assert diff(a, b)[0] == expected
+        assert diff_distance(a, b) == len(a) + len(b) - 2 * expected
+
+def test_edit_script_reconstructs_b():
+    a = tokenize(ORIG)
+    b = tokenize("今天是周天，天气晴朗，今天晚上我要去看电影。明天是星期一，我要早起去上班。")
+    ops = edit_script(a, b)
+    rebuilt, pos_a, pos_b = [], 0, 0
+    for op in ops:
+        assert (op.a_start, op.b_start) == (pos_a, pos_b)
+        if op.tag == "equal":
+            assert a[op.a_start:op.a_end] == b[op.b_start:op.b_end]
+        if op.tag != "delete":
+            rebuilt.extend(b[op.b_start:op.b_end])
+        pos_a, pos_b = op.a_end, op.b_end
+    assert rebuilt == b and (pos_a, pos_b) == (len(a), len(b))
+    assert all(x.tag != y.tag for x, y in zip(ops, ops[1:]))  # 相邻同类操作已合并
+
+def test_max_d_gives_up():
+    a, b = list("abcdef"), list("azcdxf")
+    assert diff_distance(a, b) == 4
+    assert diff_distance(a, b, 4) == 4
+    assert diff_distance(a, b, 3) is None
+    assert lcs_myers(a, b, 3) is None
+
+def test_compare_uses_myers_for_near_duplicates(monkeypatch):
+    rng = random.Random(1)
+    base = [rng.randrange(500) for _ in range(3000)]
+    a, b = array("i", base), array("i", _mutate(rng, base, 20, 500))
+    assert near_distance(a, b) == diff_distance(a, b)
+    assert near_distance(a, array("i", [rng.randrange(500) for _ in range(3000)])) is None
+
+    orig = Document(text=ORIG)
+    copy = Document(text=ORIG.replace("咖啡", "牛奶"))
+    percent = {'lcs': 0.5, 'edit': 0.5, 'jaccard': 0, 'simhash': 0}
+    tokens_a, tokens_b = orig.tokens, copy.tokens
+
+    def fail(*args, **kwargs):
+        raise AssertionError("差异很少时不应运行 O(m·n) 的 LCS")
+    monkeypatch.setattr("document.lcs", fail)
+    _, result = compare(orig, copy, percent)
+    assert result['lcs'] == lcs_dp(tokens_a, tokens_b) / len(tokens_a)
+    assert result['edit'] == pytest.approx(1 - edit_dist(tokens_a, tokens_b) / max(len(tokens_a), len(tokens_b)))
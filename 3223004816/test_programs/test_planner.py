@@ -0,0 +1,87 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import pytest
+from planner import WEIGHT_PRESETS, Plan, compare_planned, load_weights, plan_metrics
+from benchmark import synthetic_text, mutate_text
+from document import DEFAULT_PERCENT, Document, compare
+from similarity_functions import edit_dist, edit_dist_sampled, lcs, lcs_sampled, sample_windows
+
+EDIT_ONLY = {'lcs': 0, 'edit': 1, 'jaccard': 0, 'simhash': 0}
+
+
+@pytest.fixture(scope="module")
+def pair():
+    orig = synthetic_text(8000, 5)
+    return Document(text=orig), Document(text=mutate_text(orig, 0.2, 6))
+
+
+def test_load_weights(tmp_path):
+    assert load_weights() == DEFAULT_PERCENT
+    assert load_weights('balanced') == WEIGHT_PRESETS['balanced']
+    assert load_weights('lcs=1,simhash=3') == {'lcs': 0.25, 'edit': 0, 'jaccard': 0, 'simhash': 0.75}
+    path = tmp_path / "weights.json"
+    path.write_text(json.dumps({'edit': 0.5, 'jaccard': 0.5}), encoding="utf-8")
+    assert load_weights(str(path)) == {'lcs': 0, 'edit': 0.5, 'jaccard': 0.5, 'simhash': 0}
+    for spec in ('j2=1', 'lcs=-1,edit=2', 'lcs=0', 'lcs', 'lcs=abc'):
+        with pytest.raises(ValueError):
+            load_weights(spec)
+
+def test_sample_windows():
+    assert sample_windows(100, 4, 200) == [(0, 100)]
+    assert sample_windows(1000, 4, 100) == [(0, 100), (300, 400), (600, 700), (900, 1000)]
+    assert sample_windows(250, 16, 100) == [(0, 100), (75, 175), (150, 250)]
+    with pytest.raises(ValueError):
+        sample_windows(10, 0, 5)
+
+def test_sampled_estimates(pair):
+    a, b = pair[0].ids, pair[1].ids
+    assert lcs_sampled(a, a, 8, 128) == len(a)
+    assert edit_dist_sampled(a, a, 8, 128) == 0
+    assert lcs_sampled(a, b, 16, 256) == pytest.approx(lcs(a, b), rel=0.1)
+    assert edit_dist_sampled(a, b, 16, 256) == pytest.approx(edit_dist(a, b), rel=0.2)
+
+def test_plan_without_budget_is_exact():
+    plan = plan_metrics(5000, 5000, WEIGHT_PRESETS['balanced'])
+    assert plan.exact and plan.methods == {'lcs': 'bit', 'edit': 'bit', 'jaccard': 'array', 'simhash': 'simhash'}
+    assert plan_metrics(3, 3, EDIT_ONLY).methods['edit'] == 'dp'
+    assert plan_metrics(100, 100, DEFAULT_PERCENT, idf=object()).methods['simhash'] == 'tfidf'
+    with pytest.raises(ValueError):
+        plan_metrics(10, 10, time_budget_ms=0)
+
+def test_plan_under_budget():
+    assert plan_metrics(5000, 5000, WEIGHT_PRESETS['balanced'], 1000).exact
+    tight = plan_metrics(50000, 50000, WEIGHT_PRESETS['balanced'], 5)
+    assert tight.methods['lcs'] == tight.methods['edit'] == 'sampled'
+    assert 1 <= tight.windows < 16
+    banded = plan_metrics(5000, 5000, EDIT_ONLY, 15)
+    assert banded.methods['edit'] == 'banded' and banded.band >= 1
+    assert plan_metrics(5000, 5100, EDIT_ONLY, 15).methods['edit'] == 'sampled'  # 长度差超过带宽
+
+def test_compare_records_plan(pair):
+    percent = WEIGHT_PRESETS['balanced']
+    score, result = compare_planned(pair[0], pair[1], percent)
+    assert result['plan'] == plan_metrics(len(pair[0].ids), len(pair[1].ids), percent).methods
+    plain_score, plain = compare(pair[0], pair[1], percent)
+    assert 'plan' not in plain
+    assert score == plain_score and {metric: result[metric] for metric in plain} == plain
+    same = compare_planned(pair[0], Document(text=pair[0].text), percent)[1]
+    assert same['plan']['lcs'] == same['plan']['edit'] == 'myers'
+
+def test_compare_with_approximate_plan(pair):
+    percent = WEIGHT_PRESETS['balanced']
+    exact_score, exact = compare(pair[0], pair[1], percent)
+    score, result = compare_planned(pair[0], pair[1], percent, time_budget_ms=1)
+    assert result['plan']['lcs'] == result['plan']['edit'] == 'sampled'
+    assert result['simhash'] == exact['simhash'] and result['jaccard'] == exact['jaccard']
+    assert score == pytest.approx(exact_score, abs=5)
+
+def test_banded_falls_back_to_sampling(pair):
+    plan = Plan({'lcs': 'skip', 'edit': 'banded', 'jaccard': 'skip', 'simhash': 'skip'}, 2, 16, 256, 0.0)
+    far = Document(text=synthetic_text(8000, 7))
+    result = compare(pair[0], far, EDIT_ONLY, plan=plan)[1]
+    assert result['plan']['edit'] == 'sampled'
+    near = Document(text=pair[0].text.replace("。", "，", 1))
+    result = compare(pair[0], near, EDIT_ONLY, plan=plan)[1]
+    assert result['plan']['edit'] == 'banded'
+    assert result['edit'] == 1 - edit_dist(pair[0].ids, near.ids) / max(len(pair[0].ids), len(near.ids))
@@ -0,0 +1,49 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import profiling
+from profiling import session, stage, count, add_hook, remove_hook
+from document import Document, compare
+from token_cache import TokenCache
+
+ORIG = "今天是星期天，天气晴，今天晚上我要去看电影。"
+COPY = "今天是周天，天气晴朗，我晚上要去看电影。"
+ALL_METRICS = {'lcs': 0.25, 'edit': 0.25, 'jaccard': 0.25, 'simhash': 0.25}
+
+
+def test_disabled_records_nothing():
+    assert not profiling.enabled()
+    assert stage("x") is stage("y")  # 未启用时共享空上下文
+    with session("s") as stats:      # 没有回调时不记录
+        assert stats is None
+        count("tokens", 3)
+
+def test_session_collects_stages_and_counts():
+    with session("compare", force=True) as stats:
+        compare(Document(text=ORIG), Document(text=COPY), ALL_METRICS)
+    assert {"tokenize", "lcs", "edit", "jaccard", "simhash"} <= set(stats.stages)
+    assert stats.calls["tokenize"] == 2
+    assert stats.counts["tokens"] == len(Document(text=ORIG).tokens) + len(Document(text=COPY).tokens)
+    assert stats.counts["edit.cells"] > 0
+    data = json.loads(json.dumps(stats.as_dict()))
+    assert data["name"] == "compare" and data["stages"]["lcs"]["calls"] == 1
+    assert "tokenize" in stats.format()
+    assert not profiling.enabled()
+
+def test_hooks_receive_stats_and_nested_sessions_merge(tmp_path):
+    received = []
+    add_hook(received.append)
+    try:
+        path = tmp_path / "a.txt"
+        path.write_text(ORIG, encoding="utf-8")
+        cache = TokenCache(str(tmp_path / "cache.db"))
+        with session("outer"):
+            Document(str(path), cache=cache).tokens
+            with session("inner"):
+                Document(str(path), cache=cache).tokens
+    finally:
+        remove_hook(received.append)
+    assert [s.name for s in received] == ["outer"]
+    assert received[0].caches["token_cache"] == (1, 1)
+    assert received[0].hit_rate("token_cache") == 0.5
+    assert received[0].calls["read"] == 1
@@ -0,0 +1,86 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import csv
+import subprocess
+import pytest
+from batch import pairs_from_dirs, run_batch
+from cluster import cluster_documents, list_documents
+from document import DEFAULT_PERCENT, compare
+from planner import WEIGHT_PRESETS
+from result_store import JsonlResultStore, ResultStore, open_result_store
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+ORIG = "今天是星期天，天气晴，今天晚上我要去看电影。"
+COPY = "今天是周天，天气晴朗，我晚上要去看电影。"
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    (tmp_path / "orig").mkdir()
+    (tmp_path / "copy").mkdir()
+    (tmp_path / "orig" / "a.txt").write_text(ORIG, encoding="utf-8")
+    (tmp_path / "copy" / "a.txt").write_text(COPY, encoding="utf-8")
+    (tmp_path / "copy" / "b.txt").write_text(ORIG, encoding="utf-8")
+    pairs = pairs_from_dirs(str(tmp_path / "orig" / "a.txt"), str(tmp_path / "copy"))
+    pairs.append((str(tmp_path / "orig" / "a.txt"), str(tmp_path / "missing.txt")))
+    return tmp_path, pairs
+
+
+@pytest.mark.parametrize("suffix, workers", [(".db", 1), (".db", 2), (".jsonl", 1)])
+def test_batch_writes_full_vectors(corpus, suffix, workers):
+    tmp_path, pairs = corpus
+    with open_result_store(str(tmp_path / ("results" + suffix)), batch_size=2) as store:
+        assert run_batch(pairs, None, workers=workers, chunk_size=1, store=store) == 3
+        rows = list(store.rows())
+    assert [os.path.basename(r['copy']) for r in rows] == ["a.txt", "b.txt", "missing.txt"]
+    _, expected = compare(pairs[0][0], pairs[0][1], dict.fromkeys(DEFAULT_PERCENT, 1.0))
+    assert {m: rows[0][m] for m in expected} == pytest.approx(expected)
+    assert rows[0]['edit'] > 0 and rows[0]['elapsed_ms'] > 0  # 默认权重为 0 的指标同样保存
+    assert rows[0]['score'] == pytest.approx(compare(pairs[0][0], pairs[0][1])[0])
+    assert rows[2]['error'] and rows[2]['lcs'] is None
+
+@pytest.mark.parametrize("suffix", [".db", ".jsonl"])
+def test_rescore_matches_compare(corpus, suffix):
+    tmp_path, pairs = corpus
+    path = str(tmp_path / ("results" + suffix))
+    with open_result_store(path) as store:
+        run_batch(pairs, str(tmp_path / "out.csv"), workers=1, store=store)
+    balanced = WEIGHT_PRESETS['balanced']
+    with open_result_store(path) as store:
+        rows = list(store.rescore(balanced))
+    assert rows[0]['score'] == pytest.approx(compare(pairs[0][0], pairs[0][1], balanced)[0])
+    assert rows[1]['score'] == pytest.approx(100)
+    assert rows[2]['score'] is None
+    with open(tmp_path / "out.csv", encoding="utf-8") as f:
+        assert float(next(csv.DictReader(f))['elapsed_ms']) > 0
+
+def test_runs_and_documents(corpus):
+    tmp_path, pairs = corpus
+    path = str(tmp_path / "results.db")
+    with ResultStore(path) as store:
+        run_batch(pairs[:2], None, workers=1, store=store)
+    with ResultStore(path, WEIGHT_PRESETS['balanced']) as store:
+        run_batch(pairs[:1], None, workers=1, store=store)
+        assert [(run, weights) for run, _, weights in store.runs()] == [(1, DEFAULT_PERCENT), (2, WEIGHT_PRESETS['balanced'])]
+        assert len(store) == 3 and len(list(store.rows(run=2))) == 1
+        assert store._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0] == 3
+    with pytest.raises(ValueError):
+        ResultStore(path, batch_size=0)
+
+def test_cluster_writes_candidates(tmp_path):
+    for name in ("a", "b", "c"):
+        (tmp_path / f"{name}.txt").write_text(ORIG if name != "c" else "完全不同的另一篇文章。", encoding="utf-8")
+    with JsonlResultStore(str(tmp_path / "results.jsonl")) as store:
+        report = cluster_documents(list_documents(str(tmp_path)), workers=1, store=store)
+        rows = list(store.rows())
+    assert len(rows) == report['candidates'] >= 1
+    assert all(r['simhash'] is not None for r in rows)
+
+def test_rescore_cli(corpus):
+    tmp_path, pairs = corpus
+    with ResultStore(str(tmp_path / "results.db")) as store:
+        run_batch(pairs, None, workers=1, store=store)
+    out = tmp_path / "rescored.jsonl"
+    subprocess.run([sys.executable, "result_store.py", "rescore", str(tmp_path / "results.db"),
+                    "--weights", "lcs=1", "-o", str(out)], cwd=ROOT, check=True, capture_output=True)
+    assert len(out.read_text(encoding="utf-8").splitlines()) == 3
@@ -0,0 +1,115 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+import json
+import socket
+import threading
+import pytest
+from server import SimilarityServer, handle_request, parse_address, request, request_score, is_running, \
+    is_trusted_socket, ensure_private_dir, is_loopback
+from main import similarity_score
+
+ORIG = "今天是星期天，天气晴，今天晚上我要去看电影。"
+COPY = "今天是周天，天气晴朗，我晚上要去看电影。"
+
+
+@pytest.fixture
+def small_limit(monkeypatch):
+    monkeypatch.setattr("server.MAX_REQUEST_BYTES", 1024)
+    return 1024
+
+@pytest.fixture
+def running_server(tmp_path):
+    address = str(tmp_path / "s.sock")
+    server = SimilarityServer(address, workers=1)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        started.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert started.wait(60)
+    yield address
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result(30)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(10)
+
+def test_parse_address():
+    assert parse_address("127.0.0.1:8765") == ("tcp", ("127.0.0.1", 8765))
+    assert parse_address("/tmp/a.sock") == ("unix", "/tmp/a.sock")
+
+def test_tcp_only_on_loopback():
+    assert is_loopback("127.0.0.1") and is_loopback("::1") and is_loopback("localhost")
+    assert not is_loopback("0.0.0.0") and not is_loopback("192.168.1.2") and not is_loopback("example.com")
+    SimilarityServer("127.0.0.1:8765")
+    with pytest.raises(ValueError, match="回环"):
+        SimilarityServer("0.0.0.0:8765")
+
+def test_handle_request_errors():
+    assert handle_request({"op": "ping"}) == {"ok": True}
+    assert not handle_request({})["ok"]
+    assert not handle_request({"orig": "missing.txt", "copy": "missing.txt"})["ok"]
+
+def test_server_roundtrip(running_server, tmp_path):
+    orig, copy = tmp_path / "o.txt", tmp_path / "c.txt"
+    orig.write_text(ORIG, encoding="utf-8")
+    copy.write_text(COPY, encoding="utf-8")
+    assert is_running(running_server)
+    assert request_score(running_server, str(orig), str(copy)) == pytest.approx(similarity_score(str(orig), str(copy)))
+    response = request(running_server, {"orig_text": ORIG, "copy_text": ORIG})
+    assert response["ok"] and response["score"] == pytest.approx(100)
+    with pytest.raises(ValueError):
+        request_score(running_server, str(orig), str(tmp_path / "missing.txt"))
+
+def test_client_without_server(tmp_path):
+    assert not is_running(str(tmp_path / "none.sock"))
+    with pytest.raises(ConnectionError):
+        request_score(str(tmp_path / "none.sock"), "a.txt", "b.txt")
+
+def test_socket_permissions(running_server, tmp_path):
+    assert os.stat(running_server).st_mode & 0o777 == 0o600
+    assert is_trusted_socket(running_server)
+    plain = tmp_path / "plain.sock"
+    plain.write_text("", encoding="utf-8")
+    assert not is_trusted_socket(str(plain))  # 不是套接字
+    assert not is_trusted_socket(str(tmp_path / "none.sock"))
+
+@pytest.mark.skipif(not hasattr(os, "getuid") or os.getuid() != 0, reason="需要 root 修改文件属主")
+def test_socket_owned_by_other_user(running_server, tmp_path):
+    os.chown(running_server, 12345, 12345)
+    assert not is_trusted_socket(running_server)
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    os.chown(shared, 12345, 12345)
+    with pytest.raises(ValueError):
+        ensure_private_dir(str(shared))
+
+def test_private_dir(tmp_path):
+    directory = tmp_path / "run"
+    ensure_private_dir(str(directory))
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+    os.chmod(directory, 0o777)
+    with pytest.raises(ValueError):
+        ensure_private_dir(str(directory))
+
+def test_ready_only_after_start(tmp_path):
+    ready = []
+    server = SimilarityServer(str(tmp_path / "missing" / "s.sock"), workers=1)
+    with pytest.raises(OSError):
+        asyncio.run(server.serve_forever(lambda: ready.append(True)))
+    assert ready == []
+
+def test_oversized_request(small_limit, running_server):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(30)
+        sock.connect(running_server)
+        sock.sendall(b'{"orig_text": "' + b"a" * (small_limit * 4) + b'"}\n')
+        with sock.makefile("rb") as reader:
+            assert json.loads(reader.readline()) == {"ok": False, "error": "请求过长"}
+            assert reader.readline() == b""  # 随后关闭连接
+    assert is_running(running_server)
@@ -0,0 +1,66 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import random
+import numpy as np
+import pytest
+from simhash_index import SimhashIndex, popcount64
+from similarity_functions import hamming
+from document import Document
+
+
+def _corpus(hashbits, k, seed=0):
+    rng = random.Random(seed)
+    fps = [rng.getrandbits(hashbits) for _ in range(1000)]
+    for i in range(200):  # 构造距离 0~k+1 的近重复
+        fp = fps[i]
+        for _ in range(rng.randint(0, k + 1)):
+            fp ^= 1 << rng.randrange(hashbits)
+        fps.append(fp)
+    return fps
+
+def _brute_force(fps, query, k):
+    hits = [(i, hamming(query, fp)) for i, fp in enumerate(fps) if hamming(query, fp) <= k]
+    return sorted(hits, key=lambda item: (item[1], item[0]))
+
+@pytest.mark.parametrize("hashbits, k", [(64, 3), (64, 6), (24, 2)])
+def test_query_matches_linear_scan(hashbits, k):
+    fps = _corpus(hashbits, k)
+    index = SimhashIndex.build(fps[:800], k=k, hashbits=hashbits)
+    for i, fp in enumerate(fps[800:], 800):   # 增量插入
+        index.add(fp, i)
+    assert len(index) == len(fps)
+    for query in fps[::13]:
+        assert index.query(query) == _brute_force(fps, query, k)
+
+def test_save_load_mmap(tmp_path):
+    fps = _corpus(64, 3)
+    index = SimhashIndex.build(fps, k=3)
+    path = str(tmp_path / "index.npy")
+    index.save(path)
+    loaded = SimhashIndex.load(path)
+    assert isinstance(loaded._tables[0][0], np.memmap)
+    for query in fps[::17]:
+        assert loaded.query(query) == index.query(query)
+    loaded.add(fps[0], 10 ** 6)
+    assert (10 ** 6, 0) in loaded.query(fps[0])
+
+def test_query_by_document():
+    doc = Document(text="今天是星期天，天气晴，今天晚上我要去看电影。")
+    index = SimhashIndex(k=3)
+    index.add_document(doc, 7)
+    assert index.query(doc) == [(7, 0)]
+    assert index.query(doc.tokens) == [(7, 0)]
+
+def test_popcount64():
+    values = np.array([0, 1, 0b1011, (1 << 64) - 1], dtype=np.uint64)
+    assert popcount64(values).tolist() == [0, 1, 3, 64]
+
+def test_index_errors(tmp_path):
+    with pytest.raises(ValueError):
+        SimhashIndex(k=3, hashbits=128)
+    with pytest.raises(ValueError):
+        SimhashIndex(k=3).add(-1, 0)
+    with pytest.raises(ValueError):
+        SimhashIndex(k=2).query(0, k=3)
+    with pytest.raises(ValueError):
+        SimhashIndex.load(str(tmp_path / "missing.npy"))
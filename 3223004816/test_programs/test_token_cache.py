@@ -0,0 +1,120 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pytest
+from token_cache import TokenCache, EVICT_LOW_WATER
+from document import Document, compare
+from similarity_functions import ngram_hashes, simhash
+
+TEXT = "今天是星期天，天气晴，今天晚上我要去看电影。"
+
+
+def test_put_get_roundtrip(tmp_path):
+    cache = TokenCache(str(tmp_path / "cache.db"))
+    tokens = ["今天", "天气", "晴"]
+    key = cache.key(text=TEXT)
+    assert cache.get(key) is None
+    cache.put(key, tokens, 2, ngram_hashes(tokens, 2), simhash(tokens))
+    entry = cache.get(key)
+    assert entry.tokens == tokens and entry.ngram_n == 2
+    assert np.array_equal(entry.ngram_hashes, ngram_hashes(tokens, 2))
+    assert entry.fingerprint == simhash(tokens)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_stat_key_changes_with_file(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_text(TEXT, encoding="utf-8")
+    cache = TokenCache(str(tmp_path / "cache.db"))
+    key = cache.key(str(path))
+    path.write_text(TEXT * 2, encoding="utf-8")
+    assert cache.key(str(path)) != key
+    with pytest.raises(ValueError):
+        cache.key(str(tmp_path / "missing.txt"))
+
+def test_document_skips_tokenize_on_hit(tmp_path, monkeypatch):
+    path = tmp_path / "a.txt"
+    path.write_text(TEXT, encoding="utf-8")
+    cache = TokenCache(str(tmp_path / "cache.db"))
+    first = Document(str(path), cache=cache)
+    expected = (first.tokens, first.fingerprint())
+
+    def fail(*args, **kwargs):
+        raise AssertionError("命中缓存时不应再读取或分词")
+    monkeypatch.setattr("document.tokenize", fail)
+    monkeypatch.setattr("document.read_file", fail)
+    second = Document(str(path), cache=cache)
+    assert (second.tokens, second.fingerprint()) == expected
+    assert compare(first, second)[0] == pytest.approx(100)
+
+def test_cached_hashes_are_reused(tmp_path, monkeypatch):
+    from minhash_lsh import MinHasher
+    orig, copy = tmp_path / "a.txt", tmp_path / "b.txt"
+    orig.write_text(TEXT, encoding="utf-8")
+    copy.write_text("今天是周天，天气晴朗，我晚上要去看电影。", encoding="utf-8")
+    cache = TokenCache(str(tmp_path / "cache.db"))
+    hasher = MinHasher(32)
+    percent = {'lcs': 0, 'edit': 0, 'jaccard': 1, 'simhash': 0}
+    expected = compare(Document(str(orig)), Document(str(copy)), percent)[0]
+    signature = hasher.signature(Document(str(orig)).tokens)
+    for path in (orig, copy):
+        Document(str(path), cache=cache).tokens  # 写入缓存
+
+    def fail(*args, **kwargs):
+        raise AssertionError("命中缓存时不应重新生成 n-gram")
+    monkeypatch.setattr("document.ngram_key_sets", fail)
+    monkeypatch.setattr("document.ngram_hashes", fail)
+    monkeypatch.setattr("minhash_lsh.ngram_hashes", fail)
+    a, b = Document(str(orig), cache=cache), Document(str(copy), cache=cache)
+    assert compare(a, b, percent)[0] == pytest.approx(expected)
+    assert np.array_equal(hasher.signature(a), signature)
+
+def test_lru_eviction(tmp_path):
+    cache = TokenCache(str(tmp_path / "cache.db"), max_bytes=600)
+    for i in range(20):
+        tokens = [f"词{i}_{j}" for j in range(20)]
+        cache.put(f"k{i}", tokens, 2, ngram_hashes(tokens, 2), 0)
+    assert cache.total_bytes() <= 600
+    assert cache.get("k19") is not None
+    assert cache.get("k0") is None
+
+def test_eviction_down_to_low_water(tmp_path):
+    cache = TokenCache(str(tmp_path / "cache.db"), max_bytes=1 << 30)
+    weights = np.zeros(64, dtype=np.int64)
+    cache.put_chunks((f"c{i}", ["词"] * 5, weights) for i in range(200))
+    full = cache.total_bytes()
+    cache.max_bytes = full - 1
+    cache.put_chunks([("new", ["词"] * 5, weights)])
+    after = cache.total_bytes()
+    assert after <= cache.max_bytes * EVICT_LOW_WATER
+    # 低水位之下的后续写入不再淘汰
+    cache.put_chunks([("next", ["词"] * 5, weights)])
+    assert cache.total_bytes() > after and len(cache.get_chunks(["new", "next"])) == 2
+
+def _fill(args):
+    path, worker = args
+    cache = TokenCache(path)
+    for i in range(20):
+        cache.put(f"w{worker}_{i}", ["a", "b"], 2, ngram_hashes(["a", "b"], 2), i)
+    return len(cache)
+
+def test_concurrent_processes(tmp_path):
+    path = str(tmp_path / "cache.db")
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        list(executor.map(_fill, [(path, w) for w in range(4)]))
+    assert len(TokenCache(path)) == 80
+
+def test_chunk_roundtrip_and_shared_eviction(tmp_path):
+    cache = TokenCache(str(tmp_path / "cache.db"), max_bytes=2000)
+    tokens = ["今天", "天气", "晴"]
+    key = TokenCache.chunk_key("abc", 64)
+    assert cache.get_chunks([key]) == {}
+    cache.put_chunks([(key, tokens, np.arange(-32, 32))])
+    entry = cache.get_chunks([key, key])[key]
+    assert entry.tokens == tokens and entry.weights.dtype == np.int64
+    assert np.array_equal(entry.weights, np.arange(-32, 32))
+    for i in range(20):
+        words = [f"词{i}_{j}" for j in range(20)]
+        cache.put(f"k{i}", words, 2, ngram_hashes(words, 2), 0)
+    assert cache.total_bytes() <= 2000
+    assert cache.get_chunks([key]) == {}
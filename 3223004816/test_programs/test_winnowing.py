@@ -0,0 +1,50 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+from document import Document
+from tool_functions import tokenize, tokenize_with_offsets
+from winnowing import winnow, matched_spans, coverage, format_report, Span
+
+SHARED = "今天我们讨论文本相似度检测的方法，包括最长公共子序列、编辑距离以及指纹算法。"
+ORIG = "  春眠不觉晓，处处闻啼鸟。" + SHARED + "\n另外一段完全无关的内容，讲述了天气和电影。"
+COPY = "开头加了一些新的句子。" + SHARED + "结尾也不一样。"
+
+
+def test_tokenize_with_offsets_matches_tokenize():
+    tokens, starts, ends = tokenize_with_offsets(ORIG)
+    assert tokens == tokenize(ORIG)
+    for token, start, end in zip(tokens, starts, ends):
+        assert token in ORIG[start:end]
+
+def test_winnow_matches_bruteforce():
+    rng = np.random.default_rng(0)
+    hashes = rng.integers(0, 50, size=200).astype(np.uint64)
+    positions, values = winnow(hashes, 4)
+    expected = []
+    for i in range(len(hashes) - 3):
+        window = hashes[i:i + 4]
+        pos = i + max(j for j in range(4) if window[j] == window.min())
+        if not expected or expected[-1] != pos:
+            expected.append(pos)
+    assert positions.tolist() == expected
+    assert np.array_equal(values, hashes[positions])
+    assert winnow(hashes[:2], 4)[0].tolist() == [1 if hashes[1] <= hashes[0] else 0]  # 不足一个窗口
+
+def test_matched_spans_locate_shared_passage():
+    spans = matched_spans(Document(text=ORIG), Document(text=COPY))
+    assert len(spans) == 1
+    span = spans[0]
+    assert ORIG[span.orig_start:span.orig_end] == COPY[span.copy_start:span.copy_end]
+    assert SHARED.rstrip("。") in ORIG[span.orig_start:span.orig_end]
+    assert matched_spans(Document(text=ORIG), Document(text="完全不同的一段文字内容")) == []
+
+def test_coverage_merges_overlaps():
+    spans = [Span(0, 10, 0, 10, 3), Span(5, 20, 30, 45, 4)]
+    assert coverage(spans, 40) == 0.5
+    assert coverage(spans, 50, "copy") == 0.5
+
+def test_format_report():
+    orig, copy = Document(text=ORIG), Document(text=COPY)
+    report = format_report(orig, copy, matched_spans(orig, copy))
+    assert report.startswith("重复片段: 1 处")
+    assert "包括最长公共子序列" in report
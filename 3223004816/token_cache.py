@@ -0,0 +1,295 @@
+"""
+token_cache.py
+作者: wangyq
+修改日期: 2025-09-16
+
+功能:
+可选的持久化磁盘缓存，保存文档的分词结果、n-gram 哈希与 SimHash 指纹。
+以 路径+大小+修改时间（或内容哈希）为键，命中时完全跳过 read_file 与 tokenize。
+另以段落内容哈希为键保存段落级的分词结果与 SimHash 权重向量，文档修改后只需重新处理改动的段落。
+基于 SQLite（WAL 模式），多进程可安全并发读写；总大小超过上限时按最近访问时间淘汰（LRU）。
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+import zlib
+from collections import namedtuple
+
+from lazy_import import lazy_module
+
+np = lazy_module("numpy", globals(), "np")
+
+# 分词规则变化时递增，使旧缓存自动失效
+TOKENIZER_VERSION = 1
+# 缓存默认容量上限（字节）
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# 超过容量上限时一次淘汰到上限的该比例，之后的多次写入都无需再淘汰
+EVICT_LOW_WATER = 0.9
+# 等待其他进程释放写锁的最长时间（秒）
+BUSY_TIMEOUT = 30.0
+
+CacheEntry = namedtuple("CacheEntry", "tokens ngram_n ngram_hashes fingerprint")
+ChunkEntry = namedtuple("ChunkEntry", "tokens weights")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    tokens BLOB NOT NULL,
+    ngram_n INTEGER NOT NULL,
+    ngram_hashes BLOB NOT NULL,
+    fingerprint TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE TABLE IF NOT EXISTS chunks (
+    key TEXT PRIMARY KEY,
+    tokens BLOB NOT NULL,
+    weights BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_accessed ON chunks (accessed);
+"""
+# 两张表合计的占用与按访问时间排序的条目（两个 accessed 索引归并，可逐行读取）
+_TOTAL_SQL = "SELECT (SELECT COALESCE(SUM(size), 0) FROM entries) + (SELECT COALESCE(SUM(size), 0) FROM chunks)"
+_LRU_SQL = ("SELECT 'entries', key, size, accessed FROM entries UNION ALL "
+            "SELECT 'chunks', key, size, accessed FROM chunks ORDER BY accessed")
+# SQLite 单条语句的参数个数上限较小，批量查询时分批
+_SQL_BATCH = 500
+
+
+class TokenCache:
+    """
+    分词与指纹的持久化缓存。
+    参数:
+        path (str): SQLite 数据库文件路径
+        max_bytes (int): 缓存容量上限（字节）
+        key_by (str): "stat" 以 路径+大小+修改时间 为键（无需读文件），"content" 以内容哈希为键
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, key_by="stat"):
+        if key_by not in ("stat", "content"):
+            raise ValueError(f"未知的缓存键类型: {key_by}")
+        if max_bytes <= 0:
+            raise ValueError("max_bytes 必须大于0")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.key_by = key_by
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._pid = None
+
+    def _connect(self):
+        # 连接不能跨进程共享，fork 后的子进程重新建立连接
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_conn"], state["_pid"] = None, None
+        return state
+
+    def close(self):
+        """
+        关闭当前进程的数据库连接。
+        """
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn, self._pid = None, None
+
+    def key(self, path=None, text=None):
+        """
+        计算缓存键。给定 text 时以文本内容哈希为键。
+        参数:
+            path (str | None): 文件路径
+            text (str | None): 文本内容
+        返回:
+            str: 缓存键
+        异常:
+            ValueError: 当文件不存在时抛出
+        """
+        if text is not None:
+            digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+            return f"v{TOKENIZER_VERSION}:text:{digest}"
+        try:
+            if self.key_by == "stat":
+                st = os.stat(path)
+                return f"v{TOKENIZER_VERSION}:stat:{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+            with open(path, "rb") as file_handle:
+                digest = hashlib.sha1(file_handle.read()).hexdigest()
+        except FileNotFoundError as exc:
+            raise ValueError(f"文件 {path} 不存在！") from exc
+        return f"v{TOKENIZER_VERSION}:content:{digest}"
+
+    def get(self, key):
+        """
+        读取缓存项并刷新其访问时间。
+        参数:
+            key (str): 缓存键
+        返回:
+            CacheEntry | None: 缓存项，未命中时为 None
+        """
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT tokens, ngram_n, ngram_hashes, fingerprint FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+        tokens_blob, ngram_n, hashes_blob, fingerprint = row
+        text = zlib.decompress(tokens_blob).decode("utf-8")
+        tokens = text.split("\n") if text else []
+        return CacheEntry(tokens, ngram_n, np.frombuffer(hashes_blob, dtype="<u8").astype(np.uint64),
+                          int(fingerprint, 16))
+
+    def put(self, key, tokens, ngram_n, ngram_hashes, fingerprint):
+        """
+        写入缓存项，并在超过容量上限时淘汰最久未访问的项。
+        参数:
+            key (str): 缓存键
+            tokens (list[str]): 分词结果（不含换行符）
+            ngram_n (int): n-gram 长度
+            ngram_hashes (np.ndarray): n-gram 哈希（uint64）
+            fingerprint (int): SimHash 指纹
+        """
+        tokens_blob = zlib.compress("\n".join(tokens).encode("utf-8"), 1)
+        hashes_blob = np.asarray(ngram_hashes, dtype="<u8").tobytes()
+        size = len(key) + len(tokens_blob) + len(hashes_blob)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, tokens_blob, ngram_n, hashes_blob, format(fingerprint, "x"), size, time.time()),
+            )
+            self._evict(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def chunk_key(digest, hashbits):
+        """
+        段落缓存的键。
+        参数:
+            digest (str): 段落文本的内容哈希
+            hashbits (int): 权重向量的长度
+        返回:
+            str: 缓存键
+        """
+        return f"v{TOKENIZER_VERSION}:chunk{hashbits}:{digest}"
+
+    def get_chunks(self, keys):
+        """
+        批量读取段落缓存并刷新访问时间。
+        参数:
+            keys (Iterable[str]): chunk_key 生成的键
+        返回:
+            dict[str, ChunkEntry]: 命中的段落，tokens 为分词结果，weights 为 int64 的 SimHash 权重向量
+        """
+        keys = list(dict.fromkeys(keys))
+        conn = self._connect()
+        found = {}
+        for start in range(0, len(keys), _SQL_BATCH):
+            batch = keys[start:start + _SQL_BATCH]
+            marks = ",".join("?" * len(batch))
+            for key, tokens_blob, weights_blob in conn.execute(
+                    f"SELECT key, tokens, weights FROM chunks WHERE key IN ({marks})", batch):
+                text = zlib.decompress(tokens_blob).decode("utf-8")
+                weights = np.frombuffer(zlib.decompress(weights_blob), dtype="<i4").astype(np.int64)
+                found[key] = ChunkEntry(text.split("\n") if text else [], weights)
+        if found:
+            now = time.time()
+            conn.executemany("UPDATE chunks SET accessed = ? WHERE key = ?", [(now, key) for key in found])
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_chunks(self, items):
+        """
+        批量写入段落缓存，并在超过容量上限时淘汰最久未访问的项。
+        参数:
+            items (Iterable[tuple[str, list[str], np.ndarray]]): (键, 分词结果, 权重向量)
+        """
+        rows, now = [], time.time()
+        for key, tokens, weights in items:
+            tokens_blob = zlib.compress("\n".join(tokens).encode("utf-8"), 1)
+            weights_blob = zlib.compress(np.asarray(weights, dtype="<i4").tobytes(), 1)
+            rows.append((key, tokens_blob, weights_blob, len(key) + len(tokens_blob) + len(weights_blob), now))
+        if not rows:
+            return
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?)", rows)
+            self._evict(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self, conn):
+        # 超过上限时按访问时间从旧到新淘汰到低水位，只读取需要淘汰的那部分条目
+        total = conn.execute(_TOTAL_SQL).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * EVICT_LOW_WATER
+        victims = {"entries": [], "chunks": []}
+        cursor = conn.execute(_LRU_SQL)
+        for table, key, size, _ in cursor:
+            if total <= target:
+                break
+            victims[table].append((key,))
+            total -= size
+        cursor.close()
+        for table, keys in victims.items():
+            conn.executemany(f"DELETE FROM {table} WHERE key = ?", keys)
+
+    def total_bytes(self):
+        """
+        返回当前缓存占用的字节数（按条目大小估算）。
+        """
+        return self._connect().execute(_TOTAL_SQL).fetchone()[0]
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def clear(self):
+        """
+        清空缓存。
+        """
+        conn = self._connect()
+        conn.execute("DELETE FROM entries")
+        conn.execute("DELETE FROM chunks")
+
+
+_default_cache = None
+
+
+def set_default_cache(cache):
+    """
+    设置进程内默认缓存，未显式指定缓存的 Document 将使用它；传入 None 关闭缓存。
+    参数:
+        cache (TokenCache | str | None): 缓存对象或数据库路径
+    """
+    global _default_cache
+    _default_cache = TokenCache(cache) if isinstance(cache, str) else cache
+
+
+def get_default_cache():
+    """
+    返回进程内默认缓存，未设置时为 None。
+    """
+    return _default_cache
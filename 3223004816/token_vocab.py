@@ -0,0 +1,80 @@
+"""
+token_vocab.py
+作者: wangyq
+修改日期: 2025-09-16
+
+功能:
+提供 token 驻留（interning）词表，将分词结果映射为紧凑的整数 id 数组，
+使各相似度算法的内层循环变为整数比较，并降低每篇文档的内存占用。
+"""
+
+from array import array
+
+
+class Vocabulary:
+    """
+    只增不减的 token <-> id 双向映射，id 从 0 开始连续分配。
+    """
+    __slots__ = ("_ids", "_tokens")
+
+    def __init__(self):
+        self._ids = {}      # token -> id
+        self._tokens = []   # id -> token
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def __contains__(self, token):
+        return token in self._ids
+
+    def intern(self, token):
+        """
+        返回 token 对应的 id，不存在时分配新 id。
+        参数:
+            token (str): 输入 token
+        返回:
+            int: token 的 id
+        """
+        tid = self._ids.get(token)
+        if tid is None:
+            tid = len(self._tokens)
+            self._ids[token] = tid
+            self._tokens.append(token)
+        return tid
+
+    def encode(self, tokens):
+        """
+        将 token 序列转换为 id 数组。
+        参数:
+            tokens (Iterable[str]): token 序列
+        返回:
+            array: typecode 为 'i' 的 id 数组
+        """
+        ids = self._ids
+        intern = self.intern
+        return array("i", [ids[t] if t in ids else intern(t) for t in tokens])
+
+    def decode(self, ids):
+        """
+        将 id 序列还原为 token 列表。
+        参数:
+            ids (Iterable[int]): id 序列
+        返回:
+            list[str]: token 列表
+        """
+        tokens = self._tokens
+        return [tokens[i] for i in ids]
+
+    def token(self, tid):
+        """
+        返回 id 对应的 token。
+        参数:
+            tid (int): token id
+        返回:
+            str: token
+        """
+        return self._tokens[tid]
+
+
+# 进程内共享词表，tokenize(as_ids=True) 与各相似度算法默认使用
+VOCAB = Vocabulary()
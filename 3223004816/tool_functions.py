@@ -7,55 +7,291 @@ tool_functions.py
 提供中文文本的分词方法、文件读写与结果写入功能
 """
 
+import atexit
+import os
 import re
-import jieba
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 import logging
-jieba.setLogLevel(logging.ERROR)
+from file_reader import iter_decoded, read_text
+from lazy_import import LazyModule, lazy_module
+from profiling import register_cache
+from token_vocab import VOCAB
+
+# 指定 jieba 词典缓存文件位置的环境变量
+JIEBA_CACHE_ENV = "SIMCHECK_JIEBA_CACHE"
+_jieba_cache_file = os.environ.get(JIEBA_CACHE_ENV)
+
+
+def _configure_jieba(module):
+    """
+    jieba 首次导入时的初始化：关闭日志输出，并应用词典缓存文件位置。
+    """
+    module.setLogLevel(logging.ERROR)
+    if _jieba_cache_file:
+        module.dt.tmp_dir = os.path.dirname(os.path.abspath(_jieba_cache_file))
+        os.makedirs(module.dt.tmp_dir, exist_ok=True)
+        module.dt.cache_file = os.path.basename(_jieba_cache_file)
+    else:
+        module.dt.tmp_dir = module.dt.cache_file = None
+
+
+# jieba 导入与词典加载较慢，延迟到第一次分词时进行
+jieba = lazy_module("jieba", globals(), "jieba", on_load=_configure_jieba)
+
+
+def set_jieba_cache(path):
+    """
+    设置 jieba 预构建词典缓存文件的位置（默认位于系统临时目录），需在首次分词前调用。
+    也可通过环境变量 SIMCHECK_JIEBA_CACHE 设置。
+    参数:
+        path (str | None): 缓存文件路径，None 恢复默认位置
+    """
+    global _jieba_cache_file
+    _jieba_cache_file = path
+    if not isinstance(jieba, LazyModule):  # 已经导入时直接生效
+        _configure_jieba(jieba)
+
+
+def init_jieba():
+    """
+    立即导入 jieba 并加载词典（用于进程池预热或启动耗时测量）。
+    """
+    jieba.initialize()
+
+
 # 停用词（常见语气词）
 USELESS_WORDS = {"的", "了", "啊", "吧", "吗", "呢", "哦", "嗯"}
+# 流式读取时每块的字符数上限
+STREAM_CHUNK_SIZE = 1 << 20
+# jieba 不会跨越的字符（汉字、字母数字及 +#&._%- 以外），在其后切块不改变分词结果
+_CHUNK_BOUNDARY = re.compile(r"[^\u4E00-\u9FD5a-zA-Z0-9+#&\._%\-]")
+# 标点过滤：保留中文、字母、数字
+_PUNCT = re.compile(r'[^\w\u4e00-\u9fff]')
+# 单个原始分词清洗结果的缓存容量
+CLEAN_CACHE_SIZE = 1 << 16
+# 并行分词的最小文本长度（字符），更短的文本直接串行处理。
+# 串行分词约 9 万字符/秒，而每个工作进程首次启动需重新加载 jieba 词典（约 0.75 秒），
+# 取约 3 秒串行耗时对应的长度，首次调用时进程池的启动开销也能被摊销
+PARALLEL_MIN_CHARS = 1 << 18
 
-def tokenize(text):
+def tokenize(text, as_ids=False):
     """
     对输入文本进行分词，并去掉无用词和标点符号。
     参数:
         text (str): 待分词的文本
+        as_ids (bool): 为 True 时返回共享词表中的 id 数组
     返回:
-        list[str]: 过滤后的分词结果
+        list[str] | array: 过滤后的分词结果
     """
     if not text:
-        return []
+        return array("i") if as_ids else []
     text = text.strip()
     if not text:
-        return []
-    # 中文分词
-    tokens = [t for t in jieba.cut(text) if t.strip()]
-    # 过滤无意义词
-    tokens = [t for t in tokens if t not in USELESS_WORDS]
-    # 过滤标点符号
-    filtered_tokens = []
-    for t in tokens:
-        # 去掉标点
-        t = re.sub(r'[^\w\u4e00-\u9fff]', '', t)  # 保留中文、字母、数字
-        if t:  # 非空才保留
-            filtered_tokens.append(t)
+        return array("i") if as_ids else []
+    # 中文分词，并在一次遍历中过滤无意义词与标点
+    filtered_tokens = [t for t in map(_clean_token, jieba.lcut(text)) if t]
+    if as_ids:
+        return VOCAB.encode(filtered_tokens)
     return filtered_tokens
 
 
+def tokenize_with_offsets(text):
+    """
+    分词并记录每个 token 在原文中的字符区间，token 序列与 tokenize(text) 完全相同。
+    参数:
+        text (str): 待分词的文本
+    返回:
+        tuple: (tokens, starts, ends)
+            - tokens (list[str]): 过滤后的分词结果
+            - starts (array): 每个 token 在 text 中的起始位置
+            - ends (array): 每个 token 在 text 中的结束位置（不含）
+    """
+    tokens, starts, ends = [], array("i"), array("i")
+    if not text or not text.strip():
+        return tokens, starts, ends
+    lead = len(text) - len(text.lstrip())  # tokenize 会先去掉首尾空白
+    for raw, start, end in jieba.tokenize(text.strip()):
+        t = _clean_token(raw)
+        if t:
+            tokens.append(t)
+            starts.append(start + lead)
+            ends.append(end + lead)
+    return tokens, starts, ends
+
+
+def filter_tokens(raw_tokens):
+    """
+    单次遍历过滤 jieba 的原始分词：去掉空白、无用词与标点符号。
+    参数:
+        raw_tokens (Iterable[str]): 原始分词
+    返回:
+        Iterator[str]: 过滤后的分词
+    """
+    for t in map(_clean_token, raw_tokens):
+        if t:  # 非空才保留
+            yield t
+
+
+@lru_cache(maxsize=CLEAN_CACHE_SIZE)
+def _clean_token(t):
+    """
+    清洗单个原始分词：空白与无用词返回空串，否则去掉标点。
+    jieba 的输出高度重复，结果按原始分词缓存。
+    参数:
+        t (str): 原始分词
+    返回:
+        str: 清洗后的分词，为空表示丢弃
+    """
+    if not t.strip() or t in USELESS_WORDS:
+        return ""
+    return _PUNCT.sub("", t)
+
+
+register_cache("clean_token", _clean_token.cache_info)
+
+
+def split_paragraphs(text, parts):
+    """
+    在换行处将文本切分为长度大致相等的若干段，逐段分词的结果与整体分词一致。
+    参数:
+        text (str): 文本
+        parts (int): 期望的段数
+    返回:
+        list[str]: 文本段，拼接后等于原文
+    """
+    target = max(1, len(text) // max(1, parts))
+    pieces, start = [], 0
+    while start < len(text):
+        cut = text.find("\n", start + target)
+        if cut == -1:
+            pieces.append(text[start:])
+            break
+        pieces.append(text[start:cut + 1])
+        start = cut + 1
+    return pieces
+
+
+# 进程内共享的分词进程池：(进程号, 进程数, 进程池)，多次调用复用同一组已加载词典的工作进程
+_shared_pool = None
+
+
+def shared_pool(workers=None):
+    """
+    返回进程内共享的分词进程池，首次调用时创建（工作进程启动时加载 jieba 词典），
+    进程数变化或 fork 后的子进程中重新创建，进程退出时自动关闭。
+    参数:
+        workers (int | None): 工作进程数，默认为 CPU 核数
+    返回:
+        ProcessPoolExecutor: 进程池
+    """
+    global _shared_pool
+    if _shared_pool is None or _shared_pool[:2] != (os.getpid(), workers):
+        shutdown_shared_pool()
+        _shared_pool = (os.getpid(), workers, ProcessPoolExecutor(max_workers=workers, initializer=init_jieba))
+    return _shared_pool[2]
+
+
+@atexit.register
+def shutdown_shared_pool():
+    """
+    关闭共享的分词进程池（fork 得到的子进程中只丢弃引用）。
+    """
+    global _shared_pool
+    if _shared_pool is not None and _shared_pool[0] == os.getpid():
+        _shared_pool[2].shutdown()
+    _shared_pool = None
+
+
+def _tokenize_piece(piece):
+    # 工作进程中使用：返回字符串分词（id 需在主进程的共享词表中分配）
+    return tokenize(piece)
+
+
+def tokenize_parallel(text, workers=None, as_ids=False, executor=None):
+    """
+    按段落切分大文本，在多个进程中并行分词，结果与 tokenize 完全一致。
+    文本短于 PARALLEL_MIN_CHARS 时直接串行分词。
+    参数:
+        text (str): 待分词的文本
+        workers (int | None): 工作进程数，默认为 CPU 核数
+        as_ids (bool): 为 True 时返回共享词表中的 id 数组
+        executor (Executor | None): 调用方持有的进程池，None 时使用 shared_pool(workers)
+    返回:
+        list[str] | array: 过滤后的分词结果
+    """
+    if not text or len(text) < PARALLEL_MIN_CHARS:
+        return tokenize(text, as_ids)
+    if executor is None:
+        executor = shared_pool(workers)
+    parts = workers or os.cpu_count() or 1
+    tokens = []
+    for piece_tokens in executor.map(_tokenize_piece, split_paragraphs(text, parts * 4)):
+        tokens.extend(piece_tokens)
+    return VOCAB.encode(tokens) if as_ids else tokens
+
+
+def iter_text_chunks(path, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    分块读取文本文件，每块不超过 chunk_size 个字符（单个超长词除外），
+    切分点选在换行或标点等 jieba 不会跨越的字符之后，逐块分词的结果与整体分词一致。
+    编码识别与换行处理同 read_file，所有块拼接后与 read_file(path) 相同。
+    参数:
+        path (str): 文件路径
+        chunk_size (int): 每块的字符数上限
+    返回:
+        Iterator[str]: 文本块
+    异常:
+        ValueError: 当文件不存在或编码无法识别时抛出
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size 必须大于0")
+    pending = ""
+    # 按字节读取，每字节至多解码出一个字符，解码后的块再按 chunk_size 个字符切开
+    for block in iter_decoded(path, chunk_size * 4):
+        for start in range(0, len(block), chunk_size):
+            pending += block[start:start + chunk_size]
+            cut = pending.rfind("\n") + 1
+            if cut == 0:  # 没有换行时退而在最后一个边界字符处切分
+                for match in _CHUNK_BOUNDARY.finditer(pending, max(0, len(pending) - chunk_size)):
+                    cut = match.end()
+            if cut == 0:
+                continue  # 整块都是一个词，继续读取
+            yield pending[:cut]
+            pending = pending[cut:]
+    if pending:
+        yield pending
+
+
+def iter_token_chunks(path, chunk_size=STREAM_CHUNK_SIZE, as_ids=False):
+    """
+    流式分词：逐块读取、分词并过滤，每次产出一块的分词结果，内存占用与文件大小无关。
+    所有块拼接后与 tokenize(read_file(path)) 的结果相同。
+    参数:
+        path (str): 文件路径
+        chunk_size (int): 每块的字符数上限
+        as_ids (bool): 为 True 时产出共享词表中的 id 数组
+    返回:
+        Iterator[list[str] | array]: 每块的分词结果
+    """
+    for chunk in iter_text_chunks(path, chunk_size):
+        tokens = list(filter_tokens(jieba.cut(chunk)))
+        if tokens:
+            yield VOCAB.encode(tokens) if as_ids else tokens
+
+
 def read_file(path):
     """
-    读取指定路径的文本文件内容。
+    读取指定路径的文本文件内容，自动识别 UTF-8（含 BOM）与 GB18030 编码，大文件使用内存映射。
     参数:
         path (str): 文件路径
     返回:
         str: 文件内容
     异常:
-        ValueError: 当文件不存在时抛出
+        ValueError: 当文件不存在或编码无法识别时抛出
     """
-    try:
-        with open(path, "r", encoding="utf-8") as file_handle:
-            return file_handle.read()
-    except FileNotFoundError as exc:
-        raise ValueError(f"文件 {path} 不存在！") from exc
+    return read_text(path)
 
 
 def write_result(path, value):
@@ -0,0 +1,179 @@
+"""
+winnowing.py
+作者: wangyq
+修改日期: 2025-09-16
+
+功能:
+MOSS 风格的 winnowing 指纹与重复片段定位：对分词序列的 k-gram 哈希取滑动窗口最小值作为指纹，
+两篇文档共享的指纹作为种子，按 token 逐个比对向两侧扩展为最长相同片段，
+再映射回原文的字符位置，供人工审查具体的重复段落。时间与内存均近似线性。
+保证检出长度不少于 window + k - 1 个词的相同片段。
+"""
+
+from collections import defaultdict, namedtuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from document import as_document
+from similarity_functions import ngram_hash_sequence
+
+# k-gram 的长度（词）
+DEFAULT_K = 5
+# winnowing 窗口大小（k-gram 个数）
+DEFAULT_WINDOW = 4
+# 指纹在单篇文档中出现超过该次数时视为套话，不作为种子
+MAX_REPEATS = 16
+# 报告中每个片段最多显示的字符数
+SNIPPET_CHARS = 80
+
+# 重复片段：原文与待检测文本中的字符区间 [start, end)，以及片段包含的词数
+Span = namedtuple("Span", "orig_start orig_end copy_start copy_end tokens")
+
+
+def winnow(hashes, window=DEFAULT_WINDOW):
+    """
+    对 k-gram 哈希序列做 winnowing：每个窗口选出最小哈希（并列时取最右），相邻窗口选中同一位置时只记一次。
+    参数:
+        hashes (np.ndarray): 按位置排列的 k-gram 哈希（uint64）
+        window (int): 窗口大小
+    返回:
+        tuple: (positions, values)，选中的 k-gram 位置（int64）与对应哈希（uint64）
+    """
+    if not isinstance(window, int) or window <= 0:
+        raise ValueError("window 必须为正整数")
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    if len(hashes) == 0:
+        return np.zeros(0, dtype=np.int64), hashes
+    window = min(window, len(hashes))
+    view = sliding_window_view(hashes, window)
+    # 在反转的窗口中取 argmin 得到最右侧的最小值
+    positions = np.arange(len(view)) + (window - 1 - np.argmin(view[:, ::-1], axis=1))
+    keep = np.ones(len(positions), dtype=bool)
+    keep[1:] = positions[1:] != positions[:-1]
+    positions = positions[keep]
+    return positions, hashes[positions]
+
+
+def fingerprints(doc, k=DEFAULT_K, window=DEFAULT_WINDOW):
+    """
+    计算文档的 winnowing 指纹。
+    参数:
+        doc (Document | str): 文档或文件路径
+        k (int): k-gram 的长度
+        window (int): 窗口大小
+    返回:
+        tuple: (positions, values)，指纹所在的 token 位置与哈希
+    """
+    return winnow(ngram_hash_sequence(as_document(doc).ids, k), window)
+
+
+def _index(positions, values, max_repeats):
+    # 哈希 -> 位置列表，去掉出现过多的套话指纹
+    table = defaultdict(list)
+    for pos, value in zip(positions.tolist(), values.tolist()):
+        table[value].append(pos)
+    return {value: pos for value, pos in table.items() if len(pos) <= max_repeats}
+
+
+def matched_spans(doc_a, doc_b, k=DEFAULT_K, window=DEFAULT_WINDOW, max_repeats=MAX_REPEATS):
+    """
+    定位两篇文档中的重复片段。
+    参数:
+        doc_a (Document | str): 原文
+        doc_b (Document | str): 待检测文本
+        k (int): k-gram 的长度
+        window (int): 窗口大小
+        max_repeats (int): 单篇文档中出现次数超过该值的指纹不作为种子
+    返回:
+        list[Span]: 按原文位置排序的重复片段（字符区间），每个片段都经过逐词比对确认
+    """
+    doc_a, doc_b = as_document(doc_a), as_document(doc_b)
+    # 先取位置信息，保证 ids 与字符区间来自同一次分词
+    (a_starts, a_ends), (b_starts, b_ends) = doc_a.offsets, doc_b.offsets
+    ids_a, ids_b = doc_a.ids, doc_b.ids
+    index_a = _index(*fingerprints(doc_a, k, window), max_repeats)
+    index_b = _index(*fingerprints(doc_b, k, window), max_repeats)
+
+    # 种子按 (对角线, 原文位置) 排序，同一对角线上已被覆盖的种子直接跳过
+    seeds = sorted(
+        (pb - pa, pa)
+        for value, pos_b in index_b.items() if value in index_a
+        for pa in index_a[value] for pb in pos_b
+    )
+    spans = []
+    covered = {}  # 对角线 -> 已扩展片段在原文中的结束位置
+    for diag, pa in seeds:
+        if pa < covered.get(diag, -1):
+            continue
+        pb = pa + diag
+        if ids_a[pa:pa + k] != ids_b[pb:pb + k]:  # 哈希碰撞
+            continue
+        start = pa
+        while start > 0 and start + diag > 0 and ids_a[start - 1] == ids_b[start - 1 + diag]:
+            start -= 1
+        end = pa + k
+        while end < len(ids_a) and end + diag < len(ids_b) and ids_a[end] == ids_b[end + diag]:
+            end += 1
+        covered[diag] = end
+        spans.append(Span(a_starts[start], a_ends[end - 1], b_starts[start + diag], b_ends[end - 1 + diag],
+                          end - start))
+    spans.sort()
+    return spans
+
+
+def coverage(spans, length, side="orig"):
+    """
+    计算重复片段覆盖的字符比例（重叠部分只计一次）。
+    参数:
+        spans (list[Span]): 重复片段
+        length (int): 文本总字符数
+        side (str): "orig" 统计原文，"copy" 统计待检测文本
+    返回:
+        float: 覆盖比例
+    """
+    if length <= 0:
+        return 0.0
+    if side == "orig":
+        intervals = sorted((s.orig_start, s.orig_end) for s in spans)
+    elif side == "copy":
+        intervals = sorted((s.copy_start, s.copy_end) for s in spans)
+    else:
+        raise ValueError(f"未知的统计对象: {side}")
+    total, reach = 0, 0
+    for start, end in intervals:
+        start = max(start, reach)
+        if end > start:
+            total += end - start
+            reach = end
+    return total / length
+
+
+def _snippet(text, start, end):
+    piece = " ".join(text[start:end].split())
+    return piece if len(piece) <= SNIPPET_CHARS else piece[:SNIPPET_CHARS - 1] + "…"
+
+
+def format_report(doc_a, doc_b, spans):
+    """
+    生成重复片段的文本报告。
+    参数:
+        doc_a (Document | str): 原文
+        doc_b (Document | str): 待检测文本
+        spans (list[Span]): matched_spans 的结果
+    返回:
+        str: 报告文本
+    """
+    doc_a, doc_b = as_document(doc_a), as_document(doc_b)
+    text_a, text_b = doc_a.text, doc_b.text
+    lines = [
+        f"重复片段: {len(spans)} 处，"
+        f"覆盖原文 {coverage(spans, len(text_a)) * 100:.2f} %，"
+        f"覆盖待检测文本 {coverage(spans, len(text_b), 'copy') * 100:.2f} %"
+    ]
+    for i, span in enumerate(spans, 1):
+        lines.append(f"[{i}] 原文 {span.orig_start}-{span.orig_end} ↔ 待检测 {span.copy_start}-{span.copy_end}"
+                     f"（{span.tokens} 词）")
+        lines.append(f"    原文:   {_snippet(text_a, span.orig_start, span.orig_end)}")
+        lines.append(f"    待检测: {_snippet(text_b, span.copy_start, span.copy_end)}")
+    return "\n".join(lines) + "\n"